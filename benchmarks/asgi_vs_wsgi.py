@@ -0,0 +1,216 @@
+"""
+Requests/sec and latency of the read endpoints, served by the native async views
+through the ASGI application versus the sync views through the WSGI application.
+
+The ASGI side runs every client as a task on one event loop, like uvicorn does;
+the WSGI side runs one thread per client, like a threaded WSGI server. Requests
+are handed to the applications in-process, so HTTP parsing is left out and the
+numbers compare the Django stacks only.
+
+    python benchmarks/asgi_vs_wsgi.py --concurrency 64 --seconds 10 [--no-cache]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "blogging_platform.settings")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+MODES = ["wsgi", "asgi"]
+
+
+def seed(posts=200, users=20):
+    from blog.models import Category, Comment, CustomUser, Post
+
+    CustomUser.objects.bulk_create(
+        CustomUser(email=f"user{i}@example.com", username=f"user{i}", password="!") for i in range(users)
+    )
+    category = Category.objects.create(name="benchmark")
+    user_ids = list(CustomUser.objects.values_list("id", flat=True))
+    Post.objects.bulk_create(
+        Post(title=f"Post {i}", content="Lorem ipsum " * 20, author_id=user_ids[i % users], category=category,
+             like_count=i % 17, rating_sum=i % 23, rating_count=i % 5)
+        for i in range(posts)
+    )
+    post_ids = list(Post.objects.values_list("id", flat=True))
+    Comment.objects.bulk_create(
+        Comment(post_id=post_ids[i % posts], author_id=user_ids[i % users], content="Nice post") for i in range(posts * 5)
+    )
+    return post_ids
+
+
+def request_mix(post_ids, token):
+    """Endpoint paths weighted roughly like the production traffic, with their extra headers"""
+    post_id = random.choice(post_ids)
+    return random.choice([
+        ("/blog/posts/", {}),
+        ("/blog/posts/", {}),
+        ("/blog/posts/most-liked/", {}),
+        ("/blog/posts/highest-rated/", {}),
+        ("/blog/posts/trending/", {}),
+        (f"/blog/posts/{post_id}/comments/", {}),
+        (f"/blog/posts/{post_id}/", {"authorization": f"Bearer {token}"}),
+    ])
+
+
+async def asgi_request(application, path, headers):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"localhost"), *((k.encode(), v.encode()) for k, v in headers.items())],
+        "server": ("localhost", 80), "client": ("127.0.0.1", 50000),
+    }
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+    status = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.Future()  # The client never disconnects
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+def wsgi_request(application, path, headers):
+    environ = {
+        "REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": "", "SCRIPT_NAME": "",
+        "SERVER_NAME": "localhost", "SERVER_PORT": "80", "SERVER_PROTOCOL": "HTTP/1.1", "HTTP_HOST": "localhost",
+        "wsgi.input": io.BytesIO(b""), "wsgi.errors": sys.stderr, "wsgi.url_scheme": "http",
+        "wsgi.multithread": True, "wsgi.multiprocess": False, "wsgi.run_once": False,
+        **{f"HTTP_{key.upper()}": value for key, value in headers.items()},
+    }
+    status = []
+    body = application(environ, lambda code, response_headers, exc_info=None: status.append(int(code.split()[0])))
+    b"".join(body)
+    body.close()
+    return status[0]
+
+
+def run_asgi(args, post_ids, token):
+    from django.core.asgi import get_asgi_application
+
+    application = get_asgi_application()
+    latencies, failures = [], []
+
+    async def client(deadline):
+        while time.perf_counter() < deadline:
+            path, headers = request_mix(post_ids, token)
+            start = time.perf_counter()
+            status = await asgi_request(application, path, headers)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                failures.append(status)
+
+    async def main():
+        deadline = time.perf_counter() + args.seconds
+        await asyncio.gather(*(client(deadline) for _ in range(args.concurrency)))
+
+    asyncio.run(main())
+    return latencies, failures
+
+
+def run_wsgi(args, post_ids, token):
+    from django.core.wsgi import get_wsgi_application
+
+    application = get_wsgi_application()
+    latencies, failures = [], []
+    deadline = time.perf_counter() + args.seconds
+
+    def client():
+        while time.perf_counter() < deadline:
+            path, headers = request_mix(post_ids, token)
+            start = time.perf_counter()
+            status = wsgi_request(application, path, headers)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                failures.append(status)
+
+    threads = [threading.Thread(target=client) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, failures
+
+
+def run_mode(args):
+    """Child process: BLOG_ASYNC_VIEWS is already set in the environment"""
+    import django
+    from django.conf import settings
+
+    for database in settings.DATABASES.values():
+        database["NAME"] = args.database
+    if args.no_cache:
+        settings.BLOG_RESPONSE_CACHE_TIMEOUT = 0
+    django.setup()
+    from django.core.management import call_command
+    from django.db import connections
+    from rest_framework_simplejwt.tokens import AccessToken
+    from blog.models import CustomUser
+
+    call_command("migrate", verbosity=0)
+    post_ids = seed()
+    token = str(AccessToken.for_user(CustomUser.objects.first()))
+    connections.close_all()
+
+    latencies, failures = (run_asgi if args.mode == "asgi" else run_wsgi)(args, post_ids, token)
+    latencies.sort()
+    print(json.dumps({
+        "requests_per_second": len(latencies) / args.seconds,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "failures": len(failures),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--no-cache", action="store_true", help="Disable the response cache")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--database", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        return run_mode(args)
+
+    results = {}
+    for mode in MODES:
+        with tempfile.TemporaryDirectory() as directory:
+            print(f"Running {mode} for {args.seconds:g} s...")
+            command = [
+                sys.executable, __file__, "--mode", mode, "--database", str(Path(directory) / "db.sqlite3"),
+                "--concurrency", str(args.concurrency), "--seconds", str(args.seconds),
+            ]
+            if args.no_cache:
+                command.append("--no-cache")
+            env = {**os.environ, "BLOG_ASYNC_VIEWS": "true" if mode == "asgi" else "false"}
+            output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+            results[mode] = json.loads(output.splitlines()[-1])
+
+    print(f"\n{args.concurrency} concurrent clients, response cache {'off' if args.no_cache else 'on'}\n")
+    print(f"{'mode':<6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'failures':>9}")
+    for mode, row in results.items():
+        print(f"{mode:<6} {row['requests_per_second']:>9.1f} {row['p50_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['failures']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Throughput, latency percentiles and query counts of every endpoint in blog/urls.py,
+saved as JSON so runs can be compared.
+
+By default the requests go through the Django test client against a fresh dataset
+from `manage.py generate_data` in a temporary database. With --url they go over
+HTTP to a running server instead, whose database must hold a generated dataset
+(with the default --prefix and --password) and whose rate limits must allow the
+load. Query counts come from the Server-Timing header of PerformanceMiddleware in
+both cases, so run the server with BLOG_SERVER_TIMING=true.
+
+    python benchmarks/endpoints.py [--requests 200] [--posts 10000] [--no-cache] [--output run.json]
+    python benchmarks/endpoints.py --url http://localhost:8000 --output server.json
+    python benchmarks/endpoints.py --compare before.json after.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "blogging_platform.settings")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+class TestClientTransport:
+    """Requests through the Django test client, in this process"""
+
+    def __init__(self):
+        from django.test import Client
+
+        self.client = Client(HTTP_HOST="localhost")
+
+    def request(self, method, path, body=None, token=None):
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"} if token else {}
+        response = self.client.generic(
+            method, path, json.dumps(body) if body is not None else "", content_type="application/json", **headers,
+        )
+        content = b"".join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, response.get("Server-Timing", ""), content
+
+
+class HTTPTransport:
+    """Requests over one keep-alive HTTP connection to a running server"""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port or 80)
+
+    def request(self, method, path, body=None, token=None):
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        self.connection.request(method, path, json.dumps(body) if body is not None else None, headers)
+        response = self.connection.getresponse()
+        return response.status, response.getheader("Server-Timing", ""), response.read()
+
+
+class Scenarios:
+    """The requests sent to each route of blog/urls.py, by route name"""
+
+    def __init__(self, transport, rng, prefix, password):
+        self.transport = transport
+        self.rng = rng
+        self.prefix = prefix
+        self.user = self.token(f"{prefix}1@example.com", password)
+        self.staff = self.token(f"{prefix}0@example.com", password)
+        self.own_posts = self.ids(f"/blog/posts/author/{prefix}1/", self.user)
+        self.post_ids = self.ids("/blog/posts/?page_size=100", self.user)
+        tags = self.get("/blog/posts/?page_size=100", self.user)["results"]
+        self.tag_ids = sorted({tag["id"] for post in tags for tag in post["tags"]})[:5]
+        self.category = next(post["category"]["name"] for post in tags if post["category"])
+        self.since = (datetime.now(timezone.utc) - timedelta(hours=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        self.churned = f"{prefix}2"     # Followed and unfollowed over and over
+
+    def token(self, email, password):
+        status, _, body = self.transport.request("POST", "/api/token/", {"email": email, "password": password})
+        if status != 200:
+            sys.exit(f"Can't log in as {email} ({status}), is there a generated dataset?")
+        return json.loads(body)["access"]
+
+    def get(self, path, token):
+        return json.loads(self.transport.request("GET", path, token=token)[2])
+
+    def ids(self, path, token):
+        return [post["id"] for post in self.get(path, token)["results"]]
+
+    def post_id(self):
+        return self.rng.choice(self.post_ids)
+
+    def churned_follow(self):
+        """Id of the user's follow of the churned author, None if there's none"""
+        follows = self.get("/blog/follows/?page_size=100", self.user)["results"]
+        return next((follow["id"] for follow in follows if follow["author"] == self.churned), None)
+
+    def follow(self):
+        """Request following the churned author, unfollowed first out of band"""
+        follow_id = self.churned_follow()
+        if follow_id:
+            self.transport.request("DELETE", f"/blog/follows/{follow_id}/", token=self.user)
+        return "POST", "/blog/follows/", {"author": self.churned}, self.user
+
+    def unfollow(self):
+        """Request unfollowing the churned author, followed first out of band"""
+        status, _, body = self.transport.request("POST", "/blog/follows/", {"author": self.churned}, self.user)
+        follow_id = json.loads(body)["id"] if status == 201 else self.churned_follow()
+        return "DELETE", f"/blog/follows/{follow_id}/", None, self.user
+
+    def all(self):
+        """(name, route name, callable returning method, path, body, token)"""
+        user, staff = self.user, self.staff
+        return [
+            ("list", "post-list-create", lambda: ("GET", "/blog/posts/", None, None)),
+            ("list expanded", "post-list-create", lambda: ("GET", "/blog/posts/?expand=comments", None, None)),
+            ("search", "post-list-create", lambda: ("GET", "/blog/posts/?search=django", None, None)),
+            ("create", "post-list-create", lambda: (
+                "POST", "/blog/posts/", {"title": "Benchmark", "content": "Benchmark post", "tags": self.tag_ids[:2]}, user,
+            )),
+            ("detail", "post-detail", lambda: ("GET", f"/blog/posts/{self.post_id()}/", None, user)),
+            ("like", "post-detail", lambda: ("POST", f"/blog/posts/{self.rng.choice(self.own_posts)}/", {"action": "like"}, user)),
+            ("rate", "post-detail", lambda: (
+                "POST", f"/blog/posts/{self.rng.choice(self.own_posts)}/", {"action": "rate", "rating": self.rng.randint(1, 5)}, user,
+            )),
+            ("multi-get", "post-multi-get", lambda: (
+                "GET", "/blog/posts/multi/?" + urlencode({"ids": ",".join(map(str, self.rng.sample(self.post_ids, 20)))}), None, user,
+            )),
+            ("by category", "posts-by-category", lambda: ("GET", f"/blog/posts/category/{self.category}/", None, None)),
+            ("by author", "posts-by-author", lambda: ("GET", f"/blog/posts/author/{self.prefix}1/", None, None)),
+            ("comments", "comment-list-create", lambda: ("GET", f"/blog/posts/{self.post_id()}/comments/", None, None)),
+            ("comment", "comment-list-create", lambda: (
+                "POST", f"/blog/posts/{self.post_id()}/comments/", {"content": "Benchmark comment"}, user,
+            )),
+            ("most liked", "most-liked-posts", lambda: ("GET", "/blog/posts/most-liked/?window=week", None, None)),
+            ("highest rated", "highest-rated-posts", lambda: ("GET", "/blog/posts/highest-rated/", None, None)),
+            ("trending", "trending-posts", lambda: ("GET", "/blog/posts/trending/", None, None)),
+            ("bulk create", "post-bulk-create", lambda: (
+                "POST", "/blog/posts/bulk/", [{"title": f"Bulk {i}", "content": "...", "tags": self.tag_ids[:2]} for i in range(20)], user,
+            )),
+            ("bulk tags", "post-bulk-tags", lambda: (
+                "POST", "/blog/posts/bulk/tags/",
+                {"posts": self.own_posts[:10], "tags": self.tag_ids[-1:], "action": self.rng.choice(["add", "remove"])}, user,
+            )),
+            ("share", "post-share", lambda: ("POST", f"/blog/posts/{self.post_id()}/share/", {"email": "friend@example.com"}, user)),
+            ("feed", "feed", lambda: ("GET", "/blog/feed/", None, user)),
+            ("follows", "follow-list-create", lambda: ("GET", "/blog/follows/", None, user)),
+            ("follow", "follow-list-create", self.follow),
+            ("unfollow", "follow-destroy", self.unfollow),
+            ("metrics", "metrics", lambda: ("GET", "/blog/metrics/", None, staff)),
+            ("export", "export", lambda: ("GET", f"/blog/export/?types=comment,like&since={self.since}", None, staff)),
+        ]
+
+
+def run_scenario(transport, make_request, requests):
+    latencies, queries, errors = [], [], 0
+    for _ in range(requests):
+        method, path, body, token = make_request()
+        started = time.perf_counter()
+        status, server_timing, _ = transport.request(method, path, body, token)
+        latencies.append(time.perf_counter() - started)
+        errors += status >= 400
+        match = QUERIES.search(server_timing)
+        if match:
+            queries.append(int(match.group(1)))
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "requests_per_second": requests / sum(latencies),
+        "mean_ms": statistics.fmean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p90_ms": latencies[int(len(latencies) * 0.9)] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "max_ms": latencies[-1] * 1000,
+        "queries_mean": statistics.fmean(queries) if queries else None,
+        "queries_max": max(queries) if queries else None,
+    }
+
+
+def print_results(results):
+    print(f"{'endpoint':<15} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'queries':>8} {'errors':>7}")
+    for name, row in results["endpoints"].items():
+        queries = f"{row['queries_mean']:.1f}" if row["queries_mean"] is not None else "-"
+        print(f"{name:<15} {row['requests_per_second']:>8.1f} {row['p50_ms']:>8.2f} {row['p90_ms']:>8.2f} "
+              f"{row['p99_ms']:>8.2f} {queries:>8} {row['errors']:>7}")
+
+
+def compare(before_path, after_path):
+    before, after = (json.loads(Path(path).read_text()) for path in (before_path, after_path))
+    print(f"{'endpoint':<15} {'p50 ms':>17} {'p99 ms':>17} {'queries':>13}")
+    for name, new in after["endpoints"].items():
+        old = before["endpoints"].get(name)
+        if old is None:
+            continue
+        queries = f"{old['queries_mean'] or 0:.1f} -> {new['queries_mean'] or 0:.1f}"
+        print(f"{name:<15} {old['p50_ms']:>7.2f} -> {new['p50_ms']:<7.2f} {old['p99_ms']:>7.2f} -> {new['p99_ms']:<7.2f} {queries:>13}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint (default: 200)")
+    parser.add_argument("--warmup", type=int, default=10, help="Unmeasured requests per endpoint first (default: 10)")
+    parser.add_argument("--url", help="Benchmark the server at this URL instead of the test client")
+    parser.add_argument("--posts", type=int, default=10000, help="Posts in the generated dataset (default: 10000)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the response cache (test client only)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--prefix", default="gen", help="--prefix the dataset was generated with")
+    parser.add_argument("--password", default="password123", help="--password the dataset was generated with")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare)
+
+    import django
+    from django.conf import settings
+
+    directory = None
+    if args.url:
+        django.setup()
+        transport = HTTPTransport(args.url)
+    else:
+        directory = tempfile.TemporaryDirectory()
+        for database in settings.DATABASES.values():
+            database["NAME"] = str(Path(directory.name) / "db.sqlite3")
+        if args.no_cache:
+            settings.BLOG_RESPONSE_CACHE_TIMEOUT = 0
+        settings.BLOG_SERVER_TIMING = True
+        django.setup()
+        from django.core.management import call_command
+        from rest_framework.settings import api_settings
+
+        api_settings.DEFAULT_THROTTLE_RATES.clear()     # Measure the endpoints, not the rate limits
+        call_command("migrate", verbosity=0)
+        scale = args.posts / 10000
+        call_command(
+            "generate_data", posts=args.posts, users=max(int(1000 * scale), 10), comments=int(50000 * scale),
+            likes=int(100000 * scale), ratings=int(30000 * scale), follows=int(10000 * scale), seed=args.seed, prefix=args.prefix,
+            password=args.password,
+        )
+        transport = TestClientTransport()
+
+    from blog import urls
+
+    rng = random.Random(args.seed)
+    scenarios = Scenarios(transport, rng, args.prefix, args.password).all()
+    uncovered = {pattern.name for pattern in urls.urlpatterns} - {route for _, route, _ in scenarios}
+    if uncovered:
+        sys.exit(f"No scenario for the routes {', '.join(sorted(uncovered))}")
+
+    results = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(),
+            "commit": subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip(),
+            "target": args.url or "test client",
+            "async_views": settings.BLOG_ASYNC_VIEWS,
+            "response_cache": not args.no_cache,
+            "requests": args.requests,
+            "posts": args.posts,
+        },
+        "endpoints": {},
+    }
+    for name, _, make_request in scenarios:
+        print(f"Running {name}...", file=sys.stderr)
+        run_scenario(transport, make_request, args.warmup)
+        results["endpoints"][name] = run_scenario(transport, make_request, args.requests)
+
+    print_results(results)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"\nSaved to {args.output}")
+    if directory:
+        directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Peak memory of the NDJSON export of blog/export.py, which reads in chunks with
+.values().iterator(): it is bounded by one chunk of rows (--chunk-size of
+`export_data`), so it stops growing once a chunk is full, whether the export
+is a few thousand rows or the whole of a large generated dataset.
+
+    python benchmarks/export_memory.py [--comments 200000] [--likes 200000]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "blogging_platform.settings")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+
+def measure(export):
+    """Rows, streamed bytes, peak traced memory and seconds of reading `export` to the end"""
+    rows = 0
+
+    def counted(stream):
+        nonlocal rows
+        for row in stream:
+            rows += 1
+            yield row
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = sum(len(chunk) for chunk in export(counted))
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rows, size, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=10000)
+    parser.add_argument("--comments", type=int, default=200000)
+    parser.add_argument("--likes", type=int, default=200000)
+    args = parser.parse_args()
+
+    import django
+    from django.conf import settings
+
+    directory = tempfile.TemporaryDirectory()
+    for database in settings.DATABASES.values():
+        database["NAME"] = str(Path(directory.name) / "db.sqlite3")
+    django.setup()
+    from django.core.management import call_command
+    from blog.export import encode, export_rows
+    from blog.models import Comment
+
+    call_command("migrate", verbosity=0)
+    call_command(
+        "generate_data", posts=args.posts, users=max(args.posts // 10, 10), comments=args.comments, likes=args.likes,
+        ratings=args.likes // 3, stdout=StringIO(),
+    )
+    latest = Comment.objects.order_by("-updated_at").values_list("updated_at", flat=True)
+    tenth, ten_thousandth = latest[9], latest[9999]
+    runs = {
+        "10 comments": lambda counted: encode(counted(export_rows(["comment"], since=tenth))),
+        "10k comments": lambda counted: encode(counted(export_rows(["comment"], since=ten_thousandth))),
+        "comments": lambda counted: encode(counted(export_rows(["comment"]))),
+        "everything": lambda counted: encode(counted(export_rows())),
+    }
+    print(f"{'export':<14} {'rows':>9} {'MiB out':>9} {'peak MiB':>9} {'rows/s':>9}")
+    for name, export in runs.items():
+        rows, size, peak, elapsed = measure(export)
+        print(f"{name:<14} {rows:>9} {size / 2**20:>9.1f} {peak / 2**20:>9.2f} {rows / elapsed:>9.0f}")
+
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Feeds of users following 10k authors, tags and categories: latency of the feed
+pages served from the FeedEntry table (fan-out on write) next to the same page
+computed from the follows at request time, and the cost of publishing a post
+for an author whose followers get it written to their feeds, or read at feed
+time once they are more than BLOG_FEED_FAN_OUT_LIMIT.
+
+    python benchmarks/feed.py [--users 100000] [--follows 10000] [--readers 5] [--pages 20]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "blogging_platform.settings")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+def follow_everything(readers, users, tags, categories, count, rng):
+    """`count` follows for each reader, nearly all of them authors, and a few tags and categories"""
+    from blog.models import Follow
+
+    follows = []
+    for reader in readers:
+        targets = [("tag", tag) for tag in tags[:count // 1000]] + [("category", category) for category in categories[:count // 5000]]
+        authors = [user for user in users if user != reader]
+        targets += [("author", author) for author in rng.sample(authors, count - len(targets))]
+        follows += [Follow(user_id=reader, **{f"{name}_id": pk}) for name, pk in targets]
+    Follow.objects.bulk_create(follows, batch_size=2000)
+
+
+def walk_feed(view, user, pages):
+    """Latencies, query counts and query seconds of the first `pages` pages of the feed of `user` served by `view`"""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework.test import APIRequestFactory, force_authenticate
+
+    factory = APIRequestFactory()
+    latencies, queries, database, url = [], [], [], "/blog/feed/"
+    while url and len(latencies) < pages:
+        request = factory.get(url, HTTP_HOST="localhost")
+        force_authenticate(request, user)
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = view(request).render()
+            latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.content
+        queries.append(len(captured))
+        database.append(sum(float(query["time"]) for query in captured.captured_queries))
+        url = response.data["next"]
+    return latencies, queries, database
+
+
+def computed_feed_view():
+    """FeedView computing the page from the follows at request time, without the FeedEntry table"""
+    from django.db.models import Q
+
+    from blog.models import Follow, Post
+    from blog.views import FeedView
+
+    class ComputedFeedView(FeedView):
+        def get_feed_sources(self):
+            follows = Follow.objects.filter(user_id=self.request.user.id)
+            posts = Post.objects.filter(
+                Q(author__in=follows.filter(author__isnull=False).values("author"))
+                | Q(category__in=follows.filter(category__isnull=False).values("category"))
+                | Q(tags__in=follows.filter(tag__isnull=False).values("tag"))
+            ).distinct()
+            return [(posts, {"published_date": "published_date", "id": "id"})]
+
+    return ComputedFeedView.as_view()
+
+
+def publish(author_id):
+    """Seconds to create a post by `author_id`, signals and fan-out included, and the feed entries written"""
+    from blog.models import FeedEntry, Post
+
+    before = FeedEntry.objects.count()
+    started = time.perf_counter()
+    post = Post.objects.create(title="Benchmark", content="...", author_id=author_id)
+    elapsed = time.perf_counter() - started
+    written = FeedEntry.objects.filter(post=post).count()
+    assert FeedEntry.objects.count() - before == written
+    return elapsed, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--posts", type=int, default=50000)
+    parser.add_argument("--follows", type=int, default=10000, help="Follows of each reader (default: 10000)")
+    parser.add_argument("--readers", type=int, default=5, help="Users with --follows follows (default: 5)")
+    parser.add_argument("--pages", type=int, default=20, help="Feed pages walked per reader (default: 20)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import django
+    from django.conf import settings
+
+    directory = tempfile.TemporaryDirectory()
+    for database in settings.DATABASES.values():
+        database["NAME"] = str(Path(directory.name) / "db.sqlite3")
+    django.setup()
+    from django.core.management import call_command
+    from rest_framework.settings import api_settings
+
+    from blog.models import Category, CustomUser, FeedEntry, Follow, Post, Tag
+
+    api_settings.DEFAULT_THROTTLE_RATES.clear()
+    call_command("migrate", verbosity=0)
+    call_command(
+        "generate_data", users=args.users, posts=args.posts, comments=args.posts, likes=args.posts, ratings=args.posts // 3,
+        follows=0, seed=args.seed, stdout=StringIO(),
+    )
+    rng = random.Random(args.seed)
+    users = list(CustomUser.objects.order_by("id").values_list("id", flat=True))
+    readers, celebrity, ordinary = users[1:args.readers + 1], users[-1], users[-2]
+    tags = list(Tag.objects.values_list("id", flat=True))
+    categories = list(Category.objects.values_list("id", flat=True))
+
+    started = time.perf_counter()
+    follow_everything(readers, users, tags, categories, args.follows, rng)
+    # Everyone follows the celebrity, a few hundred users follow the ordinary author
+    Follow.objects.bulk_create(
+        [Follow(user_id=user, author_id=celebrity) for user in users if user != celebrity]
+        + [Follow(user_id=user, author_id=ordinary) for user in rng.sample(users[:-2], 300)],
+        batch_size=2000, ignore_conflicts=True,
+    )
+    Follow.objects.update_fan_out_mode([celebrity, ordinary])
+    print(f"{Follow.objects.count()} follows in {time.perf_counter() - started:.1f} s, "
+          f"celebrity followed by {Follow.objects.filter(author=celebrity).count()} users "
+          f"(limit {settings.BLOG_FEED_FAN_OUT_LIMIT}), fan-out on read: {CustomUser.objects.get(pk=celebrity).fan_out_on_read}")
+
+    started = time.perf_counter()
+    FeedEntry.objects.fan_out(Post.objects.values_list("id", flat=True))
+    elapsed = time.perf_counter() - started
+    entries = FeedEntry.objects.count()
+    print(f"Fanned out {args.posts} posts to {entries} feed entries in {elapsed:.1f} s ({entries / elapsed:.0f} rows/s)\n")
+
+    from blog.views import FeedView
+
+    print(f"{'feed read':<30} {'p50 ms':>8} {'p99 ms':>8} {'db p50 ms':>10} {'queries':>8}")
+    for name, view in (("feed table", FeedView.as_view()), ("computed", computed_feed_view())):
+        pages = {"first page": ([], []), f"next {args.pages - 1} pages": ([], [])}
+        queries = []
+        for reader in CustomUser.objects.filter(pk__in=readers):
+            walk_feed(view, reader, 1)  # Warm up
+            latencies, counts, database = walk_feed(view, reader, args.pages)
+            for (page_latencies, page_database), start, stop in zip(pages.values(), (0, 1), (1, None)):
+                page_latencies += latencies[start:stop]
+                page_database += database[start:stop]
+            queries += counts
+        for pages_name, (latencies, database) in pages.items():
+            p50, p99 = percentiles(latencies)
+            print(f"{f'{pages_name}, {name}':<30} {p50:>8.2f} {p99:>8.2f} {percentiles(database)[0]:>10.2f} {max(queries):>8}")
+
+    print(f"\n{'publish':<30} {'ms':>8} {'entries':>8}")
+    for name, author in (("ordinary author, fan-out", ordinary), ("celebrity, fan-out on read", celebrity)):
+        elapsed, written = publish(author)
+        print(f"{name:<30} {elapsed * 1000:>8.2f} {written:>8}")
+    CustomUser.objects.filter(pk=celebrity).update(fan_out_on_read=False)
+    elapsed, written = publish(celebrity)
+    print(f"{'celebrity, forced fan-out':<30} {elapsed * 1000:>8.2f} {written:>8}")
+
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
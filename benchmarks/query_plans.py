@@ -0,0 +1,117 @@
+"""
+Query plans and timings of the main read paths, before and after the
+0008_query_pattern_indexes migration, on a seeded throwaway SQLite database.
+
+    python benchmarks/query_plans.py --posts 50000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "blogging_platform.settings")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import django
+from django.conf import settings
+
+BEFORE = "0007_queued_email"
+AFTER = "0008_query_pattern_indexes"
+
+
+def seed(posts, users=500, categories=20, comments_per_post=5):
+    from django.db import connection
+    from blog.models import Category, Comment, CustomUser, Post
+
+    CustomUser.objects.bulk_create(
+        CustomUser(email=f"user{i}@example.com", username=f"user{i}", password="!") for i in range(users)
+    )
+    Category.objects.bulk_create(Category(name=f"category{i}") for i in range(categories))
+    user_ids = list(CustomUser.objects.values_list("id", flat=True))
+    category_ids = list(Category.objects.values_list("id", flat=True))
+
+    Post.objects.bulk_create(
+        (
+            Post(title=f"Post {i}", content="Lorem ipsum " * 20,
+                 author_id=user_ids[i % users], category_id=category_ids[i % categories])
+            for i in range(posts)
+        ),
+        batch_size=2000,
+    )
+    post_ids = list(Post.objects.values_list("id", flat=True))
+    Comment.objects.bulk_create(
+        (
+            Comment(post_id=post_ids[i % posts], author_id=user_ids[i % users], content="Nice post")
+            for i in range(posts * comments_per_post)
+        ),
+        batch_size=5000,
+    )
+    # auto_now_add gave every row the same timestamp, spread them out
+    with connection.cursor() as cursor:
+        cursor.execute("UPDATE blog_post SET published_date = datetime('now', '-' || id || ' minutes')")
+        cursor.execute("UPDATE blog_comment SET created_at = datetime('now', '-' || id || ' seconds')")
+        cursor.execute("ANALYZE")
+
+
+def queries(category_lookup):
+    from blog.models import Comment, Post
+
+    busiest_post = Post.objects.order_by("id").values_list("id", flat=True).first()
+    return {
+        "post list page": Post.objects.order_by("-published_date", "-id")[:21],
+        "posts by author page": Post.objects.filter(author__username="user7").order_by("-published_date", "-id")[:21],
+        "posts by category page": Post.objects.filter(**{category_lookup: "category3"}).order_by("-published_date", "-id")[:21],
+        "comment thread page": Comment.objects.filter(post_id=busiest_post).order_by("created_at", "id")[:21],
+    }
+
+
+def measure(label, category_lookup, repeat):
+    print(f"\n=== {label} ===")
+    results = {}
+    for name, queryset in queries(category_lookup).items():
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - start) * 1000)
+        results[name] = statistics.median(timings)
+        print(f"\n{name}: {results[name]:.2f} ms (median of {repeat})")
+        for line in queryset.explain().splitlines():
+            print(f"    {line}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        settings.DATABASES["default"]["NAME"] = Path(directory) / "benchmark.sqlite3"
+        django.setup()
+        from django.core.management import call_command
+
+        call_command("migrate", "blog", BEFORE, verbosity=0)
+        call_command("migrate", "auth", verbosity=0)
+        print(f"Seeding {args.posts} posts...")
+        seed(args.posts)
+        before = measure(f"before ({BEFORE})", "category__name__iexact", args.repeat)
+
+        call_command("migrate", "blog", AFTER, verbosity=0)
+        with django.db.connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        after = measure(f"after ({AFTER})", "category__name", args.repeat)
+
+    print("\n=== summary (ms) ===")
+    for name in before:
+        print(f"{name:<25} {before[name]:>9.2f} -> {after[name]:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Time per 1,000 posts spent turning posts into JSON, split into the serializer
+(model instances to dicts) and the renderer (dicts to bytes), for DRF's stock
+path and the fast one: the compiled serializers of
+blog.serializers.FastRepresentationMixin and the orjson-backed
+blog.renderers.JSONRenderer. The posts are loaded once, with their list
+endpoint prefetches, so no query is timed. Both paths must write the same bytes.
+
+    python benchmarks/serialization.py [--posts 1000] [--rounds 5]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "blogging_platform.settings")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+
+def per_thousand_ms(run, posts, rounds):
+    """Median over the rounds of the time of run(), in ms per 1,000 posts"""
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - start) / posts * 1e6)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    import django
+    from django.conf import settings
+
+    directory = tempfile.TemporaryDirectory()
+    for database in settings.DATABASES.values():
+        database["NAME"] = str(Path(directory.name) / "db.sqlite3")
+    django.setup()
+    from django.core.management import call_command
+    from rest_framework import renderers
+    from blog import renderers as blog_renderers
+    from blog.models import Post
+    from blog.serializers import FastRepresentationMixin, PostListSerializer, PostSerializer
+
+    call_command("migrate", verbosity=0)
+    call_command(
+        "generate_data", posts=args.posts, users=max(args.posts // 10, 10), comments=args.posts * 5,
+        likes=0, ratings=0, stdout=StringIO(),
+    )
+    payloads = {
+        "list": (PostListSerializer, {"expand_comments": False}, Post.objects.with_related().with_comment_summary()),
+        "list expanded": (PostListSerializer, {"expand_comments": True}, Post.objects.with_related().with_comment_summary(3)),
+        "detail": (PostSerializer, {}, Post.objects.with_related().with_comments()),
+    }
+
+    print(f"{'payload':<14} {'':<6} {'serialize':>10} {'render':>8} {'total':>8}  (ms per 1,000 posts)")
+    for name, (serializer_class, context, queryset) in payloads.items():
+        posts = list(queryset.order_by("-published_date"))
+        results = {}
+        for label, fast in (("stock", False), ("fast", True)):
+            renderer = blog_renderers.JSONRenderer() if fast else renderers.JSONRenderer()
+            with mock.patch.object(FastRepresentationMixin, "fast_representation", fast):
+                serialize = lambda: serializer_class(posts, many=True, context=context).data
+                data = serialize()
+                serialize_ms = per_thousand_ms(serialize, len(posts), args.rounds)
+            render_ms = per_thousand_ms(lambda: renderer.render(data), len(posts), args.rounds)
+            results[label] = renderer.render(data)
+            print(f"{name:<14} {label:<6} {serialize_ms:>10.1f} {render_ms:>8.1f} {serialize_ms + render_ms:>8.1f}")
+        if results["stock"] != results["fast"]:
+            sys.exit(f"The fast path writes different bytes for {name}")
+
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
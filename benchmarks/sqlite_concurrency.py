@@ -0,0 +1,155 @@
+"""
+Mixed read/write load against a file SQLite database, once with the stock
+settings and once with DATABASE_PROFILE=sqlite-production. Writer threads
+toggle likes and add comments, reader threads load post list pages. Every
+operation runs between request_started/request_finished like a request, so
+connection reuse (CONN_MAX_AGE) is part of the measurement.
+
+    python benchmarks/sqlite_concurrency.py --writers 4 --readers 8 --seconds 10
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "blogging_platform.settings")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+PROFILES = ["default", "sqlite-production"]
+
+
+def seed(posts=500, users=100):
+    from blog.models import Category, CustomUser, Post
+
+    CustomUser.objects.bulk_create(
+        CustomUser(email=f"user{i}@example.com", username=f"user{i}", password="!") for i in range(users)
+    )
+    category = Category.objects.create(name="benchmark")
+    user_ids = list(CustomUser.objects.values_list("id", flat=True))
+    Post.objects.bulk_create(
+        Post(title=f"Post {i}", content="Lorem ipsum " * 20, author_id=user_ids[i % users], category=category)
+        for i in range(posts)
+    )
+
+
+def write(rng, posts, users):
+    from blog.models import Comment, Like
+
+    post, user = rng.choice(posts), rng.choice(users)
+    if rng.random() < 0.5:
+        Like.objects.toggle(post, user)
+    else:
+        Comment.objects.create(post=post, author=user, content="Benchmark comment")
+
+
+def read(rng, posts, users):
+    from blog.models import Post
+
+    list(Post.objects.with_related().with_comment_summary(3).order_by("-published_date", "-id")[:20])
+
+
+def worker(operation, stop, results, seed_value):
+    from django.core import signals
+    from django.db import OperationalError, connections
+    from blog.models import CustomUser, Post
+
+    rng = random.Random(seed_value)
+    posts, users = list(Post.objects.all()), list(CustomUser.objects.all())
+    latencies, errors = [], 0
+    while not stop.is_set():
+        signals.request_started.send(sender=None)
+        start = time.perf_counter()
+        try:
+            operation(rng, posts, users)
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            errors += 1
+        finally:
+            signals.request_finished.send(sender=None)
+    connections.close_all()
+    results.append((operation.__name__, latencies, errors))
+
+
+def run_profile(args):
+    """Child process: DATABASE_PROFILE is already set in the environment"""
+    import django
+    from django.conf import settings
+
+    for database in settings.DATABASES.values():
+        database["NAME"] = args.database
+    settings.BLOG_RESPONSE_CACHE_TIMEOUT = 0
+    django.setup()
+    from django.core.management import call_command
+    from django.db import connections
+
+    call_command("migrate", verbosity=0)
+    seed()
+    connections.close_all()
+
+    stop, results = threading.Event(), []
+    threads = [
+        threading.Thread(target=worker, args=(operation, stop, results, n))
+        for n, operation in enumerate([write] * args.writers + [read] * args.readers)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    summary = {}
+    for kind in ("write", "read"):
+        latencies = sorted(l for name, ls, _ in results if name == kind for l in ls)
+        summary[kind] = {
+            "ops_per_second": len(latencies) / args.seconds,
+            "p50_ms": statistics.median(latencies) * 1000 if latencies else None,
+            "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000 if latencies else None,
+            "errors": sum(errors for name, _, errors in results if name == kind),
+        }
+    print(json.dumps(summary))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--profile", choices=PROFILES, help=argparse.SUPPRESS)
+    parser.add_argument("--database", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        return run_profile(args)
+
+    results = {}
+    for profile in PROFILES:
+        with tempfile.TemporaryDirectory() as directory:
+            print(f"Running {profile} profile for {args.seconds:g} s...")
+            output = subprocess.run(
+                [sys.executable, __file__, "--profile", profile, "--database", str(Path(directory) / "db.sqlite3"),
+                 "--writers", str(args.writers), "--readers", str(args.readers), "--seconds", str(args.seconds)],
+                env={**os.environ, "DATABASE_PROFILE": profile}, capture_output=True, text=True, check=True,
+            ).stdout
+            results[profile] = json.loads(output.splitlines()[-1])
+
+    print(f"\n{args.writers} writer and {args.readers} reader threads\n")
+    print(f"{'profile':<20} {'kind':<6} {'ops/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}")
+    for profile, summary in results.items():
+        for kind, row in summary.items():
+            p50 = f"{row['p50_ms']:.2f}" if row["p50_ms"] is not None else "-"
+            p95 = f"{row['p95_ms']:.2f}" if row["p95_ms"] is not None else "-"
+            print(f"{profile:<20} {kind:<6} {row['ops_per_second']:>9.1f} {p50:>9} {p95:>9} {row['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
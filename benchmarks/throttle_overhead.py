@@ -0,0 +1,96 @@
+"""
+Per-request cost of the rate limits in blog/throttling.py: a cached post detail
+read (the cheapest authenticated request, so the overhead shows the most) with
+and without throttles, and the throttle check alone next to DRF's stock
+UserRateThrottle, whose cost grows with the rate.
+
+    python benchmarks/throttle_overhead.py [--requests 5000]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "blogging_platform.settings")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+
+def per_request_us(run, requests, rounds=5):
+    """Median over the rounds of the mean time per call, in microseconds"""
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(requests):
+            run()
+        times.append((time.perf_counter() - start) / requests * 1e6)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    import django
+    from django.conf import settings
+
+    directory = tempfile.TemporaryDirectory()
+    for database in settings.DATABASES.values():
+        database["NAME"] = str(Path(directory.name) / "db.sqlite3")
+    django.setup()
+    from django.core.cache import cache
+    from django.core.management import call_command
+    from django.test import Client
+    from rest_framework import throttling
+    from rest_framework.settings import api_settings
+    from rest_framework.test import APIRequestFactory
+    from rest_framework.views import APIView
+    from rest_framework_simplejwt.tokens import AccessToken
+    from blog.models import CustomUser, Post
+    from blog.throttling import UserRateThrottle
+
+    call_command("migrate", verbosity=0)
+    user = CustomUser.objects.create_user(email="bench@example.com", password="pass1234", username="bench")
+    post = Post.objects.create(title="Benchmark", content="...", author=user)
+    client = Client(HTTP_HOST="localhost", HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+    # Never refuse, so every request pays the full check
+    api_settings.DEFAULT_THROTTLE_RATES["user"] = f"{10 ** 9}/min"
+    url = f"/blog/posts/{post.pk}/"
+    client.get(url)
+
+    def get():
+        assert client.get(url).status_code == 200
+
+    # Alternate the two runs so drifts in machine load hit both alike
+    throttled, unthrottled = [], []
+    for _ in range(5):
+        throttled.append(per_request_us(get, args.requests, rounds=1))
+        with mock.patch.object(APIView, "get_throttles", return_value=[]):
+            unthrottled.append(per_request_us(get, args.requests, rounds=1))
+    throttled, unthrottled = statistics.median(throttled), statistics.median(unthrottled)
+    print(f"Cached GET {url}: {unthrottled:.0f} us without throttles, {throttled:.0f} us with "
+          f"(+{throttled - unthrottled:.0f} us, {(throttled / unthrottled - 1) * 100:.1f}%)")
+
+    # The check alone, filling the window up to the rate: DRF keeps a timestamp per request in it
+    request = APIRequestFactory().get(url)
+    request.user = user
+    print(f"\n{'rate/min':>9} {'sliding window us':>18} {'DRF UserRateThrottle us':>24}")
+    for rate in (60, 600, 6000):
+        api_settings.DEFAULT_THROTTLE_RATES["user"] = f"{rate}/min"
+        cache.clear()
+        ours = per_request_us(lambda: UserRateThrottle().allow_request(request, None), rate, rounds=1)
+        cache.clear()
+        with mock.patch.object(throttling.UserRateThrottle, "THROTTLE_RATES", {"user": f"{rate}/min"}):
+            stock = per_request_us(lambda: throttling.UserRateThrottle().allow_request(request, None), rate, rounds=1)
+        print(f"{rate:>9} {ours:>18.1f} {stock:>24.1f}")
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
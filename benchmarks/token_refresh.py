@@ -0,0 +1,81 @@
+"""
+Latency of POST /api/token/refresh/ (which checks and revokes the refresh token)
+as the revoked token table grows, with the membership cache warm and cold.
+
+    python benchmarks/token_refresh.py [--sizes 0,10000,100000,1000000] [--requests 300]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "blogging_platform.settings")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+
+def grow(count):
+    """Revoke `count` more (unexpired) tokens, the way rotations would"""
+    from django.utils import timezone
+    from blog.models import RevokedToken
+
+    expires_at = timezone.now() + timedelta(days=1)
+    RevokedToken.objects.bulk_create(
+        (RevokedToken(jti=uuid.uuid4().hex, expires_at=expires_at) for _ in range(count)), batch_size=5000,
+    )
+
+
+def measure(client, tokens, clear_cache):
+    from django.core.cache import cache
+
+    latencies = []
+    for refresh in tokens:
+        if clear_cache:
+            cache.clear()
+        start = time.perf_counter()
+        response = client.post("/api/token/refresh/", {"refresh": refresh})
+        latencies.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.content
+    latencies.sort()
+    return statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="0,10000,100000,1000000", help="Revoked table sizes to measure at")
+    parser.add_argument("--requests", type=int, default=300, help="Refreshes per measurement")
+    args = parser.parse_args()
+
+    import django
+    from django.conf import settings
+
+    directory = tempfile.TemporaryDirectory()
+    for database in settings.DATABASES.values():
+        database["NAME"] = str(Path(directory.name) / "db.sqlite3")
+    django.setup()
+    from django.core.management import call_command
+    from django.test import Client
+    from blog.authentication import RevocableRefreshToken
+    from blog.models import CustomUser, RevokedToken
+
+    call_command("migrate", verbosity=0)
+    user = CustomUser.objects.create_user(email="bench@example.com", password="pass1234", username="bench")
+    client = Client(HTTP_HOST="localhost")
+
+    print(f"{'revoked':>9} {'p50 ms':>8} {'p99 ms':>8} {'cold p50':>9} {'cold p99':>9}")
+    for size in map(int, args.sizes.split(",")):
+        grow(size - RevokedToken.objects.count())
+        warm = measure(client, [str(RevocableRefreshToken.for_user(user)) for _ in range(args.requests)], False)
+        cold = measure(client, [str(RevocableRefreshToken.for_user(user)) for _ in range(args.requests)], True)
+        print(f"{size:>9} {warm[0]:>8.2f} {warm[1]:>8.2f} {cold[0]:>9.2f} {cold[1]:>9.2f}")
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
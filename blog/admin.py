@@ -24,3 +24,7 @@ admin.site.register(Post)
 admin.site.register(Comment)
 admin.site.register(Like)
 admin.site.register(Rating)
+admin.site.register(QueuedEmail)
+admin.site.register(RevokedToken)
+admin.site.register(ImportCheckpoint)
+admin.site.register(Follow)
@@ -0,0 +1,217 @@
+"""
+Native async versions of the blog views, served under ASGI when BLOG_ASYNC_VIEWS
+is on (blog/urls.py then picks this module).
+
+Each view subclasses its sync counterpart in blog/views.py, so querysets, serializers,
+permissions and caching stay in one place. The reads run on the event loop with the
+async ORM and cache API: a cache hit or a 304 never leaves the loop. Handlers that
+are only defined in the sync views (the writes) run in a worker thread, like any
+sync view does under ASGI.
+"""
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404
+from django.shortcuts import aget_object_or_404
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import views
+from .authentication import aprefetch_user_fields, authenticates_statelessly
+from .cache import ascope_versions
+from .export import aiterate
+from .mail import aenqueue_email
+from .models import Post
+
+
+class AsyncAPIViewMixin:
+    """
+    Dispatch a DRF view as a coroutine. DRF 3.15 has no async support, so this
+    redoes APIView.dispatch(): coroutine handlers are awaited, sync ones are
+    run through sync_to_async.
+    """
+
+    view_is_async = True
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            # Loading the user of a JWT can be a query, anonymous and stateless requests make it here
+            if JWTAuthentication().get_header(request) is None:
+                self.initial(request, *args, **kwargs)
+            elif authenticates_statelessly(request, self):
+                await aprefetch_user_fields(request)
+                self.initial(request, *args, **kwargs)
+            else:
+                await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def aget_object(self):
+        """get_object() with the async ORM"""
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            obj = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except (queryset.model.DoesNotExist, TypeError, ValueError, DjangoValidationError):
+            raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+class AsyncListMixin:
+    """Cached list endpoint whose page is fetched with the async ORM"""
+
+    async def get(self, request, *args, **kwargs):
+        return await self.acached_response(request, lambda: self.alist(request))
+
+    async def alist(self, request):
+        queryset = self.get_queryset()
+        if any(issubclass(backend, DjangoFilterBackend) for backend in self.filter_backends):
+            # django-filter validates model choice filters with queries
+            queryset = await sync_to_async(self.filter_queryset)(queryset)
+        else:
+            queryset = self.filter_queryset(queryset)
+        page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class PostListCreateView(AsyncAPIViewMixin, AsyncListMixin, views.PostListCreateView):
+    """View to list all posts or create a new post"""
+
+
+class PostDetailView(AsyncAPIViewMixin, views.PostDetailView):
+    """View to retrieve, update, or delete a single post with actions for liking and rating"""
+
+    async def aget_validators(self):
+        row = await Post.objects.filter(pk=self.kwargs["pk"]).values_list(*self.validator_fields).afirst()
+        return self.validators_from_row(row, await ascope_versions(["global"]) if row else None)
+
+    async def get(self, request, *args, **kwargs):
+        """Retrieve a single post along with total likes and average rating"""
+        return await self.acached_response(request, self.abuild_detail_response)
+
+    async def abuild_detail_response(self):
+        post = await self.aget_object()
+        return Response(views.post_detail_data(post), status=status.HTTP_200_OK)
+
+
+class PostBulkCreateView(AsyncAPIViewMixin, views.PostBulkCreateView):
+    """View to create a batch of posts (a JSON list) in a few queries"""
+
+
+class PostBulkTagView(AsyncAPIViewMixin, views.PostBulkTagView):
+    """View to attach tags to, or detach them from, many of your posts at once"""
+
+
+class PostMultiGetView(AsyncAPIViewMixin, views.PostMultiGetView):
+    """View to retrieve many posts at once with `?ids=1,2,3`, in a fixed number of queries"""
+
+    async def get(self, request, *args, **kwargs):
+        return await self.acached_response(request, self.abuild_response)
+
+    async def abuild_response(self):
+        ids = self.get_ids()
+        return self.multi_get_response(ids, await self.get_queryset().ain_bulk(ids))
+
+
+class PostsByCategory(AsyncAPIViewMixin, AsyncListMixin, views.PostsByCategory):
+    """View to list all posts in a specific category"""
+
+
+class PostsByAuthorView(AsyncAPIViewMixin, AsyncListMixin, views.PostsByAuthorView):
+    """View to list all posts by a specific author"""
+
+
+class CommentListCreateView(AsyncAPIViewMixin, AsyncListMixin, views.CommentListCreateView):
+    """View to list or create comments for a specific post"""
+
+    async def aget_validators(self):
+        last_activity = await Post.objects.filter(pk=self.kwargs["post_id"]).values_list("last_activity", flat=True).afirst()
+        return self.validators_from_last_activity(last_activity, await ascope_versions(["global"]) if last_activity else None)
+
+    async def get(self, request, *args, **kwargs):
+        """Handle GET request"""
+        return await self.aconditional_response(request, lambda: self.alist(request))
+
+
+class MostLikedPostsView(AsyncAPIViewMixin, AsyncListMixin, views.MostLikedPostsView):
+    """View to list most liked posts"""
+
+
+class HighestRatedPostsView(AsyncAPIViewMixin, AsyncListMixin, views.HighestRatedPostsView):
+    """View to list highest rated posts, ranked by their Bayesian weighted rating"""
+
+
+class TrendingPostsView(AsyncAPIViewMixin, AsyncListMixin, views.TrendingPostsView):
+    """View to list trending posts, ranked by their time-decayed engagement"""
+
+
+class PostShareView(AsyncAPIViewMixin, views.PostShareView):
+    """View to share a post via email."""
+
+    async def post(self, request, *args, **kwargs):
+        post = await aget_object_or_404(Post, id=self.kwargs["post_id"])
+        recipient_email = request.data.get("email")
+
+        if not recipient_email:
+            return Response({"detail": "Email is required to share the post."}, status=status.HTTP_400_BAD_REQUEST)
+
+        await aenqueue_email(*self.compose(post), settings.DEFAULT_FROM_EMAIL, recipient_email)
+
+        return Response({"detail": "Post will be shared shortly!"}, status=status.HTTP_202_ACCEPTED)
+
+
+class FollowListCreateView(AsyncAPIViewMixin, AsyncListMixin, views.FollowListCreateView):
+    """View to list the authors, tags and categories you follow, or follow one"""
+
+    async def get(self, request, *args, **kwargs):
+        return await self.alist(request)    # Per user, not cached
+
+
+class FollowDestroyView(AsyncAPIViewMixin, views.FollowDestroyView):
+    """View to unfollow, the unfollowed posts leave your feed"""
+
+
+class FeedView(AsyncAPIViewMixin, AsyncListMixin, views.FeedView):
+    """View to list the posts of the authors, tags and categories you follow, newest first"""
+
+    async def get(self, request, *args, **kwargs):
+        return await self.alist(request)    # Per user, not cached
+
+
+class MetricsView(AsyncAPIViewMixin, views.MetricsView):
+    """View to read (or reset, with DELETE) the request metrics of this worker process, for staff"""
+
+
+class ExportView(AsyncAPIViewMixin, views.ExportView):
+    """View streaming posts, comments, likes and ratings as NDJSON, for staff"""
+
+    async def get(self, request, *args, **kwargs):
+        # An async response needs an async iterator, a sync one would be read whole first.
+        # The database is picked, and the rows read and encoded, in the sync thread.
+        content, compressed = await sync_to_async(self.get_content)(request)
+        return self.streaming_response(aiterate(content), compressed)
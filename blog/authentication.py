@@ -0,0 +1,188 @@
+"""
+JWT authentication without a user query on every request.
+
+The fields of the user behind a token (AUTH_USER_FIELDS, never the password
+hash) are cached for BLOG_AUTH_USER_CACHE_TIMEOUT seconds and dropped from the
+cache whenever the user is saved or deleted (see blog/signals.py), so a
+deactivation or password change applies on the next request of this process,
+and of the others within the timeout when the cache isn't shared. Views that
+never look at more than the user id can set `stateless_authentication = True`:
+their safe requests get a TokenUser built from the token claims, still refused
+once the cached fields (or the database, when they're missing) say the user is
+inactive.
+
+Rotated refresh tokens are revoked without simplejwt's token_blacklist app, which
+records every token it issues and never forgets them. Only revoked tokens are
+stored (RevokedToken), until they expire and `prune_revoked_tokens` deletes them.
+Membership is a cache lookup by jti: both answers are cached until the token
+expires and revoke() overwrites them, so the table is only read for a token the
+cache doesn't know yet. A worker whose local cache still says "not revoked" lets
+the token through verify(), but rotation then inserts its jti and the primary
+key of RevokedToken refuses the second use.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import (
+    TokenBlacklistSerializer, TokenObtainPairSerializer, TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch, get_md5_hash_password
+
+from .models import RevokedToken
+
+USER_PREFIX = "blog:auth:user:"
+REVOKED_PREFIX = "blog:auth:revoked:"
+
+# What the views read from request.user, the other fields are loaded on access.
+# In the order of the model fields, which Model.from_db() expects.
+AUTH_USER_FIELDS = ("id", "is_superuser", "is_staff", "is_active", "email", "username")
+
+
+def forget_user(user_id):
+    """Drop the cached fields of a user"""
+    cache.delete(f"{USER_PREFIX}{user_id}")
+
+
+def cached_user_fields(user_id):
+    """
+    AUTH_USER_FIELDS of `user_id` and the digest of its password hash that
+    tokens carry with CHECK_REVOKE_TOKEN (else None), from the cache or one
+    query. None if there is no such user.
+    """
+    key = f"{USER_PREFIX}{user_id}"
+    cached = cache.get(key)
+    if cached is None:
+        row = get_user_model().objects.filter(pk=user_id).values_list(*AUTH_USER_FIELDS, "password").first()
+        if row is None:
+            return None
+        *values, password = row
+        cached = (values, get_md5_hash_password(password) if jwt_settings.CHECK_REVOKE_TOKEN else None)
+        cache.set(key, cached, getattr(settings, "BLOG_AUTH_USER_CACHE_TIMEOUT", 300))
+    return cached
+
+
+async def aprefetch_user_fields(request):
+    """
+    Load the cached fields of the user of the JWT of `request` for
+    CachedJWTAuthentication, so that async views authenticate it on the event
+    loop. Invalid tokens are left for the authentication to refuse.
+    """
+    authentication = JWTAuthentication()
+    try:
+        validated_token = authentication.get_validated_token(
+            authentication.get_raw_token(authentication.get_header(request))
+        )
+        user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+    except (InvalidToken, KeyError):
+        return
+    cached = await cache.aget(f"{USER_PREFIX}{user_id}")
+    if cached is None:
+        cached = await sync_to_async(cached_user_fields)(user_id)
+    request.prefetched_user_fields = {user_id: cached}
+
+
+def authenticates_statelessly(request, view):
+    return request.method in SAFE_METHODS and getattr(view, "stateless_authentication", False)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication with a cached user lookup and stateless safe requests, see above"""
+
+    def authenticate(self, request):
+        # Authenticators are instantiated per request
+        self.stateless = authenticates_statelessly(request, request.parser_context.get("view"))
+        self.prefetched = getattr(request, "prefetched_user_fields", {})
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        """The user of the token checked the way JWTAuthentication does, from the cached fields"""
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        cached = self.prefetched[user_id] if user_id in self.prefetched else cached_user_fields(user_id)
+        if cached is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        values, password_digest = cached
+        user_model = get_user_model()
+        user = user_model.from_db(router.db_for_read(user_model), AUTH_USER_FIELDS, values)
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if jwt_settings.CHECK_REVOKE_TOKEN and validated_token.get(jwt_settings.REVOKE_TOKEN_CLAIM) != password_digest:
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        if self.stateless:
+            return JWTStatelessUserAuthentication.get_user(self, validated_token)
+        return user
+
+
+def seconds_until(expires_at):
+    return max((expires_at - timezone.now()).total_seconds(), 1)
+
+
+def is_revoked(jti, expires_at):
+    """Whether the refresh token `jti`, valid until `expires_at`, was revoked. Usually without a query."""
+    key = f"{REVOKED_PREFIX}{jti}"
+    revoked = cache.get(key)
+    if revoked is None:
+        revoked = RevokedToken.objects.filter(pk=jti).exists()
+        cache.set(key, revoked, seconds_until(expires_at))
+    return revoked
+
+
+def revoke(token):
+    """Revoke a refresh token, failing if it already was: of two concurrent rotations only one wins"""
+    jti = token[jwt_settings.JTI_CLAIM]
+    expires_at = datetime_from_epoch(token["exp"])
+    try:
+        with transaction.atomic(using=router.db_for_write(RevokedToken)):
+            RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+    except IntegrityError:
+        raise TokenError(_("Token is blacklisted"))
+    cache.set(f"{REVOKED_PREFIX}{jti}", True, seconds_until(expires_at))   # Over a cached "not revoked"
+
+
+class RevocableRefreshToken(RefreshToken):
+    """RefreshToken checked against, and added to, the RevokedToken blacklist"""
+
+    def verify(self):
+        super().verify()
+        if is_revoked(self[jwt_settings.JTI_CLAIM], datetime_from_epoch(self["exp"])):
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        revoke(self)
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """Rotation revokes the refresh token given, see BLACKLIST_AFTER_ROTATION"""
+    token_class = RevocableRefreshToken
+
+
+class RevocableTokenBlacklistSerializer(TokenBlacklistSerializer):
+    """Logout: revoke a refresh token before it expires"""
+    token_class = RevocableRefreshToken
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Issue tokens carrying the claims the stateless TokenUser reads"""
+    token_class = RevocableRefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token["username"] = user.username
+        token["is_staff"] = user.is_staff
+        token["is_superuser"] = user.is_superuser
+        return token
@@ -0,0 +1,193 @@
+"""
+Response cache for the read endpoints.
+
+Every cached response depends on one or more scopes ("post:12", "category:python",
+"leaderboard", ...). Each scope has a version token stored in the cache, and the
+tokens are part of the response key, so a write only has to replace the tokens of
+the scopes it touches (see blog/signals.py) for every dependent response to miss.
+A token that gets evicted is recreated with a new value, which also just misses.
+Size and lifetime are bounded by the CACHES settings (LRU culling, TIMEOUT).
+
+Tokens are the time of the write, so a response missing within
+DATABASE_REPLICA_PIN_SECONDS of one is built from the primary: a lagging read
+replica would otherwise get its old rows cached under the new token, for every
+client, until the next write.
+"""
+
+import hashlib
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .conditional import ConditionalGetMixin, make_etag
+from .routers import reset_read_alias, use_read_alias
+
+VERSION_PREFIX = "blog:scope:"
+RESPONSE_PREFIX = "blog:response:"
+
+_stats = defaultdict(lambda: {"hits": 0, "misses": 0})
+_stats_lock = threading.Lock()
+
+
+def _new_token():
+    return time.time_ns()
+
+
+def invalidate(*scopes):
+    """Make every cached response depending on `scopes` stale"""
+    scopes = {scope for scope in scopes if scope}
+    if scopes:
+        cache.set_many({VERSION_PREFIX + scope: _new_token() for scope in scopes}, timeout=None)
+
+
+def scope_versions(scopes):
+    """Current version tokens of `scopes`, creating the missing ones"""
+    keys = [VERSION_PREFIX + scope for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: _new_token() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+async def ascope_versions(scopes):
+    """scope_versions() for async views"""
+    keys = [VERSION_PREFIX + scope for scope in scopes]
+    versions = await cache.aget_many(keys)
+    missing = {key: _new_token() for key in keys if key not in versions}
+    if missing:
+        await cache.aset_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def version_time(version):
+    """When the token `version` was made: the time of the last write to its scope, or of its creation"""
+    return datetime.fromtimestamp(version / 1e9, tz=dt_timezone.utc)
+
+
+def recently_written(versions):
+    """Whether a token of `versions` is younger than the replication lag allowed by DATABASE_REPLICA_PIN_SECONDS"""
+    return time.time_ns() - max(versions) < getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 10) * 1_000_000_000
+
+
+def record(view_name, hit):
+    with _stats_lock:
+        _stats[view_name]["hits" if hit else "misses"] += 1
+
+
+def stats():
+    """Hit and miss counts per view since the process started"""
+    with _stats_lock:
+        return {name: dict(counts) for name, counts in _stats.items()}
+
+
+class CachedResponseMixin(ConditionalGetMixin):
+    """
+    Cache the successful GET responses of a view. Views list the scopes their
+    output depends on in get_cache_scopes() and wrap the work in cached_response().
+
+    The scope tokens double as conditional GET validators: the ETag is derived
+    from the cache key and Last-Modified from the newest token, so a 304 costs
+    no database query at all. Views with a cheaper exact validator can override
+    get_validators().
+    """
+
+    def get_cache_scopes(self):
+        raise NotImplementedError
+
+    def get_scope_versions(self):
+        if not hasattr(self, "_scope_versions"):
+            self._scope_versions = scope_versions(["global", *self.get_cache_scopes()])
+        return self._scope_versions
+
+    async def aget_scope_versions(self):
+        if not hasattr(self, "_scope_versions"):
+            self._scope_versions = await ascope_versions(["global", *self.get_cache_scopes()])
+        return self._scope_versions
+
+    def get_cache_key(self, request):
+        # Host and full path: next/previous links are absolute and depend on the query string.
+        # The date: day windows of the leaderboards move without any write.
+        raw = "|".join([
+            request.get_host(), request.get_full_path(), str(timezone.localdate()),
+            *map(str, self.get_scope_versions()),
+        ])
+        return RESPONSE_PREFIX + hashlib.sha256(raw.encode()).hexdigest()
+
+    def get_validators(self):
+        etag = make_etag(self.get_cache_key(self.request), self.representation_format())
+        last_modified = version_time(max(self.get_scope_versions()))
+        return etag, last_modified
+
+    async def aget_validators(self):
+        await self.aget_scope_versions()    # get_validators() then finds the tokens memoized
+        return self.get_validators()
+
+    def cached_response(self, request, build):
+        return self.conditional_response(request, lambda: self.cache_or_build(request, build))
+
+    async def acached_response(self, request, build):
+        """cached_response() for async views, `build` is a coroutine function"""
+        await self.aget_scope_versions()
+        return await self.aconditional_response(request, lambda: self.acache_or_build(request, build))
+
+    def cache_or_build(self, request, build):
+        timeout = getattr(settings, "BLOG_RESPONSE_CACHE_TIMEOUT", 300)
+        if not timeout:
+            return build()
+
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        record(type(self).__name__, hit=data is not None)
+        if data is not None:
+            return self.hit_response(data)
+
+        token = use_read_alias(None) if recently_written(self.get_scope_versions()) else None
+        try:
+            response = build()
+        finally:
+            if token is not None:
+                reset_read_alias(token)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, timeout)
+        response["X-Cache"] = "MISS"
+        return response
+
+    async def acache_or_build(self, request, build):
+        timeout = getattr(settings, "BLOG_RESPONSE_CACHE_TIMEOUT", 300)
+        if not timeout:
+            return await build()
+
+        key = self.get_cache_key(request)
+        data = await cache.aget(key)
+        record(type(self).__name__, hit=data is not None)
+        if data is not None:
+            return self.hit_response(data)
+
+        token = use_read_alias(None) if recently_written(self.get_scope_versions()) else None
+        try:
+            response = await build()
+        finally:
+            if token is not None:
+                reset_read_alias(token)
+        if response.status_code == status.HTTP_200_OK:
+            await cache.aset(key, response.data, timeout)
+        response["X-Cache"] = "MISS"
+        return response
+
+    def hit_response(self, data):
+        response = Response(data, status=status.HTTP_200_OK)
+        response["X-Cache"] = "HIT"
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
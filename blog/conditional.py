@@ -0,0 +1,59 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+
+
+def make_etag(*parts):
+    """Strong ETag hashed from the values that determine a representation"""
+    return '"{}"'.format(hashlib.sha256("|".join(map(str, parts)).encode()).hexdigest()[:32])
+
+
+class ConditionalGetMixin:
+    """
+    HTTP conditional requests for GET handlers. Views implement get_validators()
+    with a cheap metadata-only lookup, and wrap the expensive part of the handler
+    in conditional_response(), which answers If-None-Match / If-Modified-Since
+    with a 304 before anything is serialized.
+    """
+
+    def get_validators(self):
+        """Return (etag, last_modified datetime), either may be None"""
+        return None, None
+
+    def representation_format(self):
+        """The same data renders differently as JSON and in the browsable API"""
+        renderer = getattr(self.request, "accepted_renderer", None)
+        return renderer.format if renderer else ""
+
+    async def aget_validators(self):
+        """get_validators() for async views, which must override it if it queries the database"""
+        return self.get_validators()
+
+    def conditional_response(self, request, build):
+        etag, last_modified = self.get_validators()
+        return self.not_modified(request, etag, last_modified) or self.add_validators(build(), etag, last_modified)
+
+    async def aconditional_response(self, request, build):
+        """conditional_response() for async views, `build` is a coroutine function"""
+        etag, last_modified = await self.aget_validators()
+        return self.not_modified(request, etag, last_modified) or self.add_validators(await build(), etag, last_modified)
+
+    def not_modified(self, request, etag, last_modified):
+        """The 304 response if the client's copy is still current, else None"""
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        if not (etag or timestamp):
+            return None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if not_modified is not None and etag:
+            not_modified["ETag"] = etag
+        return not_modified
+
+    def add_validators(self, response, etag, last_modified):
+        if response.status_code == status.HTTP_200_OK:
+            if etag:
+                response["ETag"] = etag
+            if last_modified:
+                response["Last-Modified"] = http_date(int(last_modified.timestamp()))
+        return response
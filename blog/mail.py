@@ -0,0 +1,100 @@
+"""
+Database-backed outgoing email queue.
+
+Requests only insert a QueuedEmail row, the `send_queued_emails` command
+delivers them in batches over a single SMTP connection, retrying failures
+with exponential backoff.
+
+Workers claim a message by pushing its next_attempt_at past the lease with a
+conditional UPDATE, which only matches while the message still holds the value
+the worker read: of two workers racing for it, one updates a row and the other
+none. The value written doubles as the lease: it's renewed the same way right
+before each send, so a message whose lease ran out during a slow batch, and
+that another worker claimed since, is skipped instead of sent twice.
+"""
+
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import QueuedEmail
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 60           # Seconds before the first retry, doubled after every failure
+BACKOFF_MAX = 60 * 60
+LEASE = timedelta(minutes=5)    # How long a claimed message stays hidden from other workers, renewed before its send
+
+
+def enqueue_email(subject, body, from_email, to):
+    """Queue a message to `to` for the worker, returns the QueuedEmail"""
+    return QueuedEmail.objects.create(subject=subject, body=body, from_email=from_email, to=to)
+
+
+async def aenqueue_email(subject, body, from_email, to):
+    """enqueue_email() for async views"""
+    return await QueuedEmail.objects.acreate(subject=subject, body=body, from_email=from_email, to=to)
+
+
+def take_lease(email):
+    """Hide `email` from other workers for LEASE, False if another worker changed it since it was read"""
+    lease = timezone.now() + LEASE
+    if not QueuedEmail.objects.filter(
+        pk=email.pk, status=QueuedEmail.PENDING, next_attempt_at=email.next_attempt_at,
+    ).update(next_attempt_at=lease):
+        return False
+    email.next_attempt_at = lease
+    return True
+
+
+def claim_batch(batch_size):
+    """Take the next due messages that no other worker claimed in the meantime"""
+    due = (
+        QueuedEmail.objects.filter(status=QueuedEmail.PENDING, next_attempt_at__lte=timezone.now())
+        .order_by("next_attempt_at", "id")[:batch_size]
+    )
+    return [email for email in due if take_lease(email)]
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX))
+
+
+def deliver_queued_emails(batch_size=50):
+    """
+    Send one batch of due messages over a single connection.
+    Returns a dict with the number of sent, retried and failed messages.
+    """
+    batch = claim_batch(batch_size)
+    result = {"sent": 0, "retried": 0, "failed": 0}
+    if not batch:
+        return result
+
+    connection = get_connection()
+    try:
+        for email in batch:
+            if not take_lease(email):
+                continue    # The lease ran out and another worker has the message now
+            try:
+                connection.open()   # No-op while the connection is up, reconnects after an error
+                EmailMessage(email.subject, email.body, email.from_email, [email.to], connection=connection).send()
+            except Exception as error:
+                connection.close()
+                email.attempts += 1
+                email.last_error = f"{type(error).__name__}: {error}"
+                if email.attempts >= MAX_ATTEMPTS:
+                    email.status = QueuedEmail.FAILED
+                    result["failed"] += 1
+                else:
+                    email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+                    result["retried"] += 1
+                email.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+            else:
+                email.attempts += 1
+                email.status = QueuedEmail.SENT
+                email.sent_at = timezone.now()
+                email.save(update_fields=["attempts", "status", "sent_at"])
+                result["sent"] += 1
+    finally:
+        connection.close()
+    return result
@@ -0,0 +1,59 @@
+import gzip
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blog.export import CHUNK_SIZE, EXPORTS, encode, export_rows, parse_since, parse_types
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream posts, comments, likes and ratings as newline-delimited JSON, in constant memory. "
+        "The first line's started_at is the --since of the next incremental export, see blog/export.py"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--types", default=",".join(EXPORTS), help=f"Row types to export (default: {','.join(EXPORTS)})")
+        parser.add_argument("--since", help="Only export the rows changed since this ISO 8601 datetime")
+        parser.add_argument("--output", help="File to write, standard output by default")
+        parser.add_argument("--gzip", action="store_true", help="Compress the output with gzip")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help=f"Rows per database fetch (default: {CHUNK_SIZE})")
+
+    def handle(self, *args, **options):
+        try:
+            types = parse_types(options["types"])
+            since = parse_since(options["since"]) if options["since"] else None
+        except ValueError as error:
+            raise CommandError(error)
+
+        counts = dict.fromkeys(types, 0)
+
+        def counted(rows):
+            for row in rows:
+                if row["type"] in counts:
+                    counts[row["type"]] += 1
+                yield row
+
+        started = time.perf_counter()
+        output = open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        try:
+            stream = gzip.GzipFile(fileobj=output, mode="wb", mtime=0) if options["gzip"] else output
+            for chunk in encode(counted(export_rows(types, since, chunk_size=options["chunk_size"]))):
+                stream.write(chunk)
+            if stream is not output:
+                stream.close()
+        finally:
+            if options["output"]:
+                output.close()
+            else:
+                output.flush()
+
+        elapsed = time.perf_counter() - started
+        total = sum(counts.values())
+        # The export may be on standard output, the summary goes to standard error
+        self.stderr.write(
+            f"Exported {total} rows ({', '.join(f'{count} {name}' for name, count in counts.items())}) "
+            f"in {elapsed:.1f} s, {total / max(elapsed, 1e-9):.0f} rows/s",
+            style_func=self.style.SUCCESS,
+        )
@@ -0,0 +1,235 @@
+import itertools
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from blog.management.utils import explicit_timestamps
+from blog.models import Category, Comment, CustomUser, FeedEntry, Follow, Like, Post, PostDailyStats, Rating, Tag
+
+WORDS = (
+    "django python sqlite cache query index async view model field serializer request response token "
+    "user post comment tag category feed trend like rating search page cursor batch bulk stream export "
+    "import worker queue signal router replica latency throughput benchmark profile memory thread loop "
+    "the a of and to in is it that for on with as at by from this be are was have not or"
+).split()
+
+
+def zipf_cum_weights(n, skew):
+    """Cumulative weights making rank r about (r + 1) ** -skew likely: a few items get most of the picks"""
+    return list(itertools.accumulate(1 / (rank + 1) ** skew for rank in range(n)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic dataset with bulk inserts: users, categories, tags, posts with tags, comments, "
+        "likes and ratings, skewed like real traffic (a few prolific authors and popular posts). "
+        "The same --seed gives the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--tags", type=int, default=200)
+        parser.add_argument("--posts", type=int, default=10000)
+        parser.add_argument("--max-tags-per-post", type=int, default=5)
+        parser.add_argument("--comments", type=int, default=50000)
+        parser.add_argument("--likes", type=int, default=100000)
+        parser.add_argument("--ratings", type=int, default=30000)
+        parser.add_argument("--follows", type=int, default=10000, help="Follows of authors, tags and categories (default: 10000)")
+        parser.add_argument(
+            "--skew", type=float, default=1.1,
+            help="Zipf exponent of authorship, popularity and activity, 0 for uniform (default: 1.1)",
+        )
+        parser.add_argument("--days", type=int, default=90, help="Posts are spread over this many past days (default: 90)")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+        parser.add_argument("--prefix", default="gen", help="Prefix of the generated usernames and emails (default: gen)")
+        parser.add_argument("--password", default="password123", help="Password of every generated user")
+        parser.add_argument("--batch-size", type=int, default=2000, help="Rows per INSERT (default: 2000)")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options["seed"])
+        self.now = timezone.now()
+        self.timezone = timezone.get_current_timezone()
+        prefix = options["prefix"]
+        if CustomUser.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f"Users named {prefix}* already exist, pick another --prefix")
+        if len(f"{prefix}{options['users']}") > CustomUser._meta.get_field("username").max_length:
+            raise CommandError("--prefix is too long for that many usernames")
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            users = self.step("users", self.create_users)
+            categories = self.step("categories", self.create_categories)
+            tags = self.step("tags", self.create_tags)
+            posts = self.step("posts", lambda: self.create_posts(users, categories, tags))
+            self.step("comments", lambda: self.create_comments(posts, users))
+            buckets = defaultdict(lambda: [0, 0, 0])    # (post id, day) -> like count, rating sum, rating count
+            self.step("likes", lambda: self.create_likes(posts, users, buckets))
+            self.step("ratings", lambda: self.create_ratings(posts, users, buckets))
+            self.step("daily stats", lambda: PostDailyStats.objects.bulk_create(
+                [
+                    PostDailyStats(post_id=post_id, day=day, like_count=likes, rating_sum=rating_sum, rating_count=rating_count)
+                    for (post_id, day), (likes, rating_sum, rating_count) in buckets.items()
+                ],
+                batch_size=options["batch_size"],
+            ))
+            self.step("follows", lambda: self.create_follows(users, categories, tags))
+            self.step("feed entries", lambda: self.fan_out(posts))
+
+        # Bulk inserts skip the signals, so the derived data is rebuilt in one go
+        call_command("rebuild_post_counters", stdout=self.stdout)
+        call_command("rebuild_search_index", stdout=self.stdout)
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated the dataset in {time.perf_counter() - started:.1f} s (user {prefix}0 is staff, "
+            f"every user's password is {options['password']!r})"
+        ))
+
+    def step(self, name, create):
+        started = time.perf_counter()
+        rows = create()
+        elapsed = time.perf_counter() - started
+        count = rows if isinstance(rows, int) else len(rows)
+        self.stdout.write(f"{count:>9} {name:<12} {elapsed:6.2f} s  {count / max(elapsed, 1e-9):>9.0f} rows/s")
+        return rows
+
+    def pick(self, population, k, skew=None):
+        """`k` items of `population` drawn with replacement, the first ones the most often"""
+        skew = self.options["skew"] if skew is None else skew
+        return self.rng.choices(population, cum_weights=zipf_cum_weights(len(population), skew), k=k)
+
+    def text(self, low, high):
+        return " ".join(self.rng.choices(WORDS, k=self.rng.randint(low, high)))
+
+    def engagement_time(self, post):
+        """Some time after `post` was published, most engagement comes early"""
+        return post.published_date + (self.now - post.published_date) * self.rng.random() ** 2
+
+    def create_users(self):
+        options, prefix = self.options, self.options["prefix"]
+        password = make_password(options["password"])   # Hashed once, hashing per user would dominate
+        users = [
+            CustomUser(
+                username=f"{prefix}{i}", email=f"{prefix}{i}@example.com", password=password,
+                is_staff=i == 0, date_joined=self.now,
+            )
+            for i in range(options["users"])
+        ]
+        users = CustomUser.objects.bulk_create(users, batch_size=options["batch_size"])
+        self.rng.shuffle(users)     # So the most active users aren't simply the first ids
+        return users
+
+    def create_categories(self):
+        prefix = self.options["prefix"]
+        # Lowercased like Category.save() does, bulk_create() skips it
+        return Category.objects.bulk_create(
+            [Category(name=f"{prefix}-{WORDS[i % len(WORDS)]}-{i}".lower()) for i in range(self.options["categories"])]
+        )
+
+    def create_tags(self):
+        prefix = self.options["prefix"]
+        names = [f"{prefix}-{WORDS[i % len(WORDS)]}-{i}" for i in range(self.options["tags"])]
+        return Tag.objects.bulk_create([Tag(name=name, slug=name) for name in names], batch_size=self.options["batch_size"])
+
+    def create_posts(self, users, categories, tags):
+        options = self.options
+        count, span = options["posts"], timedelta(days=options["days"])
+        posts = []
+        for author, category in zip(self.pick(users, count), self.pick(categories, count)):
+            published = self.now - span * self.rng.random()
+            posts.append(Post(
+                title=self.text(3, 10).capitalize(), content=self.text(40, 400), author_id=author.pk, category_id=category.pk,
+                published_date=published, updated=published, last_activity=published,
+            ))
+        posts.sort(key=lambda post: post.published_date)    # Ids grow with the publication date, as in production
+        tag_ids = [
+            {tag.pk for tag in self.pick(tags, self.rng.randint(0, options["max_tags_per_post"]))}
+            for _ in posts
+        ]
+        with explicit_timestamps(posts, "published_date", "updated"):
+            posts = Post.objects.bulk_create(posts, batch_size=options["batch_size"])
+        through = Post.tags.through
+        through.objects.bulk_create(
+            [through(post_id=post.pk, tag_id=tag_id) for post, ids in zip(posts, tag_ids) for tag_id in ids],
+            batch_size=options["batch_size"],
+        )
+        popular = posts[:]
+        self.rng.shuffle(popular)   # Popularity is independent of age
+        return popular
+
+    def create_comments(self, posts, users):
+        comments = []
+        for post, author in zip(self.pick(posts, self.options["comments"]), self.pick(users, self.options["comments"])):
+            created = self.engagement_time(post)
+            comments.append(Comment(
+                post_id=post.pk, author_id=author.pk, content=self.text(3, 60), created_at=created, updated_at=created,
+            ))
+        comments.sort(key=lambda comment: comment.created_at)
+        with explicit_timestamps(comments, "created_at", "updated_at"):
+            return Comment.objects.bulk_create(comments, batch_size=self.options["batch_size"])
+
+    def day(self, moment):
+        return moment.astimezone(self.timezone).date()
+
+    def engagement_pairs(self, posts, users, count):
+        """Up to `count` distinct (post, user) pairs, each user likes or rates a post once"""
+        pairs = {}
+        for _ in range(10):     # Skewed draws repeat the popular pairs, draw again for the missing ones
+            missing = count - len(pairs)
+            if not missing:
+                break
+            for post, user in zip(self.pick(posts, missing), self.pick(users, missing)):
+                pairs.setdefault((post.pk, user.pk), post)
+        return [(post, user_id) for (_, user_id), post in pairs.items()]
+
+    def create_likes(self, posts, users, buckets):
+        likes = []
+        for post, user_id in self.engagement_pairs(posts, users, self.options["likes"]):
+            like = Like(post_id=post.pk, user_id=user_id, created_at=self.engagement_time(post))
+            buckets[post.pk, self.day(like.created_at)][0] += 1
+            likes.append(like)
+        return Like.objects.bulk_create(likes, batch_size=self.options["batch_size"])
+
+    def create_ratings(self, posts, users, buckets):
+        ratings = []
+        for post, user_id in self.engagement_pairs(posts, users, self.options["ratings"]):
+            rating = Rating(
+                post_id=post.pk, user_id=user_id, rating=self.rng.choices([1, 2, 3, 4, 5], weights=[1, 1, 3, 5, 4])[0],
+                updated_at=self.engagement_time(post),
+            )
+            bucket = buckets[post.pk, self.day(rating.updated_at)]
+            bucket[1] += rating.rating
+            bucket[2] += 1
+            ratings.append(rating)
+        with explicit_timestamps(ratings, "updated_at"):
+            return Rating.objects.bulk_create(ratings, batch_size=self.options["batch_size"])
+
+    def create_follows(self, users, categories, tags):
+        """Follows of the prolific authors (the first users) and the popular tags and categories, by any user"""
+        count = self.options["follows"]
+        names = self.rng.choices(["author", "tag", "category"], weights=[16, 3, 1], k=count)
+        targets = {name: iter(self.pick(population, names.count(name))) for name, population in
+                   (("author", users), ("tag", tags), ("category", categories))}
+        follows = {}
+        for follower, name in zip(self.rng.choices(users, k=count), names):
+            target = next(targets[name])
+            if target is not follower:
+                follows.setdefault((follower.pk, name, target.pk), Follow(user_id=follower.pk, **{f"{name}_id": target.pk}))
+        follows = Follow.objects.bulk_create(follows.values(), batch_size=self.options["batch_size"])
+        Follow.objects.update_fan_out_mode({follow.author_id for follow in follows if follow.author_id})
+        return follows
+
+    def fan_out(self, posts):
+        """Fan out the posts of the last week, as if followed a week ago: the feeds of the tag and category followers would be huge otherwise"""
+        since = self.now - timedelta(days=7)
+        FeedEntry.objects.fan_out([post.pk for post in posts if post.published_date >= since])
+        return FeedEntry.objects.count()
@@ -0,0 +1,341 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.text import slugify
+
+from blog.management.utils import explicit_timestamps
+from blog.models import Category, Comment, CustomUser, ImportCheckpoint, ImportedRecord, Post, Tag, comments_bulk_created
+
+KINDS = ("user", "post", "comment")     # Records of a chunk are written in this order, so they can refer to earlier ones
+
+
+def read_records(path, skip):
+    """The records of a JSONL or CSV file after the first `skip`, None for blank lines"""
+    with open(path, newline="", encoding="utf-8") as file:
+        if path.suffix.lower() == ".csv":
+            for row in islice(csv.DictReader(file), skip, None):
+                yield {name: value for name, value in row.items() if value not in ("", None)}
+        else:
+            for line in islice(file, skip, None):
+                yield json.loads(line) if line.strip() else None
+
+
+def text(record, name, model, field=None):
+    """Required string `name` of `record`, within the max_length of `field` of `model`"""
+    value = record.get(name)
+    if value in (None, ""):
+        raise ValueError(f"{name} is missing")
+    value = str(value)
+    max_length = model._meta.get_field(field or name).max_length
+    if max_length and len(value) > max_length:
+        raise ValueError(f"{name} is longer than {max_length} characters")
+    return value
+
+
+def moment(record, name, default):
+    value = record.get(name)
+    if value in (None, ""):
+        return default
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        raise ValueError(f"{name} isn't an ISO 8601 datetime")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class Chunk:
+    """Records of one chunk, parsed and grouped by kind, with their passwords being hashed"""
+
+    def __init__(self, end):
+        self.end = end      # Checkpoint position once written
+        self.records = {kind: [] for kind in KINDS}
+        self.rejected = []
+        self.hashes = iter(())
+
+
+class Command(BaseCommand):
+    help = (
+        "Import users, posts (with their category and tags) and comments from a JSONL or CSV file with bulk "
+        "inserts, a transaction per chunk. Every chunk saves a checkpoint: rerunning the same command on the "
+        "unchanged file resumes after the last imported chunk. "
+        "Records have a `type` (user, post or comment, or --type for the whole file) and an `id`, their key in "
+        "the source. Users: email, username, and a plain `password` or a Django `password_hash`. Posts: author "
+        "(a user id), title, content, category (a name), tags (a list of names, separated by | in CSV), "
+        "published_date, updated. Comments: post and author ids, content, created_at. Records must come after "
+        "the ones they refer to."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="JSONL file, or CSV with a .csv extension")
+        parser.add_argument("--type", choices=KINDS, help="Type of the records without a `type` field")
+        parser.add_argument(
+            "--source", default="legacy",
+            help="Name of the source whose record ids the references use, across its files (default: legacy)",
+        )
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Records per transaction (default: 2000)")
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(),
+            help="Processes hashing passwords, 0 to hash in this one (default: one per CPU)",
+        )
+        parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and read from the start")
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.is_file():
+            raise CommandError(f"No file at {path}")
+        self.options = options
+        self.source = options["source"]
+        if len(self.source) > ImportCheckpoint._meta.get_field("source").max_length:
+            raise CommandError("--source is too long")
+        self.tags, self.categories = {}, {}     # Name -> id, each looked up or created once
+
+        stat = path.stat()
+        self.checkpoint, _ = ImportCheckpoint.objects.get_or_create(
+            source=self.source, file=str(path.resolve()), fingerprint=f"{stat.st_size}:{stat.st_mtime_ns}",
+        )
+        position = 0 if options["restart"] else self.checkpoint.position
+        if position:
+            self.stdout.write(f"Resuming {path.name} after record {position}")
+        records = read_records(path, position)
+        self.pool = ProcessPoolExecutor(options["workers"], initializer=django.setup) if options["workers"] else None
+        self.started = time.perf_counter()
+        self.totals = {"imported": 0, "skipped": 0, "rejected": 0}
+        try:
+            # The passwords of a chunk are hashed while the previous one is written
+            pending = None
+            while records_chunk := list(islice(records, options["chunk_size"])):
+                chunk = self.prepare(records_chunk, position)
+                position = chunk.end
+                if pending:
+                    self.write(pending)
+                pending = chunk
+            if pending:
+                self.write(pending)
+        except json.JSONDecodeError as error:
+            raise CommandError(f"Invalid JSON after record {position}: {error}")
+        finally:
+            if self.pool:
+                self.pool.shutdown(cancel_futures=True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.totals['imported']} records in {time.perf_counter() - self.started:.1f} s "
+            f"({self.totals['skipped']} already imported, {self.totals['rejected']} rejected)"
+        ))
+
+    def prepare(self, records, start):
+        chunk = Chunk(start + len(records))
+        for position, record in enumerate(records, start=start + 1):
+            if record is None:
+                continue
+            kind = record.get("type") or self.options["type"]
+            try:
+                if kind not in KINDS:
+                    raise ValueError(f"type {kind!r} isn't one of {', '.join(KINDS)}")
+                chunk.records[kind].append(getattr(self, f"parse_{kind}")(record))
+            except ValueError as error:
+                chunk.rejected.append(f"Record {position}: {error}")
+
+        passwords = [user["password"] for user in chunk.records["user"] if user["password_hash"] is None]
+        if passwords and self.pool:
+            chunksize = max(len(passwords) // (4 * self.options["workers"]), 1)
+            chunk.hashes = self.pool.map(make_password, passwords, chunksize=chunksize)
+        else:
+            chunk.hashes = map(make_password, passwords)
+        return chunk
+
+    def parse_user(self, record):
+        password = record.get("password")
+        return {
+            "key": text(record, "id", ImportedRecord, "key"),
+            "email": CustomUser.objects.normalize_email(text(record, "email", CustomUser)),
+            "username": text(record, "username", CustomUser),
+            "password": str(password) if password else None,
+            # Without a password the account can't log in until it's reset, like create_user(password=None)
+            "password_hash": record.get("password_hash") or (None if password else make_password(None)),
+            "date_joined": moment(record, "date_joined", timezone.now()),
+        }
+
+    def parse_post(self, record):
+        tags = record.get("tags") or []
+        if isinstance(tags, str):
+            tags = tags.split("|")
+        published = moment(record, "published_date", timezone.now())
+        return {
+            "key": text(record, "id", ImportedRecord, "key"),
+            "author": text(record, "author", ImportedRecord, "key"),
+            "title": text(record, "title", Post),
+            "content": text(record, "content", Post),
+            # Lowercased like Category.save() does
+            "category": text(record, "category", Category, "name").lower() if record.get("category") else None,
+            "tags": list(dict.fromkeys(text({"tag": tag}, "tag", Tag, "name") for tag in tags if tag)),
+            "published_date": published,
+            "updated": moment(record, "updated", published),
+        }
+
+    def parse_comment(self, record):
+        created = moment(record, "created_at", timezone.now())
+        return {
+            "key": text(record, "id", ImportedRecord, "key"),
+            "post": text(record, "post", ImportedRecord, "key"),
+            "author": text(record, "author", ImportedRecord, "key"),
+            "content": text(record, "content", Comment),
+            "created_at": created,
+            "updated_at": moment(record, "updated_at", created),
+        }
+
+    def write(self, chunk):
+        hashes = iter(list(chunk.hashes))   # Waits for the pool, outside the transaction
+        for user in chunk.records["user"]:
+            if user["password_hash"] is None:
+                user["password_hash"] = next(hashes)
+        counts = {"imported": 0, "skipped": 0, "rejected": len(chunk.rejected)}
+        with transaction.atomic():
+            for kind in KINDS:
+                records = self.new_records(kind, chunk.records[kind], counts)
+                if records:
+                    getattr(self, f"write_{kind}s")(records, chunk.rejected, counts)
+            ImportCheckpoint.objects.filter(pk=self.checkpoint.pk).update(position=chunk.end, updated_at=timezone.now())
+
+        for message in chunk.rejected:
+            self.stderr.write(message)
+        for name, count in counts.items():
+            self.totals[name] += count
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(
+            f"{chunk.end:>10} records read  {self.totals['imported']:>10} imported  "
+            f"{self.totals['imported'] / max(elapsed, 1e-9):>8.0f} rows/s"
+        )
+
+    def new_records(self, kind, records, counts):
+        """`records` not imported yet, the first of each key"""
+        unique = {}
+        for record in records:
+            unique.setdefault(record["key"], record)
+        known = set(self.resolve(kind, unique))
+        counts["skipped"] += len(records) - len(unique) + len(known)
+        return [record for key, record in unique.items() if key not in known]
+
+    def resolve(self, kind, keys):
+        """Object ids of the records of `kind` imported under `keys`, by key"""
+        return dict(
+            ImportedRecord.objects.filter(source=self.source, kind=kind, key__in=list(keys)).values_list("key", "object_id")
+        )
+
+    def remember(self, kind, records, object_ids):
+        ImportedRecord.objects.bulk_create(
+            [
+                ImportedRecord(source=self.source, kind=kind, key=record["key"], object_id=object_id)
+                for record, object_id in zip(records, object_ids)
+            ],
+            batch_size=self.options["chunk_size"],
+        )
+
+    def reject(self, kind, record, reason, rejected, counts):
+        rejected.append(f"{kind.capitalize()} {record['key']}: {reason}")
+        counts["rejected"] += 1
+
+    def write_users(self, records, rejected, counts):
+        # Users that already have an account are linked to it
+        existing = dict(CustomUser.objects.filter(email__in=[record["email"] for record in records]).values_list("email", "id"))
+        taken = set(CustomUser.objects.filter(username__in=[record["username"] for record in records]).values_list("username", flat=True))
+        new, linked = [], []
+        for record in records:
+            if record["email"] in existing:
+                linked.append(record)
+            elif record["username"] in taken:
+                self.reject("user", record, f"username {record['username']} is taken", rejected, counts)
+            else:
+                taken.add(record["username"])
+                existing[record["email"]] = None    # Later records with this email are the same user
+                new.append(record)
+        users = CustomUser.objects.bulk_create([
+            CustomUser(
+                email=record["email"], username=record["username"], password=record["password_hash"],
+                date_joined=record["date_joined"],
+            )
+            for record in new
+        ], batch_size=self.options["chunk_size"])
+        existing.update((user.email, user.pk) for user in users)
+        self.remember("user", new + linked, [user.pk for user in users] + [existing[record["email"]] for record in linked])
+        counts["imported"] += len(new) + len(linked)
+
+    def write_posts(self, records, rejected, counts):
+        authors = self.resolve("user", {record["author"] for record in records})
+        categories = self.category_ids({record["category"] for record in records if record["category"]})
+        tags = self.tag_ids({tag for record in records for tag in record["tags"]})
+        valid, posts = [], []
+        for record in records:
+            if record["author"] not in authors:
+                self.reject("post", record, f"author {record['author']} wasn't imported", rejected, counts)
+                continue
+            valid.append(record)
+            posts.append(Post(
+                title=record["title"], content=record["content"], author_id=authors[record["author"]],
+                category_id=categories.get(record["category"]), published_date=record["published_date"],
+                updated=record["updated"], last_activity=record["updated"],
+            ))
+        with explicit_timestamps(posts, "published_date", "updated"):
+            posts = Post.objects.bulk_create_with_tags(
+                posts, [[tags[name] for name in record["tags"] if name in tags] for record in valid],
+                batch_size=self.options["chunk_size"],
+            )
+        self.remember("post", valid, [post.pk for post in posts])
+        counts["imported"] += len(posts)
+
+    def write_comments(self, records, rejected, counts):
+        posts = self.resolve("post", {record["post"] for record in records})
+        authors = self.resolve("user", {record["author"] for record in records})
+        valid, comments = [], []
+        for record in records:
+            missing = [name for name, known in (("post", posts), ("author", authors)) if record[name] not in known]
+            if missing:
+                self.reject("comment", record, f"{' and '.join(missing)} wasn't imported", rejected, counts)
+                continue
+            valid.append(record)
+            comments.append(Comment(
+                post_id=posts[record["post"]], author_id=authors[record["author"]], content=record["content"],
+                created_at=record["created_at"], updated_at=record["updated_at"],
+            ))
+        with explicit_timestamps(comments, "created_at", "updated_at"):
+            comments = Comment.objects.bulk_create(comments, batch_size=self.options["chunk_size"])
+        self.remember("comment", valid, [comment.pk for comment in comments])
+        counts["imported"] += len(comments)
+        # Bulk inserts skip the comment signals
+        comments_bulk_created.send(sender=Comment, post_ids=list({comment.post_id for comment in comments}))
+
+    def category_ids(self, names):
+        missing = names - self.categories.keys()
+        if missing:
+            Category.objects.bulk_create([Category(name=name) for name in missing], ignore_conflicts=True)
+            self.categories.update(Category.objects.filter(name__in=missing).values_list("name", "id"))
+        return self.categories
+
+    def tag_ids(self, names):
+        missing = names - self.tags.keys()
+        if missing:
+            slugs = {name: slugify(name) or "tag" for name in missing}     # Once per tag instead of once per Tag.save()
+            Tag.objects.bulk_create([Tag(name=name, slug=slug) for name, slug in slugs.items()], ignore_conflicts=True)
+            self.tags.update(Tag.objects.filter(name__in=missing).values_list("name", "id"))
+            # Names whose slug belongs to another tag ("C++" and "C") stay apart under a numbered slug
+            for name in sorted(missing - self.tags.keys()):
+                self.tags[name] = Tag.objects.create(name=name, slug=self.free_slug(slugs[name])).pk
+        return self.tags
+
+    def free_slug(self, slug):
+        """The first of `slug`-2, `slug`-3... no tag has"""
+        max_length = Tag._meta.get_field("slug").max_length
+        taken = set(Tag.objects.filter(slug__startswith=slug[:max_length - 2]).values_list("slug", flat=True))
+        number = 2
+        while (candidate := f"{slug[:max_length - len(str(number)) - 1]}-{number}") in taken:
+            number += 1
+        return candidate
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from blog.models import PostDailyStats
+
+
+class Command(BaseCommand):
+    help = "Delete daily engagement buckets older than the longest leaderboard window"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep-days", type=int, default=7,
+            help="Number of most recent days to keep, today included (default: 7)",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.localdate() - timedelta(days=options["keep_days"] - 1)
+        deleted, _ = PostDailyStats.objects.filter(day__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} buckets older than {cutoff}"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import RevokedToken
+
+
+class Command(BaseCommand):
+    help = "Delete revoked refresh tokens that have expired, and so can't be used anymore anyway"
+
+    def handle(self, *args, **options):
+        deleted, _ = RevokedToken.objects.expired().delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired revoked tokens"))
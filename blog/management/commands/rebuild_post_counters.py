@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = "Recompute Post.like_count, rating_sum, rating_count and the trending scores from the Like, Rating and Comment tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=10000,
+            help="Number of post ids updated per transaction (default: 10000)",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_id = Post.objects.aggregate(last=Max("id"))["last"] or 0
+        updated = 0
+
+        # Walk the primary key range in slices so each UPDATE stays short
+        for start in range(1, last_id + 1, batch_size):
+            with transaction.atomic():
+                updated += Post.objects.filter(id__gte=start, id__lt=start + batch_size).rebuild_counters()
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt counters for {updated} posts"))
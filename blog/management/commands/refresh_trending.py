@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.cache import invalidate
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Decay the trending scores of the posts to their current age. The engagement actions rescore "
+        "the posts they touch, the others drift until the next run, so run this every few minutes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=float, default=0,
+            help="Keep refreshing every INTERVAL seconds instead of once",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            rescored = Post.objects.refresh_trending()
+            invalidate("leaderboard")
+            self.stdout.write(self.style.SUCCESS(
+                f"Refreshed the trending scores of {rescored} posts in {time.perf_counter() - started:.2f} s"
+            ))
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.mail import deliver_queued_emails
+
+
+class Command(BaseCommand):
+    help = "Deliver queued emails (post shares) in batches, retrying failures with backoff"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50, help="Messages sent per connection (default: 50)")
+        parser.add_argument("--interval", type=float, default=5, help="Seconds to sleep when the queue is empty (default: 5)")
+        parser.add_argument("--once", action="store_true", help="Drain the due messages and exit instead of polling")
+
+    def handle(self, *args, **options):
+        while True:
+            result = deliver_queued_emails(batch_size=options["batch_size"])
+            if any(result.values()):
+                self.stdout.write(
+                    f"Sent {result['sent']}, retrying {result['retried']}, failed {result['failed']}"
+                )
+            if sum(result.values()) < options["batch_size"]:
+                # The queue has no more due messages
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
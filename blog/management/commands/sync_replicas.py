@@ -0,0 +1,45 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database onto the replica files of DATABASE_REPLICA_URLS. "
+        "A local stand-in for real replication (Litestream, LiteFS, ...)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=float, default=0,
+            help="Keep syncing every INTERVAL seconds instead of once",
+        )
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != "sqlite":
+            raise CommandError("sync_replicas only copies SQLite databases")
+
+        targets = [
+            connections[alias].settings_dict["NAME"] for alias in settings.DATABASE_REPLICAS
+            # The `reader` alias of the sqlite-production profile is the primary file itself
+            if str(connections[alias].settings_dict["NAME"]) != str(primary.settings_dict["NAME"])
+        ]
+        if not targets:
+            raise CommandError("No replica files configured, see DATABASE_REPLICA_URLS")
+
+        while True:
+            primary.ensure_connection()
+            for name in targets:
+                target = sqlite3.connect(name)
+                try:
+                    primary.connection.backup(target)   # Consistent online snapshot
+                finally:
+                    target.close()
+            self.stdout.write(self.style.SUCCESS(f"Synced {len(targets)} replica(s)"))
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+
+from django.db import connections, transaction
+
+
+@contextmanager
+def explicit_timestamps(objs, *names):
+    """
+    Keep the values `objs` have for their auto_now / auto_now_add fields `names`
+    through the bulk_create() of the block, which sets them to the current time:
+    they are put back on `objs` and written over the inserted rows, with one
+    executemany() UPDATE. The fields themselves are left alone, other saves of
+    the process still get their timestamps.
+    """
+    values = [[getattr(obj, name) for name in names] for obj in objs]
+    yield
+    if not objs:
+        return
+    model, connection = type(objs[0]), connections[objs[0]._state.db]
+    fields = [model._meta.get_field(name) for name in names]
+    quote = connection.ops.quote_name
+    for obj, row in zip(objs, values):
+        for name, value in zip(names, row):
+            setattr(obj, name, value)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.executemany(
+            f"UPDATE {quote(model._meta.db_table)} SET "
+            + ", ".join(f"{quote(field.column)} = %s" for field in fields)
+            + f" WHERE {quote(model._meta.pk.column)} = %s",
+            [
+                [field.get_db_prep_save(value, connection) for field, value in zip(fields, row)] + [obj.pk]
+                for obj, row in zip(objs, values)
+            ],
+        )
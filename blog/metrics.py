@@ -0,0 +1,137 @@
+"""
+Per-view request metrics, recorded by blog.middleware.PerformanceMiddleware.
+
+Each request collects its SQL queries (through an execute wrapper installed on
+every database connection), the time spent rendering the response data to JSON
+(blog/renderers.py) and its wall time and response size. The middleware reports
+them in a Server-Timing header and adds them to per-view histograms, readable by
+staff at /blog/metrics/. Like the response cache stats, the histograms are kept
+per process and start empty when it starts.
+"""
+
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils import timezone
+
+# Upper bounds of the histogram buckets, the last bucket is unbounded
+MS_BUCKETS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+BUCKETS = {
+    "wall_ms": MS_BUCKETS,
+    "queries": [0, 1, 2, 3, 5, 10, 20, 50, 100],
+    "sql_ms": MS_BUCKETS,
+    "serialize_ms": MS_BUCKETS,
+    "response_bytes": [256, 1024, 4096, 16384, 65536, 262144, 1048576],
+}
+
+_current = ContextVar("blog_request_metrics", default=None)
+_views = {}
+_flagged = deque(maxlen=50)
+_lock = threading.Lock()
+
+
+class RequestMetrics:
+    """What one request spent, filled in while it runs"""
+
+    __slots__ = ("queries", "sql_time", "serialize_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serialize_time = 0.0
+
+
+def start():
+    """Start collecting for the current request (and the threads it hands work to)"""
+    return _current.set(RequestMetrics())
+
+
+def stop(token):
+    metrics = _current.get()
+    _current.reset(token)
+    return metrics
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.sql_time += time.perf_counter() - started
+        metrics.queries += 1
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # Wrappers outlive reconnections of the same connection object
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def timing_serialization():
+    metrics = _current.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if metrics is not None:
+            metrics.serialize_time += time.perf_counter() - started
+
+
+def new_histogram(bounds):
+    return {"count": 0, "sum": 0, "max": 0, "buckets": [0] * (len(bounds) + 1)}
+
+
+def record(view_name, values, flagged=None):
+    """Add one request's `values` (keyed like BUCKETS) to the histograms of its view"""
+    with _lock:
+        view = _views.get(view_name)
+        if view is None:
+            view = _views[view_name] = {
+                "requests": 0, "flagged": 0, **{name: new_histogram(bounds) for name, bounds in BUCKETS.items()},
+            }
+        view["requests"] += 1
+        for name, value in values.items():
+            if value is None:
+                continue
+            histogram = view[name]
+            histogram["count"] += 1
+            histogram["sum"] += value
+            histogram["max"] = max(histogram["max"], value)
+            histogram["buckets"][bisect.bisect_left(BUCKETS[name], value)] += 1
+        if flagged:
+            view["flagged"] += 1
+            _flagged.append({"view": view_name, **flagged, "at": timezone.now().isoformat()})
+
+
+def snapshot():
+    """The histograms of every view, with bucket labels, and the latest flagged requests"""
+    def labelled(histogram, bounds):
+        labels = [f"<={bound}" for bound in bounds] + ["+Inf"]
+        return {**histogram, "buckets": dict(zip(labels, histogram["buckets"]))}
+
+    with _lock:
+        views = {
+            view_name: {
+                name: labelled(value, BUCKETS[name]) if name in BUCKETS else value
+                for name, value in view.items()
+            }
+            for view_name, view in _views.items()
+        }
+        return {"views": views, "flagged": list(_flagged)}
+
+
+def reset():
+    with _lock:
+        _views.clear()
+        _flagged.clear()
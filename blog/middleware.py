@@ -0,0 +1,186 @@
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.urls import Resolver404, resolve
+from django.utils.functional import SimpleLazyObject
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import metrics
+from .routers import (
+    ais_pinned_to_primary, apin_to_primary, is_pinned_to_primary, pin_to_primary, reset_read_alias, use_read_alias,
+)
+
+
+logger = logging.getLogger("blog.performance")
+
+
+def token_user_id(request):
+    """User id claimed by a valid JWT in the request, checked without a database query"""
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    try:
+        raw_token = header and authentication.get_raw_token(header)
+        return authentication.get_validated_token(raw_token).get(jwt_settings.USER_ID_CLAIM) if raw_token else None
+    except AuthenticationFailed:
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Picks the read replica of safe requests to the blog views, see
+    blog/routers.py. After a successful write the user is pinned to the
+    primary for DATABASE_REPLICA_PIN_SECONDS, so they read their own writes
+    even while the replicas lag behind. Works in sync and async stacks, so
+    the async views under ASGI don't get adapted back to sync.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        alias = None
+        if self.may_use_replica(request):
+            user_id = token_user_id(request)
+            if user_id is None or not is_pinned_to_primary(user_id):
+                alias = random.choice(settings.DATABASE_REPLICAS)
+
+        token = use_read_alias(alias)
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_read_alias(token)
+
+        writer = self.get_writer(request, response)
+        if writer is not None:
+            pin_to_primary(writer.pk)
+        return response
+
+    async def __acall__(self, request):
+        alias = None
+        if self.may_use_replica(request):
+            user_id = token_user_id(request)
+            if user_id is None or not await ais_pinned_to_primary(user_id):
+                alias = random.choice(settings.DATABASE_REPLICAS)
+
+        token = use_read_alias(alias)
+        try:
+            response = await self.get_response(request)
+        finally:
+            reset_read_alias(token)
+
+        writer = self.get_writer(request, response)
+        if writer is not None:
+            await apin_to_primary(writer.pk)
+        return response
+
+    def may_use_replica(self, request):
+        """Safe requests to the blog views, when replicas are configured"""
+        if not settings.DATABASE_REPLICAS or request.method not in SAFE_METHODS:
+            return False
+        try:
+            match = resolve(request.path_info, getattr(request, "urlconf", None))
+        except Resolver404:
+            return False
+        return getattr(match.func, "view_class", match.func).__module__.startswith("blog.")
+
+    def get_writer(self, request, response):
+        """The user a successful write was made by, as authenticated by DRF"""
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return None
+        user = getattr(request, "user", None)
+        # Still the lazy session user: DRF didn't handle the request, don't run a query to load it
+        if user is None or isinstance(user, SimpleLazyObject) or not user.is_authenticated:
+            return None
+        return user
+
+
+class PerformanceMiddleware:
+    """
+    Measures every request, see blog/metrics.py: wall time, SQL queries and their
+    time, JSON rendering time and response size. They are added to the histograms
+    of the view, and sent back in a Server-Timing header to staff users, or to
+    every client with DEBUG or BLOG_SERVER_TIMING. Requests running
+    more than BLOG_QUERY_COUNT_THRESHOLD queries are logged and flagged, so an N+1
+    regression shows up in production. First in MIDDLEWARE, to time the others too.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = metrics.start()
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            collected = metrics.stop(token)
+        self.report(request, response, time.perf_counter() - started, collected)
+        return response
+
+    async def __acall__(self, request):
+        token = metrics.start()
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            collected = metrics.stop(token)
+        self.report(request, response, time.perf_counter() - started, collected)
+        return response
+
+    def sends_server_timing(self, request):
+        if settings.DEBUG or getattr(settings, "BLOG_SERVER_TIMING", False):
+            return True
+        user = getattr(request, "user", None)
+        # Still the lazy session user: DRF didn't authenticate the request, don't run a query to load it
+        return user is not None and not isinstance(user, SimpleLazyObject) and user.is_staff
+
+    def report(self, request, response, wall_time, collected):
+        wall_ms, sql_ms, serialize_ms = wall_time * 1000, collected.sql_time * 1000, collected.serialize_time * 1000
+        if self.sends_server_timing(request):
+            response["Server-Timing"] = ", ".join([
+                f'db;dur={sql_ms:.1f};desc="{collected.queries} queries"',
+                f"serialize;dur={serialize_ms:.1f}",
+                f"app;dur={max(wall_ms - sql_ms - serialize_ms, 0):.1f}",
+                f"total;dur={wall_ms:.1f}",
+            ])
+
+        match = request.resolver_match
+        if match is None:
+            return  # Not routed to a view
+        view_name = getattr(match.func, "view_class", match.func).__name__
+        flagged = None
+        if collected.queries > settings.BLOG_QUERY_COUNT_THRESHOLD:
+            flagged = {"method": request.method, "path": request.get_full_path(), "queries": collected.queries}
+            logger.warning(
+                "%s %s ran %d queries in %s (threshold %d)", request.method, request.get_full_path(),
+                collected.queries, view_name, settings.BLOG_QUERY_COUNT_THRESHOLD,
+            )
+        metrics.record(view_name, {
+            "wall_ms": wall_ms,
+            "queries": collected.queries,
+            "sql_ms": sql_ms,
+            "serialize_ms": serialize_ms,
+            "response_bytes": None if response.streaming else len(response.content),
+        }, flagged)
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.4 on 2026-10-17 02:10
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    """Fill the new counters from the existing likes and ratings"""
+    Post = apps.get_model("blog", "Post")
+    Like = apps.get_model("blog", "Like")
+    Rating = apps.get_model("blog", "Rating")
+
+    def per_post(model, aggregate):
+        rows = model.objects.filter(post=models.OuterRef("pk")).order_by().values("post")
+        return Coalesce(models.Subquery(rows.annotate(value=aggregate).values("value")), 0)
+
+    Post.objects.update(
+        like_count=per_post(Like, models.Count("id")),
+        rating_sum=per_post(Rating, models.Sum("rating")),
+        rating_count=per_post(Rating, models.Count("id")),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_alter_category_options_like_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.1.4 on 2026-10-17 02:12
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_rating_score(apps, schema_editor):
+    """Weighted rating of the existing posts, with the prior of Post.RATING_PRIOR_MEAN/WEIGHT at the time"""
+    Post = apps.get_model("blog", "Post")
+    Post.objects.update(
+        rating_score=models.ExpressionWrapper(
+            (models.Value(3.0 * 5) + models.F("rating_sum")) / (models.Value(5.0) + models.F("rating_count")),
+            output_field=models.FloatField(),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_post_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('like_count', models.IntegerField(default=0)),
+                ('rating_sum', models.IntegerField(default=0)),
+                ('rating_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Post daily stats',
+            },
+        ),
+        migrations.AddField(
+            model_name='like',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='rating_score',
+            field=models.FloatField(default=3.0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_score, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='rating',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-like_count', '-id'], name='post_like_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-rating_score', '-id'], name='post_rating_score_idx'),
+        ),
+        migrations.AddField(
+            model_name='postdailystats',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='blog.post'),
+        ),
+        migrations.AddIndex(
+            model_name='postdailystats',
+            index=models.Index(fields=['day', 'post'], name='post_daily_stats_day_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='postdailystats',
+            unique_together={('post', 'day')},
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.4 on 2026-10-17 02:14
+
+import blog.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    """Create and fill the FTS5 table on SQLite, other databases use blog.search.DatabaseSearchBackend"""
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE blog_post_fts USING fts5(title, content, tags, author, tokenize='porter unicode61')"
+    )
+    # Relevance weights per column: title, content, tags, author
+    schema_editor.execute("INSERT INTO blog_post_fts(blog_post_fts, rank) VALUES('rank', 'bm25(10.0, 1.0, 5.0, 2.0)')")
+    schema_editor.execute(
+        """
+        INSERT INTO blog_post_fts(rowid, title, content, tags, author)
+        SELECT p.id, p.title, p.content,
+               COALESCE((SELECT group_concat(t.name, ' ') FROM blog_post_tags pt
+                         JOIN blog_tag t ON t.id = pt.tag_id WHERE pt.post_id = p.id), ''),
+               COALESCE(u.username, '')
+        FROM blog_post p LEFT JOIN blog_customuser u ON u.id = p.author_id
+        """
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS blog_post_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_leaderboard_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSearchEntry',
+            fields=[
+                ('post', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='blog.post')),
+                ('title', models.TextField()),
+                ('content', models.TextField()),
+                ('tags', models.TextField()),
+                ('author', models.TextField()),
+                ('document', blog.models.SearchDocumentField(db_column='blog_post_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'blog_post_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
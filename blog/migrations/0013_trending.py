@@ -0,0 +1,52 @@
+# Generated by Django 5.1.4 on 2026-10-17 03:53
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_trending(apps, schema_editor):
+    """Trending points and scores of the existing posts, with the weights and gravity of Post at the time"""
+    Post = apps.get_model("blog", "Post")
+    Comment = apps.get_model("blog", "Comment")
+    comment_count = models.functions.Coalesce(
+        models.Subquery(
+            Comment.objects.filter(post=models.OuterRef("pk")).order_by().values("post").annotate(
+                value=models.Count("id")
+            ).values("value")
+        ),
+        0,
+    )
+    Post.objects.update(
+        trending_points=models.F("like_count") + comment_count * 2 + models.F("rating_sum") - models.F("rating_count") * 3.0
+    )
+    now = timezone.now()
+    for post in Post.objects.filter(published_date__gte=now - timedelta(days=7), trending_points__gt=0).only("published_date", "trending_points"):
+        age = max((now - post.published_date).total_seconds(), 0) / 3600
+        Post.objects.filter(pk=post.pk).update(trending_score=post.trending_points * (age + 2) ** -1.8)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_feeds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='trending_points',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_trending, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-trending_score', '-id'], name='post_trending_idx'),
+        ),
+    ]
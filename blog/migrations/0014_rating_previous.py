@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-17 05:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_trending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rating',
+            name='previous_rating',
+            field=models.PositiveSmallIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='rating',
+            name='previous_updated_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-17 05:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_rating_previous'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='importcheckpoint',
+            name='unique_import_checkpoint',
+        ),
+        migrations.AddField(
+            model_name='importcheckpoint',
+            name='fingerprint',
+            field=models.CharField(default='', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='importcheckpoint',
+            name='file',
+            field=models.CharField(max_length=1024),
+        ),
+        migrations.AddConstraint(
+            model_name='importcheckpoint',
+            constraint=models.UniqueConstraint(fields=('source', 'file', 'fingerprint'), name='unique_import_checkpoint'),
+        ),
+    ]
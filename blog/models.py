@@ -1,8 +1,27 @@
-from django.db import models
+from django.db import models, transaction, connections, router, IntegrityError
+from django.db.models.signals import post_save
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.dispatch import Signal
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.conf import settings
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.utils.text import slugify
 
+# Sent with `post_ids` after bulk writes to posts or their tags, which bypass
+# the model and m2m signals (see PostQuerySet), so the receivers in
+# blog/signals.py can refresh the search index and caches in one go
+posts_bulk_changed = Signal()
+# Sent with `post_ids` after comments on these posts were bulk created
+comments_bulk_created = Signal()
+# Sent with `instance` after LikeManager.toggle() deleted a like. Like and Rating
+# have no post_delete receivers, so Django fast-deletes them in one statement
+# when their post or user is deleted: the post's own receivers cover the first
+# case, the CustomUser delete receivers in blog/signals.py the second
+engagement_deleted = Signal()
+
+
 class CustomUserManager(BaseUserManager):
     """How to create a regular user"""
     def create_user(self, email, password=None, **extra_fields):
@@ -29,12 +48,21 @@ class CustomUserManager(BaseUserManager):
 class CustomUser(AbstractUser):
     email = models.EmailField(max_length=60, unique=True)
     username = models.CharField(max_length=15, unique=True)
+    # Set once the author has more followers than BLOG_FEED_FAN_OUT_LIMIT: their
+    # posts are no longer written to every follower's feed but read at feed time
+    fan_out_on_read = models.BooleanField(default=False, editable=False)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username"]
 
     objects = CustomUserManager()
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # The few authors with fan_out_on_read, see FollowManager.pulled_authors()
+            models.Index(fields=["id"], condition=models.Q(fan_out_on_read=True), name="user_fan_out_on_read_idx"),
+        ]
+
     def __str__(self):
         return (self.username).lower()
 
@@ -76,6 +104,181 @@ class Tag(models.Model):
         return self.name
 
 
+def per_post_subquery(queryset, aggregate):
+    """Correlated subquery computing `aggregate` over the `queryset` rows of the outer post"""
+    return Coalesce(
+        models.Subquery(
+            queryset.filter(post=models.OuterRef("pk")).order_by().values("post").annotate(
+                value=aggregate
+            ).values("value")
+        ),
+        0,
+    )
+
+
+def weighted_rating(rating_sum, rating_count):
+    """
+    Bayesian average: the ratings are blended with RATING_PRIOR_WEIGHT votes of
+    RATING_PRIOR_MEAN, so a single 5-star vote cannot top the leaderboard.
+    Works with plain numbers as well as F()/aggregate expressions.
+    """
+    prior = Post.RATING_PRIOR_MEAN * Post.RATING_PRIOR_WEIGHT
+    return models.ExpressionWrapper(
+        (models.Value(prior) + rating_sum) / (models.Value(float(Post.RATING_PRIOR_WEIGHT)) + rating_count),
+        output_field=models.FloatField(),
+    )
+
+
+def trending_decay(published, now=None):
+    """
+    Gravity of the trending score, which is the trending points times this:
+    1 / (age in hours + 2) ** TRENDING_GRAVITY, as on Hacker News, and 0 once
+    the post is older than TRENDING_WINDOW.
+    """
+    age = (now or timezone.now()) - published
+    if age > Post.TRENDING_WINDOW:
+        return 0.0
+    return (max(age.total_seconds(), 0) / 3600 + 2) ** -Post.TRENDING_GRAVITY
+
+
+class PostQuerySet(models.QuerySet):
+    def with_related(self):
+        """
+        Join the author and category and prefetch the tags, so rendering a
+        page of posts costs a fixed number of queries whatever its size.
+        """
+        return self.select_related("author", "category").prefetch_related("tags")
+
+    def with_comments(self):
+        """Prefetch every comment of each post along with its author (single post views)"""
+        return self.prefetch_related(
+            models.Prefetch("comments", queryset=Comment.objects.select_related("author"))
+        )
+
+    def with_comment_summary(self, preview_size=None):
+        """
+        Annotate `comment_count` and, if `preview_size` is given, attach the
+        latest comments as `latest_comments`. The preview is a sliced prefetch,
+        which Django runs as one ROW_NUMBER() window query for the whole page.
+        """
+        queryset = self.annotate(comment_count=per_post_subquery(Comment.objects, models.Count("id")))
+        if preview_size:
+            latest = Comment.objects.select_related("author").order_by("-created_at", "-id")[:preview_size]
+            queryset = queryset.prefetch_related(models.Prefetch("comments", queryset=latest, to_attr="latest_comments"))
+        return queryset
+
+    def with_average_rating(self):
+        """Annotate `average_rating` from the rating counters, 0 for unrated posts"""
+        return self.annotate(
+            average_rating=models.Case(
+                models.When(rating_count=0, then=models.Value(0.0)),
+                default=Cast("rating_sum", models.FloatField()) / models.F("rating_count"),
+                output_field=models.FloatField(),
+            )
+        )
+
+    def with_window_stats(self, since):
+        """
+        Annotate `window_like_count` and `window_rating_score` from the daily
+        buckets from `since` onwards. Only posts with activity in the window are
+        returned, and the aggregation reads a handful of bucket rows per post
+        instead of the Like and Rating tables.
+        """
+        # Filtering before annotating makes the sums reuse the filtered join
+        return self.filter(daily_stats__day__gte=since).annotate(
+            window_like_count=models.Sum("daily_stats__like_count"),
+            window_rating_count=models.Sum("daily_stats__rating_count"),
+            window_rating_score=weighted_rating(
+                models.Sum("daily_stats__rating_sum"), models.Sum("daily_stats__rating_count")
+            ),
+        )
+
+    def touch(self):
+        """Mark these posts as changed for the conditional GET validators"""
+        return self.update(last_activity=timezone.now())
+
+    def rebuild_counters(self):
+        """Recompute the like and rating counters of these posts from the Like and Rating tables, then their trending scores"""
+        rating_sum = per_post_subquery(Rating.objects, models.Sum("rating"))
+        rating_count = per_post_subquery(Rating.objects, models.Count("id"))
+        updated = self.update(
+            like_count=per_post_subquery(Like.objects, models.Count("id")),
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            rating_score=weighted_rating(rating_sum, rating_count),
+        )
+        self.rebuild_trending()
+        return updated
+
+    def rebuild_trending(self, now=None):
+        """Recompute the trending points of these posts from their counters and comments, then their scores"""
+        self.update(trending_points=(
+            models.F("like_count") * Post.TRENDING_LIKE_POINTS
+            + per_post_subquery(Comment.objects, models.Count("id")) * Post.TRENDING_COMMENT_POINTS
+            + models.F("rating_sum") - models.F("rating_count") * Post.RATING_PRIOR_MEAN
+        ))
+        return self.refresh_trending(now)
+
+    def refresh_trending(self, now=None):
+        """
+        Decay the trending scores of these posts to `now` (default: the current
+        time), zeroing the ones that left the window. Returns the number of posts
+        rescored. The scores are computed from the points at write time, so this
+        can run alongside the incremental updates of Post.trending_update().
+        """
+        now = now or timezone.now()
+        since = now - Post.TRENDING_WINDOW
+        # Walks the positive end of post_trending_idx: the posts of the window and the few that just left it
+        self.filter(trending_score__gt=0, published_date__lt=since).update(trending_score=0)
+
+        recent = self.filter(published_date__gte=since).exclude(trending_points=0).values_list("id", "published_date")
+        connection = connections[router.db_for_write(Post)]
+        quote = connection.ops.quote_name
+        # One prepared statement run for every post, the decay factors differ per post
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            rows = [(trending_decay(published, now), pk) for pk, published in recent.using(connection.alias)]
+            cursor.executemany(
+                f"UPDATE {quote(Post._meta.db_table)} SET trending_score = "
+                f"CASE WHEN trending_points > 0 THEN trending_points * %s ELSE 0 END WHERE id = %s",
+                rows,
+            )
+        return len(rows)
+
+    def bulk_create_with_tags(self, posts, tag_ids, batch_size=500):
+        """
+        bulk_create() `posts` and attach the tags `tag_ids[i]` to `posts[i]`, with
+        batched inserts into the through table: a few queries per batch instead
+        of several per post.
+        """
+        through = Post.tags.through
+        with transaction.atomic(using=router.db_for_write(Post)):
+            posts = self.bulk_create(posts, batch_size=batch_size)
+            through.objects.bulk_create(
+                [through(post_id=post.pk, tag_id=tag_id) for post, ids in zip(posts, tag_ids) for tag_id in ids],
+                batch_size=batch_size,
+            )
+        posts_bulk_changed.send(sender=Post, post_ids=[post.pk for post in posts])
+        return posts
+
+    def add_tags(self, tag_ids, batch_size=500):
+        """Attach `tag_ids` to every post here with batched through table inserts, returns the post ids"""
+        through = Post.tags.through
+        post_ids = list(self.values_list("id", flat=True))
+        through.objects.bulk_create(
+            [through(post_id=post_id, tag_id=tag_id) for post_id in post_ids for tag_id in tag_ids],
+            batch_size=batch_size, ignore_conflicts=True,   # Pairs that already exist are left alone
+        )
+        posts_bulk_changed.send(sender=Post, post_ids=post_ids)
+        return post_ids
+
+    def remove_tags(self, tag_ids):
+        """Detach `tag_ids` from every post here in one statement, returns the post ids"""
+        post_ids = list(self.values_list("id", flat=True))
+        Post.tags.through.objects.filter(post_id__in=post_ids, tag_id__in=tag_ids).delete()
+        posts_bulk_changed.send(sender=Post, post_ids=post_ids)
+        return post_ids
+
+
 class Post(models.Model):
     title = models.CharField(max_length=200)
     content = models.TextField()
@@ -85,11 +288,83 @@ class Post(models.Model):
     published_date = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    # Denormalized engagement counters, kept exact by the like/rate actions
+    # in PostDetailView and rebuilt by the `rebuild_post_counters` command
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_score = models.FloatField(default=3.0, editable=False)  # Bayesian average, see weighted_rating()
+    # Likes, comments and ratings above the prior mean (minus those below), kept
+    # exact like the counters, and their time-decayed score, see trending_decay()
+    trending_points = models.FloatField(default=0, editable=False)
+    trending_score = models.FloatField(default=0, editable=False)   # Refreshed by the `refresh_trending` command
+    # Last change to anything the post detail shows besides the post itself
+    # (comments, likes, ratings, tags), drives the Last-Modified/ETag validators
+    last_activity = models.DateTimeField(default=timezone.now, editable=False)
+
+    # Prior used by the weighted rating, must stay positive
+    RATING_PRIOR_MEAN = 3.0
+    RATING_PRIOR_WEIGHT = 5
+
+    # Trending points of each engagement, a rating scores its stars minus RATING_PRIOR_MEAN
+    TRENDING_LIKE_POINTS = 1
+    TRENDING_COMMENT_POINTS = 2
+    # How fast the trending score of a post decays with age, and when it drops to 0
+    TRENDING_GRAVITY = 1.8
+    TRENDING_WINDOW = timedelta(days=7)
+
+    objects = PostQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.title} by {self.author}"
+
+    def trending_update(self, points):
+        """update() arguments adding `points` to the trending points and rescoring the post at its current age"""
+        trending_points = models.F("trending_points") + points
+        return {
+            "trending_points": trending_points,
+            # Scores stay positive so the trending list is a range of the index
+            "trending_score": Greatest(trending_points, 0.0) * trending_decay(self.published_date),
+        }
+
+    def record_like(self, delta, day=None):
+        """Shift the like counter and the daily bucket of `day` (default: today) by `delta`"""
+        Post.objects.filter(pk=self.pk).update(
+            like_count=models.F("like_count") + delta, last_activity=timezone.now(),
+            **self.trending_update(delta * Post.TRENDING_LIKE_POINTS),
+        )
+        PostDailyStats.objects.bump(self, day or timezone.localdate(), like_count=delta)
+
+    def record_rating(self, value, count=1, day=None):
+        """Add a rating of `value` (or remove one with `count=-1`) to the counters and the daily bucket"""
+        rating_sum = models.F("rating_sum") + value * count
+        rating_count = models.F("rating_count") + count
+        Post.objects.filter(pk=self.pk).update(
+            rating_sum=rating_sum, rating_count=rating_count, rating_score=weighted_rating(rating_sum, rating_count),
+            last_activity=timezone.now(), **self.trending_update((value - Post.RATING_PRIOR_MEAN) * count),
+        )
+        PostDailyStats.objects.bump(self, day or timezone.localdate(), rating_sum=value * count, rating_count=count)
+
+    def record_comment(self, delta):
+        """Shift the trending points by `delta` comments"""
+        Post.objects.filter(pk=self.pk).update(
+            last_activity=timezone.now(), **self.trending_update(delta * Post.TRENDING_COMMENT_POINTS),
+        )
     
     class Meta:
         ordering = ["-published_date"]  # Default ordering by published date, descending
+        indexes = [
+            # Keyset pagination order of the post lists, globally and per author/category
+            models.Index(fields=["-published_date", "-id"], name="post_published_idx"),
+            models.Index(fields=["author", "-published_date", "-id"], name="post_author_published_idx"),
+            models.Index(fields=["category", "-published_date", "-id"], name="post_category_published_idx"),
+            # Leaderboards walk these with keyset pagination, see MostLikedPostsView and HighestRatedPostsView
+            models.Index(fields=["-like_count", "-id"], name="post_like_count_idx"),
+            models.Index(fields=["-rating_score", "-id"], name="post_rating_score_idx"),
+            models.Index(fields=["-trending_score", "-id"], name="post_trending_idx"),   # TrendingPostsView
+            # Incremental exports read the rows changed since a timestamp, see blog/export.py
+            models.Index(fields=["updated", "id"], name="post_updated_idx"),
+        ]
     
 
 class Comment(models.Model):
@@ -101,14 +376,110 @@ class Comment(models.Model):
 
     def __str__(self):
         return f"Comment by {self.author} on {self.post.title}"
+
+    class Meta:
+        indexes = [
+            # A post's thread in CommentListCreateView order, also serves the latest comment previews
+            models.Index(fields=["post", "created_at", "id"], name="comment_post_created_idx"),
+            models.Index(fields=["updated_at", "id"], name="comment_updated_idx"),    # Incremental exports
+        ]
     
 
+def db_datetime(value):
+    """Datetime returned by a raw query: SQLite gives naive UTC strings, PostgreSQL aware datetimes"""
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+class EngagementManager(models.Manager):
+    """
+    Single-statement writes for Like and Rating, using INSERT ... ON CONFLICT and
+    DELETE ... RETURNING (SQLite 3.35+, PostgreSQL). The post counters only move
+    by the rows a statement actually wrote, so concurrent actions always leave
+    them matching the tables. Raw SQL skips the model signals, so post_save and
+    engagement_deleted are sent by hand to keep the cache invalidation in
+    blog/signals.py working.
+    """
+
+    def execute(self, sql, params):
+        """Run `sql` with {table}/{post}/{user} placeholders filled in, return the first row"""
+        connection = connections[router.db_for_write(self.model)]
+        opts = self.model._meta
+        sql = sql.format(
+            table=connection.ops.quote_name(opts.db_table),
+            post=connection.ops.quote_name(opts.get_field("post").column),
+            user=connection.ops.quote_name(opts.get_field("user").column),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [connection.ops.adapt_datetimefield_value(p) if isinstance(p, datetime) else p for p in params])
+            return cursor.fetchone()
+
+
+class LikeManager(EngagementManager):
+    def toggle(self, post, user):
+        """Like `post` as `user`, or unlike it if they already did. Returns True if it ends up liked."""
+        using = router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            row = self.execute("DELETE FROM {table} WHERE {post} = %s AND {user} = %s RETURNING id, created_at", [post.pk, user.pk])
+            if row:
+                like = self.model(id=row[0], post=post, user=user, created_at=db_datetime(row[1]))
+                post.record_like(-1, day=timezone.localdate(like.created_at))
+                engagement_deleted.send(sender=self.model, instance=like, using=using)
+                return False
+
+            # A parallel toggle may have inserted the like already, then there's nothing left to do
+            now = timezone.now()
+            row = self.execute(
+                "INSERT INTO {table} ({post}, {user}, created_at) VALUES (%s, %s, %s) "
+                "ON CONFLICT ({post}, {user}) DO NOTHING RETURNING id",
+                [post.pk, user.pk, now],
+            )
+            if row:
+                like = self.model(id=row[0], post=post, user=user, created_at=now)
+                post.record_like(1)
+                post_save.send(sender=self.model, instance=like, created=True, update_fields=None, raw=False, using=using)
+            return True
+
+
+class RatingManager(EngagementManager):
+    def rate(self, post, user, value):
+        """Create or replace the rating of `user` for `post`. Returns True if it was created."""
+        using = router.db_for_write(self.model)
+        now = timezone.now()
+        with transaction.atomic(using=using):
+            # RETURNING gives the row as written, so a re-rate copies the rating it replaces into the
+            # previous_* columns (SET reads the old row), which stay NULL on a new rating
+            rating_id, previous, previous_updated_at = self.execute(
+                "INSERT INTO {table} ({post}, {user}, rating, updated_at) VALUES (%s, %s, %s, %s) "
+                "ON CONFLICT ({post}, {user}) DO UPDATE SET previous_rating = {table}.rating, "
+                "previous_updated_at = {table}.updated_at, rating = excluded.rating, updated_at = excluded.updated_at "
+                "RETURNING id, previous_rating, previous_updated_at",
+                [post.pk, user.pk, value, now],
+            )
+            created = previous is None
+            if not created:
+                # Move the old rating out of the counters and the bucket of the day it was given
+                post.record_rating(previous, count=-1, day=timezone.localdate(db_datetime(previous_updated_at)))
+            post.record_rating(value)
+
+        rating = self.model(id=rating_id, post=post, user=user, rating=value, updated_at=now)
+        post_save.send(sender=self.model, instance=rating, created=created, update_fields=None, raw=False, using=using)
+        return created
+
+
 class Like(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='likes')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='likes')
+    created_at = models.DateTimeField(default=timezone.now)    # Tells which daily bucket to decrement on unlike
+
+    objects = LikeManager()
 
     class Meta:
         unique_together = ("post", "user")  # Ensures a user can like a post only once
+        indexes = [models.Index(fields=["created_at", "id"], name="like_created_idx")]     # Incremental exports
 
     def __str__(self):
        return f"liked by {self.user.username}"
@@ -118,9 +489,357 @@ class Rating(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="ratings")
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="ratings")
     rating = models.PositiveIntegerField(choices=[(1, "1"), (2, "2"), (3, "3"), (4, "4"), (5, "5")])
+    updated_at = models.DateTimeField(auto_now=True)
+    # The rating a re-rate replaced and when it was given, returned by the upsert of RatingManager.rate()
+    previous_rating = models.PositiveSmallIntegerField(null=True, editable=False)
+    previous_updated_at = models.DateTimeField(null=True, editable=False)
+
+    objects = RatingManager()
 
     class Meta:
         unique_together = ("post", "user")  # Ensures one rating per user per post
+        indexes = [models.Index(fields=["updated_at", "id"], name="rating_updated_idx")]   # Incremental exports
+
+    def __str__(self):
+        return f"Rating of {self.rating} by {self.user.username} for {self.post.title}"
+
+
+class PostDailyStatsManager(models.Manager):
+    def bump(self, post, day, **deltas):
+        """Add `deltas` to the bucket of `post` for `day`, creating it for positive deltas"""
+        changes = {field: models.F(field) + delta for field, delta in deltas.items()}
+        if self.filter(post=post, day=day).update(**changes):
+            return
+        if any(delta < 0 for delta in deltas.values()):
+            return  # The bucket was already pruned, nothing left to take from
+        try:
+            with transaction.atomic(using=router.db_for_write(self.model)):
+                self.create(post=post, day=day, **deltas)
+        except IntegrityError:
+            # Another request created the bucket in the meantime
+            self.filter(post=post, day=day).update(**changes)
+
+    def subtract(self, buckets):
+        """Take {(post_id, day): (like_count, rating_sum, rating_count)} out of the buckets, in one executemany()"""
+        connection = connections[router.db_for_write(self.model)]
+        quote = connection.ops.quote_name
+        counters = ("like_count", "rating_sum", "rating_count")
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"UPDATE {quote(self.model._meta.db_table)} SET "
+                + ", ".join(f"{quote(name)} = {quote(name)} - %s" for name in counters)
+                + f" WHERE {quote('post_id')} = %s AND {quote('day')} = %s",
+                [
+                    [*deltas, post_id, connection.ops.adapt_datefield_value(day)]
+                    for (post_id, day), deltas in buckets.items()
+                ],
+            )
+
+
+class PostDailyStats(models.Model):
+    """Per post, per day engagement buckets backing the time-windowed leaderboards"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="daily_stats")
+    day = models.DateField()
+    like_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+
+    objects = PostDailyStatsManager()
+
+    class Meta:
+        unique_together = ("post", "day")
+        indexes = [
+            models.Index(fields=["day", "post"], name="post_daily_stats_day_idx"),   # Window scans by day range
+        ]
+        verbose_name_plural = "Post daily stats"
+
+    def __str__(self):
+        return f"Stats for post {self.post_id} on {self.day}"
+
+
+class SearchDocumentField(models.TextField):
+    """Hidden FTS5 column named after its table, the left-hand side of MATCH queries"""
+
+
+@SearchDocumentField.register_lookup
+class Match(models.Lookup):
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", lhs_params + rhs_params
+
+
+class PostSearchEntry(models.Model):
+    """
+    Row of the `blog_post_fts` SQLite FTS5 index, created by a migration and
+    written to by blog.search.SQLiteFTS5Backend. Only used to join posts to
+    their full-text match and relevance rank.
+    """
+    post = models.OneToOneField(
+        Post, primary_key=True, db_column="rowid", db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name="search_entry",
+    )
+    title = models.TextField()
+    content = models.TextField()
+    tags = models.TextField()
+    author = models.TextField()
+    document = SearchDocumentField(db_column="blog_post_fts")
+    rank = models.FloatField()  # bm25() relevance, lower is better
+
+    class Meta:
+        managed = False
+        db_table = "blog_post_fts"
+
+
+class QueuedEmail(models.Model):
+    """Outgoing email waiting for the `send_queued_emails` worker, see blog/mail.py"""
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS_CHOICES = [(PENDING, "Pending"), (SENT, "Sent"), (FAILED, "Failed")]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.EmailField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)    # Also pushed forward while a worker holds the message
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="queued_email_due_idx"),   # The worker's poll
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.to} ({self.status})"
+
+
+class RevokedTokenQuerySet(models.QuerySet):
+    def expired(self):
+        return self.filter(expires_at__lte=timezone.now())
+
+
+class RevokedToken(models.Model):
+    """
+    Refresh token that can no longer be used, see blog/authentication.py. Only
+    revoked tokens are stored, and only until they expire on their own, so the
+    table stays as small as the revocations of one refresh token lifetime.
+    """
+    jti = models.CharField(max_length=255, primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)   # `prune_revoked_tokens` deletes past this
+
+    objects = RevokedTokenQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.jti} (expires {self.expires_at})"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    How far `manage.py import_data` got into a file of a source: the number of
+    records consumed, saved in the transaction of each chunk so a rerun resumes
+    right after the last committed one. Files are told apart by their resolved
+    path and fingerprint (size and modification time), so another dump of the
+    same name, or the same file rewritten, starts over.
+    """
+    source = models.CharField(max_length=100)
+    file = models.CharField(max_length=1024)
+    fingerprint = models.CharField(max_length=64, default="")
+    position = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["source", "file", "fingerprint"], name="unique_import_checkpoint"),
+        ]
+
+    def __str__(self):
+        return f"{self.source} {self.file} at record {self.position}"
+
+
+class ImportedRecord(models.Model):
+    """
+    Object created for a record of an imported source, by the record's key in
+    that source: resolves the references between records (a post's author, a
+    comment's post), also across the files of the source, and skips records
+    already imported.
+    """
+    source = models.CharField(max_length=100)
+    kind = models.CharField(max_length=10, choices=[("user", "User"), ("post", "Post"), ("comment", "Comment")])
+    key = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["source", "kind", "key"], name="unique_imported_record"),
+        ]
+
+    def __str__(self):
+        return f"{self.source} {self.kind} {self.key} -> {self.object_id}"
+
+
+class FollowManager(models.Manager):
+    def pulled_authors(self, user_id):
+        """Ids of the authors followed by `user_id` whose posts are fanned out on read"""
+        # From the few authors with the flag, rather than through the (maybe 10k) follows of the user
+        return CustomUser.objects.filter(fan_out_on_read=True).filter(
+            models.Exists(self.filter(user_id=user_id, author=models.OuterRef("pk"))),
+        ).values("pk")
+
+    def update_fan_out_mode(self, author_ids):
+        """Switch the `author_ids` followed by more than BLOG_FEED_FAN_OUT_LIMIT users to fan-out on read"""
+        limit = getattr(settings, "BLOG_FEED_FAN_OUT_LIMIT", 10000)
+        # Authors already switched are skipped, so their followers are never counted again
+        pushed = CustomUser.objects.filter(pk__in=author_ids, fan_out_on_read=False).values("pk")
+        crowded = self.filter(author__in=pushed).values("author").annotate(
+            followers=models.Count("id"),
+        ).filter(followers__gt=limit).values("author")
+        return CustomUser.objects.filter(pk__in=crowded).update(fan_out_on_read=True)
+
+
+class Follow(models.Model):
+    """A user following an author, a tag or a category, whose posts then show up in the user's feed"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="follows", db_index=False)
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name="followers",
+    )
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, null=True, blank=True, related_name="followers")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, related_name="followers")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = FollowManager()
+
+    TARGETS = ("author", "tag", "category")
+
+    class Meta:
+        constraints = [
+            # Exactly one target per follow
+            models.CheckConstraint(
+                condition=(
+                    models.Q(author__isnull=False, tag__isnull=True, category__isnull=True)
+                    | models.Q(author__isnull=True, tag__isnull=False, category__isnull=True)
+                    | models.Q(author__isnull=True, tag__isnull=True, category__isnull=False)
+                ),
+                name="follow_one_target",
+            ),
+            models.UniqueConstraint(fields=["user", "author"], condition=models.Q(author__isnull=False), name="unique_follow_author"),
+            models.UniqueConstraint(fields=["user", "tag"], condition=models.Q(tag__isnull=False), name="unique_follow_tag"),
+            models.UniqueConstraint(
+                fields=["user", "category"], condition=models.Q(category__isnull=False), name="unique_follow_category",
+            ),
+        ]
+        indexes = [models.Index(fields=["user", "-created_at", "-id"], name="follow_user_created_idx")]
+
+    @property
+    def target(self):
+        return next(getattr(self, name) for name in self.TARGETS if getattr(self, f"{name}_id") is not None)
+
+    def posts(self):
+        """The posts of the followed author, tag or category"""
+        if self.tag_id is not None:
+            return Post.objects.filter(tags=self.tag_id)
+        if self.category_id is not None:
+            return Post.objects.filter(category_id=self.category_id)
+        return Post.objects.filter(author_id=self.author_id)
+
+    def __str__(self):
+        return f"{self.user} follows {self.target}"
+
+
+class FeedEntryManager(models.Manager):
+    """
+    Fan-out on write: a post is written to the feed of every follower of its
+    author, category and tags when it's saved or tagged, in one INSERT ... SELECT
+    per chunk of posts, so the followers never travel through Python. Posts
+    already in a feed are skipped by ON CONFLICT DO NOTHING, which makes fanning
+    out the same post again harmless. Authors with fan_out_on_read are left out,
+    FeedView reads their posts at feed time instead.
+    """
+
+    FAN_OUT_CHUNK_SIZE = 300    # Posts per statement, each id is bound three times
+
+    def fan_out(self, post_ids):
+        """Write the posts of `post_ids` to the feeds of their followers"""
+        post_ids = list(post_ids)
+        connection = connections[router.db_for_write(self.model)]
+        quote = connection.ops.quote_name
+        tags = Post.tags.through._meta
+        for start in range(0, len(post_ids), self.FAN_OUT_CHUNK_SIZE):
+            chunk = post_ids[start:start + self.FAN_OUT_CHUNK_SIZE]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            sql = (
+                "INSERT INTO {feed} (user_id, post_id, published_date) "
+                "SELECT f.user_id, p.id, p.published_date FROM {post} p "
+                "JOIN {follow} f ON f.author_id = p.author_id "
+                "JOIN {user} u ON u.id = p.author_id AND NOT u.fan_out_on_read "
+                "WHERE p.id IN ({ids}) "
+                "UNION SELECT f.user_id, p.id, p.published_date FROM {post} p "
+                "JOIN {follow} f ON f.category_id = p.category_id "
+                "WHERE p.id IN ({ids}) "
+                "UNION SELECT f.user_id, p.id, p.published_date FROM {post_tags} t "
+                "JOIN {post} p ON p.id = t.{tags_post} "
+                "JOIN {follow} f ON f.tag_id = t.{tags_tag} "
+                "WHERE t.{tags_post} IN ({ids}) "
+                "ON CONFLICT (user_id, post_id) DO NOTHING"
+            ).format(
+                feed=quote(self.model._meta.db_table),
+                post=quote(Post._meta.db_table),
+                follow=quote(Follow._meta.db_table),
+                user=quote(CustomUser._meta.db_table),
+                post_tags=quote(tags.db_table),
+                tags_post=quote(tags.get_field("post").column),
+                tags_tag=quote(tags.get_field("tag").column),
+                ids=placeholders,
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(sql, chunk * 3)
+
+    def backfill(self, follow, count=None):
+        """Write the latest `count` (default: BLOG_FEED_BACKFILL) posts of a new follow's target to the user's feed"""
+        if follow.author_id is not None and CustomUser.objects.filter(pk=follow.author_id, fan_out_on_read=True).exists():
+            return []   # Read at feed time anyway
+        count = getattr(settings, "BLOG_FEED_BACKFILL", 50) if count is None else count
+        posts = follow.posts().order_by("-published_date", "-id").values_list("id", "published_date")[:count]
+        return self.bulk_create(
+            [self.model(user_id=follow.user_id, post_id=post_id, published_date=published) for post_id, published in posts],
+            ignore_conflicts=True,
+        )
+
+    def unfollow(self, follow):
+        """Drop from the feed the posts of an unfollowed target, unless the user's other follows still match them"""
+        follows = Follow.objects.filter(user_id=follow.user_id)
+        # NOT IN a column holding NULLs matches nothing, hence the isnull filters
+        return self.filter(user_id=follow.user_id, post__in=follow.posts()).exclude(
+            post__author__in=follows.filter(author__isnull=False).values("author"),
+        ).exclude(
+            post__category__in=follows.filter(category__isnull=False).values("category"),
+        ).exclude(
+            post__tags__in=follows.filter(tag__isnull=False).values("tag"),
+        ).delete()
+
+
+class FeedEntry(models.Model):
+    """
+    Post in a user's feed, written by FeedEntryManager.fan_out() when the post is
+    published. The post's publication date is copied so that a page of the feed
+    is one range scan of feed_entry_user_idx, see FeedView.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="feed_entries", db_index=False)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="feed_entries")
+    published_date = models.DateTimeField()
+
+    objects = FeedEntryManager()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["user", "post"], name="unique_feed_entry")]
+        indexes = [models.Index(fields=["user", "-published_date", "-post"], name="feed_entry_user_idx")]
+        verbose_name_plural = "Feed entries"
 
     def __str__(self):
-        return f"Rating of {self.rating} by {self.user.username} for {self.post.title}"
\ No newline at end of file
+        return f"Post {self.post_id} in the feed of user {self.user_id}"
@@ -0,0 +1,212 @@
+import datetime
+import json
+import operator
+from decimal import Decimal
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, _reverse_ordering
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over a composite, unique sort key.
+
+    DRF's CursorPagination only seeks on the first ordering field and falls back
+    to an OFFSET for ties, which degrades on columns with many equal values
+    (titles, like counts). Here the primary key is always appended as a
+    tie-breaker and the cursor stores every sort value, so each page is a single
+    index range scan: `WHERE (a, b, id) < (:a, :b, :id) ORDER BY a, b, id LIMIT n`.
+    """
+
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-published_date",)  # Default ordering, views may override it with an `ordering` attribute
+
+    def get_ordering(self, request, queryset, view):
+        """Resolve the ordering and make it unique by appending the primary key"""
+        self.ordering = getattr(view, "ordering", None) or self.ordering
+        ordering = super().get_ordering(request, queryset, view)
+
+        if not any(field.lstrip("-") in ("pk", "id") for field in ordering):
+            # The tie-breaker follows the direction of the first sort key
+            ordering += ("-id",) if ordering[0].startswith("-") else ("id",)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset() for async views, fetching the page with the async ORM"""
+        page_queryset = self.get_page_queryset(queryset, request, view)
+        if page_queryset is None:
+            return None
+        return self.set_page([instance async for instance in page_queryset])
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """The unevaluated query of the requested page, None if pagination is off"""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            self.reverse, self.current_position = False, None
+        else:
+            self.reverse, self.current_position = self.cursor.reverse, self.cursor.position
+
+        if self.reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if self.current_position is not None:
+            queryset = queryset.filter(self._seek_filter(queryset, self.current_position, self.reverse))
+
+        # Always fetch one extra row to find out whether another page follows
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        """Keep the page out of the fetched rows and work out the links around it"""
+        self.page = results[:self.page_size]
+        has_following = len(results) > len(self.page)
+
+        if self.reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = self.current_position is not None
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = self.current_position is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(self.page[-1], self.ordering)
+        else:
+            position = self.cursor.position     # Empty page, stay where we are
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(self.page[0], self.ordering)
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def _get_position_from_instance(self, instance, ordering):
+        """Encode the values of every sort key of `instance` as a JSON list"""
+        values = []
+        for order in ordering:
+            field_name = order.lstrip("-")
+            if field_name == "pk":
+                field_name = "id"
+            value = instance[field_name] if isinstance(instance, dict) else getattr(instance, field_name)
+            if isinstance(value, (datetime.date, datetime.time)):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        return json.dumps(values, separators=(",", ":"))
+
+    def _decode_position(self, queryset, position):
+        """Turn a cursor position back into python values for each sort key"""
+        try:
+            values = json.loads(position)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        decoded = []
+        for order, value in zip(self.ordering, values):
+            field_name = order.lstrip("-")
+            try:
+                field = queryset.model._meta.get_field("id" if field_name == "pk" else field_name)
+            except FieldDoesNotExist:
+                field = None    # An annotation such as `like_count`, JSON already gives us a number
+            if field is not None and value is not None:
+                try:
+                    value = field.to_python(value)
+                except ValidationError:
+                    raise NotFound(self.invalid_cursor_message)
+            decoded.append(value)
+        return decoded
+
+    def _seek_filter(self, queryset, position, reverse):
+        return self._seek_condition(self._decode_position(queryset, position), reverse)
+
+    def _seek_condition(self, values, reverse, fields=None):
+        """
+        Build the lexicographic "row comes after the cursor" condition:
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND id > z)
+        `fields` maps the sort keys to the columns holding them, when they're named otherwise
+        """
+        condition = Q()
+        equal_so_far = Q()
+        bound = Q()
+        for index, (order, value) in enumerate(zip(self.ordering, values)):
+            field_name = order.lstrip("-")
+            if fields is not None:
+                field_name = fields[field_name]
+            descending = order.startswith("-") != reverse
+            lookup = "lt" if descending else "gt"
+            condition |= equal_so_far & Q(**{f"{field_name}__{lookup}": value})
+            equal_so_far &= Q(**{field_name: value})
+            if index == 0 and value is not None:
+                # AND a >= x, redundant but it lets SQLite seek the index to the cursor: with
+                # the OR alone and bound parameters, it may scan from the start of the range
+                bound = Q(**{f"{field_name}__{lookup}e": value})
+        return condition & bound
+
+
+class FeedPagination(KeysetPagination):
+    """
+    KeysetPagination of posts merged from several sources, see FeedView.
+
+    The view's get_feed_sources() gives querysets that hold the sort keys (the
+    post id as `id`) in their own columns, as a {sort key: column} mapping, and
+    each is walked with its own index. A page only holds the page_size + 1 next
+    ids of each source, so the page is cut from those: an index range scan per
+    source and a lookup of at most (page_size + 1) * sources posts, however many
+    posts the sources hold.
+    """
+
+    def get_page_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return super().get_page_queryset(queryset, request, view)
+
+        self.ordering = self.get_ordering(request, queryset, view)
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor.reverse
+        values = None
+        if cursor is not None and cursor.position is not None:
+            values = self._decode_position(queryset, cursor.position)
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        candidates = []
+        for source, fields in view.get_feed_sources():
+            source = source.order_by(*(("-" if order.startswith("-") else "") + fields[order.lstrip("-")] for order in ordering))
+            if values is not None:
+                source = source.filter(self._seek_condition(values, reverse, fields))
+            candidates.append(Q(pk__in=source.values(fields["id"])[:page_size + 1]))
+        return super().get_page_queryset(queryset.filter(reduce(operator.or_, candidates)), request, view)
@@ -0,0 +1,67 @@
+import datetime
+import json
+
+from rest_framework import renderers
+
+from .metrics import timing_serialization
+
+try:
+    import orjson
+except ImportError:     # Optional, the stock encoder is used without it
+    orjson = None
+
+# Types orjson would write differently from the DRF encoder are handed to the encoder
+ORJSON_OPTIONS = orjson and orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """
+    JSONRenderer encoding with orjson when it's installed, several times faster
+    than json.dumps() and byte for byte the same compact UTF-8 output: types
+    orjson doesn't know (or would write differently) go through the DRF
+    encoder's default(). The stock path remains for indented or ASCII output
+    and whatever orjson refuses, like integers over 64 bits or non-string keys.
+    Reports its time to the request metrics, see blog/metrics.py.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timing_serialization():
+            if orjson is None or data is None or self.ensure_ascii or not self.compact or (
+                self.get_indent(accepted_media_type, renderer_context or {}) is not None
+            ):
+                return super().render(data, accepted_media_type, renderer_context)
+            try:
+                ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+            except orjson.JSONEncodeError:
+                return super().render(data, accepted_media_type, renderer_context)
+            # Escaped like the stock renderer does, to stay a strict JavaScript subset
+            return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+
+
+class NDJSONRenderer(renderers.BaseRenderer):
+    """
+    One JSON document per line (newline-delimited JSON), for the streaming
+    exports of blog/export.py. Datetimes keep their microseconds, so an export's
+    `started_at` can be handed back as the `since` of the next one.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = None
+    encoder_class = renderers.JSONRenderer.encoder_class
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return b"" if data is None else self.line(data)
+
+    def default(self, value):
+        if isinstance(value, (datetime.date, datetime.time)):
+            return value.isoformat()    # What orjson writes for them
+        return self.encoder_class().default(value)
+
+    def line(self, data):
+        if orjson is not None:
+            try:
+                return orjson.dumps(data, default=self.default, option=orjson.OPT_APPEND_NEWLINE)
+            except orjson.JSONEncodeError:
+                pass
+        return json.dumps(data, default=self.default, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
@@ -0,0 +1,67 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_PREFIX = "blog:primary-pin:"
+
+# Replica alias the current request reads from, None to read from the primary
+_read_alias = ContextVar("blog_read_alias", default=None)
+
+
+def current_read_alias():
+    return _read_alias.get()
+
+
+def use_read_alias(alias):
+    """Route the reads of the current context to `alias`, returns a token for reset_read_alias()"""
+    return _read_alias.set(alias)
+
+
+def reset_read_alias(token):
+    _read_alias.reset(token)
+
+
+def pin_to_primary(user_id):
+    """Keep the reads of `user_id` on the primary until the replicas caught up with their write"""
+    cache.set(f"{PIN_PREFIX}{user_id}", True, getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 10))
+
+
+async def apin_to_primary(user_id):
+    await cache.aset(f"{PIN_PREFIX}{user_id}", True, getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 10))
+
+
+def is_pinned_to_primary(user_id):
+    return cache.get(f"{PIN_PREFIX}{user_id}", False)
+
+
+async def ais_pinned_to_primary(user_id):
+    return await cache.aget(f"{PIN_PREFIX}{user_id}", False)
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes go to the primary (`default`). Reads go to the replica that
+    blog.middleware.ReplicaRoutingMiddleware picked for the current request,
+    and to the primary everywhere else: unsafe requests, users who just wrote,
+    management commands, and inside a transaction on the primary, so that it
+    sees its own uncommitted writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = current_read_alias()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        return obj1._state.db in aliases and obj2._state.db in aliases
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,131 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import F, Q
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+from .models import Post, PostSearchEntry
+
+
+class SearchBackend:
+    """
+    Interface of the post search backends. The backend is chosen with the
+    BLOG_SEARCH_BACKEND setting and kept up to date by the signals in
+    blog/signals.py, `rebuild_search_index` rebuilds it from scratch.
+    """
+
+    ranked = False  # Whether search() annotates a `search_rank` (lower is more relevant)
+
+    def search(self, queryset, terms):
+        """Narrow a Post queryset down to the posts matching every term"""
+        raise NotImplementedError
+
+    def index_posts(self, post_ids):
+        """(Re)index the given posts, ids that no longer exist are dropped"""
+
+    def remove_posts(self, post_ids):
+        """Drop the given posts from the index"""
+
+    def rebuild(self, batch_size=1000):
+        """Reindex every post"""
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """Portable fallback without an index: icontains over the searched fields"""
+
+    search_fields = ["title", "content", "tags__name", "author__username"]
+
+    def search(self, queryset, terms):
+        matches = Post.objects.all()
+        for term in terms:
+            condition = Q()
+            for field in self.search_fields:
+                condition |= Q(**{f"{field}__icontains": term})
+            matches = matches.filter(condition)
+        # Filtering on ids keeps the tag join from duplicating posts
+        return queryset.filter(id__in=matches.values("id"))
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """Full-text search over the `blog_post_fts` FTS5 table, ranked with bm25()"""
+
+    ranked = True
+    table = PostSearchEntry._meta.db_table
+    chunk_size = 500    # Stay well below SQLite's bound parameter limit
+
+    def search(self, queryset, terms):
+        # Quote every term so user input is never parsed as FTS5 query syntax
+        query = " ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        return queryset.filter(search_entry__document__match=query).annotate(search_rank=F("search_entry__rank"))
+
+    def get_connection(self):
+        return connections[router.db_for_write(PostSearchEntry)]
+
+    def index_posts(self, post_ids):
+        post_ids = list(post_ids)
+        for start in range(0, len(post_ids), self.chunk_size):
+            chunk = post_ids[start:start + self.chunk_size]
+            posts = Post.objects.filter(id__in=chunk).select_related("author").prefetch_related("tags")
+            rows = [
+                (
+                    post.id, post.title, post.content,
+                    " ".join(tag.name for tag in post.tags.all()),
+                    post.author.username if post.author else "",
+                )
+                for post in posts
+            ]
+            with self.get_connection().cursor() as cursor:
+                cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk)
+                cursor.executemany(
+                    f"INSERT INTO {self.table}(rowid, title, content, tags, author) VALUES (%s, %s, %s, %s, %s)", rows
+                )
+
+    def remove_posts(self, post_ids):
+        post_ids = list(post_ids)
+        with self.get_connection().cursor() as cursor:
+            for start in range(0, len(post_ids), self.chunk_size):
+                chunk = post_ids[start:start + self.chunk_size]
+                cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk)
+
+    def rebuild(self, batch_size=1000):
+        with self.get_connection().cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+        batch = []
+        for post_id in Post.objects.order_by("id").values_list("id", flat=True).iterator(chunk_size=batch_size):
+            batch.append(post_id)
+            if len(batch) == batch_size:
+                self.index_posts(batch)
+                batch = []
+        self.index_posts(batch)
+        with self.get_connection().cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.table}({self.table}) VALUES('optimize')")  # Merge the index segments
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    """Instance of the BLOG_SEARCH_BACKEND class, DatabaseSearchBackend if unset"""
+    path = getattr(settings, "BLOG_SEARCH_BACKEND", "blog.search.DatabaseSearchBackend")
+    return import_string(path)()
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """SearchFilter running `?search=` through the configured search backend"""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return get_search_backend().search(queryset, terms)
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Used by the keyset paginator: rank by relevance when searching, unless
+        the client asked for an explicit `?ordering=`.
+        """
+        ordering_filter = filters.OrderingFilter()
+        searching = self.get_search_terms(request) and get_search_backend().ranked
+        if searching and ordering_filter.ordering_param not in request.query_params:
+            return ["search_rank"]
+        return ordering_filter.get_ordering(request, queryset, view)
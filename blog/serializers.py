@@ -1,22 +1,121 @@
-from rest_framework import serializers
-from .models import Post, Comment, Tag, Category, Like, Rating
+from rest_framework import fields, relations, serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.settings import ISO_8601, api_settings
+from .models import Post, Comment, Tag, Category, Like, Rating, CustomUser, Follow
 from django.contrib.auth import get_user_model
+from django.db import models
 
 User = get_user_model()
 
-class TagSerializer(serializers.ModelSerializer):
+
+def represent_field(field, instance, ret):
+    """One field of Serializer.to_representation(), as DRF does it"""
+    try:
+        attribute = field.get_attribute(instance)
+    except SkipField:
+        return
+    check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+    ret[field.field_name] = None if check_for_none is None else field.to_representation(attribute)
+
+
+def datetime_converter(field):
+    """DateTimeField.to_representation() with the format and time zone looked up once"""
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, "timezone") else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def to_representation(value):
+        if isinstance(value, str) or value.utcoffset() is None:
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+    return to_representation
+
+
+# Fields whose to_representation() is a plain conversion of the attribute
+CONVERTERS = {
+    fields.IntegerField: int,
+    fields.FloatField: float,
+    fields.CharField: str,
+    fields.SlugField: str,
+    fields.EmailField: str,
+    fields.ReadOnlyField: lambda value: value,
+    relations.StringRelatedField: str,
+}
+
+
+class FastRepresentationMixin:
+    """
+    Serializer read path without DRF's per-field dispatch, which costs more CPU
+    than the SQL on list pages. The readable fields are compiled once per
+    serializer instance (the items of a list share their child serializer) into
+    attribute reads and plain converters, for the field types in CONVERTERS and
+    nested serializers using this mixin. Other fields take the regular path, so
+    the output is the same as Serializer.to_representation() (see the tests).
+    """
+
+    fast_representation = True  # False restores DRF's own path, e.g. to compare
+
+    def to_representation(self, instance):
+        if not self.fast_representation:
+            return super().to_representation(instance)
+        plan = getattr(self, "_representation_plan", None) or self.compile_representation()
+        ret = {}
+        for attr, convert, field in plan:
+            if attr is not None:
+                try:
+                    value = getattr(instance, attr)
+                except AttributeError:
+                    pass    # Let DRF handle defaults, skipped fields and the error
+                else:
+                    ret[field.field_name] = None if value is None else convert(value)
+                    continue
+            represent_field(field, instance, ret)
+        return ret
+
+    def compile_representation(self):
+        """(attribute, converter, field) per readable field, attribute None for the regular path"""
+        model = getattr(getattr(self, "Meta", None), "model", None)
+        plan = []
+        for field in self._readable_fields:
+            attr = field.source_attrs[0] if len(field.source_attrs) == 1 else None
+            convert = self.get_converter(field)
+            # DRF calls methods given as source, leave them to it
+            if attr is None or convert is None or callable(getattr(model, attr, None)):
+                attr = convert = None
+            plan.append((attr, convert, field))
+        self._representation_plan = plan
+        return plan
+
+    def get_converter(self, field):
+        if type(field) in CONVERTERS:
+            return CONVERTERS[type(field)]
+        if type(field) is fields.DateTimeField:
+            return datetime_converter(field)
+        if isinstance(field, FastRepresentationMixin):
+            return field.to_representation
+        if isinstance(field, serializers.ListSerializer) and isinstance(field.child, FastRepresentationMixin):
+            child = field.child.to_representation
+            return lambda data: [
+                child(item) for item in (data.all() if isinstance(data, models.manager.BaseManager) else data)
+            ]
+        return None
+
+class TagSerializer(FastRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = "__all__"
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(FastRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = "__all__"
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(FastRepresentationMixin, serializers.ModelSerializer):
     author = serializers.StringRelatedField()   # Represent the author as a string
 
     class Meta:
@@ -24,7 +123,7 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = ["id", "author", "content", "created_at", "updated_at"]
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(FastRepresentationMixin, serializers.ModelSerializer):
     tags = TagSerializer(many=True, read_only=True)
     category = CategorySerializer(read_only=True)
     author = serializers.StringRelatedField()
@@ -38,6 +137,27 @@ class PostSerializer(serializers.ModelSerializer):
         ]
 
 
+class PostListSerializer(PostSerializer):
+    """
+    Post representation for list endpoints: a comment count instead of the
+    whole thread, plus a preview of the latest comments on `?expand=comments`
+    """
+
+    comment_count = serializers.IntegerField(read_only=True)
+    latest_comments = CommentSerializer(many=True, read_only=True)
+
+    class Meta(PostSerializer.Meta):
+        fields = [
+            "id", "title", "content", "author", "category", "tags",
+            "published_date", "updated", "comment_count", "latest_comments"
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.context.get("expand_comments"):
+            self.fields.pop("latest_comments")
+
+
 class PostCreateUpdateSerializer(serializers.ModelSerializer):
     """Serializer for creating and updating posts"""
 
@@ -48,6 +168,88 @@ class PostCreateUpdateSerializer(serializers.ModelSerializer):
         fields = ["title", "content", "category", "tags"]
 
 
+class PostBulkCreateListSerializer(serializers.ListSerializer):
+    """Validates the tags and categories of the whole batch in two queries, then bulk inserts it"""
+
+    def validate(self, attrs):
+        tag_ids = {tag_id for item in attrs for tag_id in item["tag_ids"]}
+        category_ids = {item["category_id"] for item in attrs if item.get("category_id") is not None}
+        errors = {}
+        missing_tags = tag_ids - set(Tag.objects.filter(pk__in=tag_ids).values_list("pk", flat=True))
+        if missing_tags:
+            errors["tags"] = [f'Invalid pk "{pk}" - object does not exist.' for pk in sorted(missing_tags)]
+        missing_categories = category_ids - set(Category.objects.filter(pk__in=category_ids).values_list("pk", flat=True))
+        if missing_categories:
+            errors["category"] = [f'Invalid pk "{pk}" - object does not exist.' for pk in sorted(missing_categories)]
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    def create(self, validated_data):
+        tag_ids = [list(dict.fromkeys(item.pop("tag_ids"))) for item in validated_data]
+        posts = Post.objects.bulk_create_with_tags([Post(**item) for item in validated_data], tag_ids)
+        for post, ids in zip(posts, tag_ids):
+            post.tag_ids = ids
+        return posts
+
+
+class PostBulkCreateSerializer(serializers.ModelSerializer):
+    """One post of a bulk create, tags and category are given by id"""
+
+    category = serializers.IntegerField(source="category_id", required=False, allow_null=True)
+    tags = serializers.ListField(source="tag_ids", child=serializers.IntegerField(), required=False, default=list)
+
+    class Meta:
+        model = Post
+        fields = ["id", "title", "content", "category", "tags"]
+        list_serializer_class = PostBulkCreateListSerializer
+
+
+class PostBulkTagSerializer(serializers.Serializer):
+    """Attach tags to, or detach them from, a batch of posts"""
+
+    posts = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=500)
+    tags = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=100)
+    action = serializers.ChoiceField(choices=["add", "remove"])
+
+    def validate(self, attrs):
+        for name, model in (("posts", Post), ("tags", Tag)):
+            ids = set(attrs[name])
+            missing = ids - set(model.objects.filter(pk__in=ids).values_list("pk", flat=True))
+            if missing:
+                raise serializers.ValidationError({name: [f'Invalid pk "{pk}" - object does not exist.' for pk in sorted(missing)]})
+        return attrs
+
+
+class CategoryNameField(serializers.SlugRelatedField):
+    """Category by name, which Category.save() stores lowercased"""
+
+    def to_internal_value(self, data):
+        return super().to_internal_value(data.lower() if isinstance(data, str) else data)
+
+
+class FollowSerializer(serializers.ModelSerializer):
+    """Follow of exactly one of an author (by username), a tag (by ID) or a category (by name)"""
+
+    author = serializers.SlugRelatedField(slug_field="username", queryset=CustomUser.objects.all(), required=False, allow_null=True)
+    category = CategoryNameField(slug_field="name", queryset=Category.objects.all(), required=False, allow_null=True)
+
+    class Meta:
+        model = Follow
+        fields = ["id", "author", "tag", "category", "created_at"]
+
+    def validate(self, attrs):
+        targets = {name: attrs[name] for name in Follow.TARGETS if attrs.get(name) is not None}
+        if len(targets) != 1:
+            raise serializers.ValidationError("Follow exactly one of an author, a tag or a category.")
+        user = self.context["request"].user
+        if targets.get("author") == user:
+            raise serializers.ValidationError({"author": ["You can't follow yourself."]})
+        if Follow.objects.filter(user=user, **targets).exists():
+            raise serializers.ValidationError("You already follow this.")
+        return attrs
+
+
 class LikeSerializer(serializers.ModelSerializer):
     user = serializers.StringRelatedField(read_only=True)  # Display user's username
     post_title = serializers.CharField(source="post.title", read_only=True)  # Include post title in the response
@@ -69,7 +271,7 @@ class RatingSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Rating
-        fields = "__all__"
+        exclude = ["previous_rating", "previous_updated_at"]
 
     def create(self, validated_data):
         validated_data["user"] = self.context["request"].user
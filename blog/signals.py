@@ -0,0 +1,313 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .authentication import forget_user
+from .cache import invalidate
+from .models import (
+    Category, Comment, CustomUser, FeedEntry, Follow, Like, Post, PostDailyStats, Rating, Tag, comments_bulk_created,
+    engagement_deleted, posts_bulk_changed,
+)
+from .search import get_search_backend
+
+
+# Keep the search index in step with the posts, their tags and author names
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, **kwargs):
+    get_search_backend().index_posts([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    get_search_backend().remove_posts([instance.pk])
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def index_retagged_posts(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        get_search_backend().index_posts([instance.pk])
+    elif pk_set:
+        get_search_backend().index_posts(pk_set)    # tag.posts.add(...) / remove(...)
+
+
+@receiver(posts_bulk_changed)
+def index_bulk_changed_posts(sender, post_ids, **kwargs):
+    get_search_backend().index_posts(post_ids)
+
+
+@receiver(post_save, sender=Tag)
+def index_renamed_tag_posts(sender, instance, created, **kwargs):
+    if not created:
+        get_search_backend().index_posts(instance.posts.values_list("id", flat=True))
+
+
+@receiver(post_save, sender=CustomUser)
+def index_renamed_author_posts(sender, instance, created, update_fields, **kwargs):
+    # Logins save the user with update_fields=["last_login"], skip those
+    if created or (update_fields is not None and "username" not in update_fields):
+        return
+    get_search_backend().index_posts(instance.posts.values_list("id", flat=True))
+
+
+# Invalidate the cached responses depending on what was written
+
+def invalidate_on_commit(*scopes):
+    """
+    Invalidate right away and again once the transaction commits, so a read
+    racing the transaction cannot cache the old rows for longer than that
+    """
+    invalidate(*scopes)
+    transaction.on_commit(lambda: invalidate(*scopes))
+
+
+def post_cache_scopes(post_id):
+    """Scopes of every cached response a post shows up in"""
+    scopes = [f"post:{post_id}", "posts", "leaderboard"]
+    row = Post.objects.filter(pk=post_id).values_list("category__name", "author__username").first()
+    if row:
+        category_name, author_username = row
+        if category_name:
+            scopes.append(f"category:{category_name}")
+        if author_username:
+            scopes.append(f"author:{author_username}")
+    return scopes
+
+
+def posts_cache_scopes(post_ids):
+    """post_cache_scopes() of many posts, in one query"""
+    scopes = {"posts", "leaderboard"}
+    rows = Post.objects.filter(pk__in=post_ids).values_list("id", "category__name", "author__username")
+    for post_id, category_name, author_username in rows:
+        scopes.add(f"post:{post_id}")
+        if category_name:
+            scopes.add(f"category:{category_name}")
+        if author_username:
+            scopes.add(f"author:{author_username}")
+    return scopes
+
+
+def deleted_with_post(instance, origin):
+    """
+    Whether `instance` is deleted along with its post, as a cascade of the
+    deletion `origin` (the instance or queryset delete() was called on). The
+    post's own receivers then cover it.
+    """
+    return instance.post_id in getattr(origin, "_deleted_post_ids", ())
+
+
+def deleted_post_cache_scopes(instance, origin):
+    """post_cache_scopes() of the post of `instance`, worked out once per post for a whole cascade"""
+    if origin is None or origin is instance:
+        return post_cache_scopes(instance.post_id)
+    scopes = vars(origin).setdefault("_post_cache_scopes", {})
+    if instance.post_id not in scopes:
+        scopes[instance.post_id] = post_cache_scopes(instance.post_id)
+    return scopes[instance.post_id]
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_delete, sender=Post)
+def remember_post_cache_scopes(sender, instance, **kwargs):
+    # Before the write, so moving a post out of a category or author also invalidates the old listing
+    instance._previous_cache_scopes = post_cache_scopes(instance.pk) if instance.pk else []
+
+
+@receiver(pre_delete, sender=Post)
+def mark_deleted_post(sender, instance, origin=None, **kwargs):
+    # Django sends every pre_delete of a cascade before deleting anything, see deleted_with_post()
+    if origin is not None:
+        vars(origin).setdefault("_deleted_post_ids", set()).add(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    invalidate_on_commit(*getattr(instance, "_previous_cache_scopes", []), *post_cache_scopes(instance.pk))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def invalidate_retagged_posts(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    post_ids = (pk_set or []) if reverse else [instance.pk]
+    invalidate_on_commit(*posts_cache_scopes(post_ids))
+
+
+@receiver(posts_bulk_changed)
+def invalidate_bulk_changed_posts(sender, post_ids, **kwargs):
+    invalidate_on_commit(*posts_cache_scopes(post_ids))
+
+
+@receiver(post_save, sender=Comment)
+def invalidate_commented_post(sender, instance, **kwargs):
+    invalidate_on_commit(*post_cache_scopes(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def invalidate_uncommented_post(sender, instance, origin=None, **kwargs):
+    if not deleted_with_post(instance, origin):
+        invalidate_on_commit(*deleted_post_cache_scopes(instance, origin))
+
+
+@receiver(comments_bulk_created)
+def invalidate_bulk_commented_posts(sender, post_ids, **kwargs):
+    invalidate_on_commit(*posts_cache_scopes(post_ids))
+
+
+@receiver(post_save, sender=Like)
+@receiver(engagement_deleted, sender=Like)
+@receiver(post_save, sender=Rating)
+def invalidate_engagement(sender, instance, **kwargs):
+    # Likes and ratings only show in the post detail and the leaderboards
+    invalidate_on_commit(f"post:{instance.post_id}", "leaderboard")
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_taxonomy(sender, instance, **kwargs):
+    # Rare writes rendered in almost every response
+    invalidate_on_commit("global")
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_renamed_author(sender, instance, created, update_fields, **kwargs):
+    if created or (update_fields is not None and "username" not in update_fields):
+        return
+    invalidate_on_commit("global")
+
+
+# Take the likes and ratings of deleted users out of the post counters. Django
+# fast-deletes them along with the user, without a signal per row.
+
+@receiver(pre_delete, sender=CustomUser)
+def subtract_deleted_user_engagement(sender, instance, **kwargs):
+    # The posts of the user go too
+    likes = Like.objects.filter(user=instance).exclude(post__author=instance).values_list("post_id", "created_at")
+    ratings = Rating.objects.filter(user=instance).exclude(post__author=instance).values_list("post_id", "rating", "updated_at")
+    buckets = defaultdict(lambda: [0, 0, 0])
+    for post_id, created_at in likes:
+        buckets[post_id, timezone.localdate(created_at)][0] += 1
+    for post_id, rating, updated_at in ratings:
+        bucket = buckets[post_id, timezone.localdate(updated_at)]
+        bucket[1] += rating
+        bucket[2] += 1
+    PostDailyStats.objects.subtract(buckets)
+    instance._engaged_post_ids = {post_id for post_id, _ in buckets}
+
+
+@receiver(post_delete, sender=CustomUser)
+def rebuild_deleted_user_engagement(sender, instance, **kwargs):
+    # The likes and ratings are gone now, recount their posts from the tables
+    post_ids = getattr(instance, "_engaged_post_ids", None)
+    if not post_ids:
+        return
+    posts = Post.objects.filter(pk__in=post_ids)
+    posts.rebuild_counters()
+    posts.touch()
+    invalidate_on_commit(*(f"post:{post_id}" for post_id in post_ids), "leaderboard")
+
+
+# Keep Post.last_activity current for the conditional GET validators
+
+@receiver(post_save, sender=Comment)
+def touch_commented_post(sender, instance, created, **kwargs):
+    if created:
+        instance.post.record_comment(1)     # Touches the post along with its trending points
+    else:
+        Post.objects.filter(pk=instance.post_id).touch()
+
+
+@receiver(pre_delete, sender=Comment)
+def count_uncommented_post(sender, instance, origin=None, **kwargs):
+    # Every pre_delete of a deletion comes first, touch_uncommented_post() then shifts each post once
+    vars(origin if origin is not None else instance).setdefault("_uncommented_posts", Counter())[instance.post_id] += 1
+
+
+@receiver(post_delete, sender=Comment)
+def touch_uncommented_post(sender, instance, origin=None, **kwargs):
+    deletion = vars(origin if origin is not None else instance)
+    counts = deletion.get("_uncommented_posts", Counter({instance.post_id: 1}))
+    count = counts.pop(instance.post_id, 0)
+    if not count or deleted_with_post(instance, origin):
+        return  # Counted with an earlier comment of the post, or gone with it
+    if "_uncommented_post_dates" not in deletion:
+        # The publication dates of the posts left to shift, in one query
+        deletion["_uncommented_post_dates"] = dict(
+            Post.objects.filter(pk__in=[instance.post_id, *counts]).values_list("id", "published_date")
+        )
+    published = deletion["_uncommented_post_dates"].get(instance.post_id)
+    if published is not None:
+        Post(pk=instance.post_id, published_date=published).record_comment(-count)  # Only reads these two
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def touch_retagged_posts(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    post_ids = (pk_set or []) if reverse else [instance.pk]
+    Post.objects.filter(pk__in=post_ids).touch()
+
+
+@receiver(posts_bulk_changed)
+@receiver(comments_bulk_created)
+def touch_bulk_changed_posts(sender, post_ids, **kwargs):
+    Post.objects.filter(pk__in=post_ids).touch()
+
+
+@receiver(comments_bulk_created)
+def score_bulk_commented_posts(sender, post_ids, **kwargs):
+    Post.objects.filter(pk__in=post_ids).rebuild_trending()
+
+
+# Fan posts out to the feeds of their followers, see FeedEntryManager
+
+@receiver(post_save, sender=Post)
+def fan_out_saved_post(sender, instance, **kwargs):
+    # Also on updates, a new category brings new followers
+    FeedEntry.objects.fan_out([instance.pk])
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def fan_out_tagged_posts(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != "post_add":
+        return
+    FeedEntry.objects.fan_out((pk_set or []) if reverse else [instance.pk])
+
+
+@receiver(posts_bulk_changed)
+def fan_out_bulk_changed_posts(sender, post_ids, **kwargs):
+    FeedEntry.objects.fan_out(post_ids)
+
+
+@receiver(post_save, sender=Follow)
+def fill_followed_feed(sender, instance, created, **kwargs):
+    if not created:
+        return
+    if instance.author_id is not None:
+        Follow.objects.update_fan_out_mode([instance.author_id])
+    FeedEntry.objects.backfill(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def empty_unfollowed_feed(sender, instance, **kwargs):
+    FeedEntry.objects.unfollow(instance)
+
+
+# Drop cached users when they change, see blog/authentication.py
+
+@receiver(post_save, sender=CustomUser)
+def forget_saved_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver(post_delete, sender=CustomUser)
+def forget_deleted_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
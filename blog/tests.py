@@ -1,3 +1,1522 @@
-from django.test import TestCase
+import gzip
+import json
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import AnonymousUser
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, OperationalError
+from django.db.models import Count, F, Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, resolve, reverse
+from django.utils import timezone
+from datetime import timedelta
+from unittest import mock
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from .models import *
+from . import async_views, metrics
+from .authentication import REVOKED_PREFIX, USER_PREFIX, ClaimsTokenObtainPairSerializer, is_revoked
+from .cache import VERSION_PREFIX, CachedResponseMixin, invalidate, stats as cache_stats
+from .mail import MAX_ATTEMPTS, claim_batch, deliver_queued_emails
+from .management.utils import explicit_timestamps
+from .middleware import ReplicaRoutingMiddleware
+from .throttling import SlidingWindowThrottle
+from .signals import post_cache_scopes
+from .routers import PIN_PREFIX, PrimaryReplicaRouter, current_read_alias, reset_read_alias, use_read_alias
+from .urls import blog_urlpatterns
 
-# Create your tests here.
+
+class BlogTestCase(TestCase):
+    """Cached responses outlive the per-test rollback, so every test starts with an empty cache"""
+
+    def setUp(self):
+        cache.clear()
+
+
+class PaginationTests(BlogTestCase):
+    """Keyset pagination across the list endpoints"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(email="author@example.com", password="pass1234", username="author")
+        cls.posts = [Post.objects.create(title=f"Post {i % 3}", content="...", author=cls.author) for i in range(7)]
+        # Identical timestamps force the cursor to rely on the id tie-breaker
+        Post.objects.update(published_date=timezone.now())
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def walk(self, url):
+        """Follow `next` links to the end and return the ids seen, page by page"""
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append([item["id"] for item in response.data["results"]])
+            url = response.data["next"]
+        return pages
+
+    def test_pages_cover_every_post_once(self):
+        pages = self.walk(reverse("post-list-create") + "?page_size=3")
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sorted(sum(pages, [])), sorted(post.id for post in self.posts))
+
+    def test_ordering_whitelist_still_applies(self):
+        pages = self.walk(reverse("post-list-create") + "?page_size=2&ordering=title")
+        titles = [Post.objects.get(id=pk).title for pk in sum(pages, [])]
+        self.assertEqual(titles, sorted(titles))
+        self.assertEqual(len(titles), 7)
+
+    def test_previous_link_returns_the_same_page(self):
+        first = self.client.get(reverse("posts-by-author", args=["author"]) + "?page_size=3").data
+        second = self.client.get(first["next"]).data
+        back = self.client.get(second["previous"]).data
+        self.assertEqual([p["id"] for p in back["results"]], [p["id"] for p in first["results"]])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(reverse("post-list-create") + "?cursor=cD1bMV0=")  # p=[1], wrong number of sort keys
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryCountTests(BlogTestCase):
+    """Post listings run a fixed number of queries whatever the page size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(email="author@example.com", password="pass1234", username="author")
+        category = Category.objects.create(name="Python")
+        tags = [Tag.objects.create(name=f"tag{i}") for i in range(3)]
+        for i in range(30):
+            post = Post.objects.create(title=f"Post {i}", content="...", author=cls.author, category=category)
+            post.tags.set(tags)
+            Comment.objects.create(post=post, author=cls.author, content="Nice")
+            Like.objects.create(post=post, user=cls.author)
+            Rating.objects.create(post=post, user=cls.author, rating=4)
+        Post.objects.rebuild_counters()
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def assertConstantQueries(self, url, num):
+        """Same query count for a small and a large page"""
+        for page_size in (5, 30):
+            with self.assertNumQueries(num):
+                response = self.client.get(f"{url}{'&' if '?' in url else '?'}page_size={page_size}")
+            self.assertEqual(len(response.data["results"]), page_size)
+
+    def test_post_list(self):
+        self.assertConstantQueries(reverse("post-list-create"), 2)
+
+    def test_post_list_with_comment_preview(self):
+        self.assertConstantQueries(reverse("post-list-create") + "?expand=comments", 3)
+
+    def test_posts_by_category_and_author(self):
+        self.assertConstantQueries(reverse("posts-by-category", args=["python"]), 2)
+        self.assertConstantQueries(reverse("posts-by-author", args=["author"]), 2)
+
+    def test_leaderboards(self):
+        self.assertConstantQueries(reverse("most-liked-posts"), 2)
+        self.assertConstantQueries(reverse("highest-rated-posts"), 2)
+        self.assertConstantQueries(reverse("trending-posts"), 2)
+
+
+class CommentSummaryTests(BlogTestCase):
+    """Post listings carry a comment count and an optional bounded preview"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(email="author@example.com", password="pass1234", username="author")
+        cls.post = Post.objects.create(title="Busy", content="...", author=cls.author)
+        cls.comments = [Comment.objects.create(post=cls.post, author=cls.author, content=f"#{i}") for i in range(5)]
+
+    def test_list_has_count_but_no_comments(self):
+        item = APIClient().get(reverse("post-list-create")).data["results"][0]
+        self.assertEqual(item["comment_count"], 5)
+        self.assertNotIn("comments", item)
+        self.assertNotIn("latest_comments", item)
+
+    def test_expand_returns_latest_comments_only(self):
+        item = APIClient().get(reverse("post-list-create") + "?expand=comments").data["results"][0]
+        self.assertEqual(item["comment_count"], 5)
+        self.assertEqual([c["content"] for c in item["latest_comments"]], ["#4", "#3", "#2"])
+
+
+class PostCounterTests(BlogTestCase):
+    """Like and rating counters stay in step with the Like and Rating tables"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email="reader@example.com", password="pass1234", username="reader")
+        cls.post = Post.objects.create(title="Counted", content="...", author=cls.user)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("post-detail", args=[self.post.pk])
+
+    def test_like_toggle_updates_counter(self):
+        self.client.post(self.url, {"action": "like"})
+        self.assertEqual(Post.objects.get(pk=self.post.pk).like_count, 1)
+        self.client.post(self.url, {"action": "like"})
+        self.assertEqual(Post.objects.get(pk=self.post.pk).like_count, 0)
+
+    def test_rating_updates_sum_and_count(self):
+        other = CustomUser.objects.create_user(email="other@example.com", password="pass1234", username="other")
+        self.client.post(self.url, {"action": "rate", "rating": 2})
+        self.client.post(self.url, {"action": "rate", "rating": 4})     # Re-rating replaces the old value
+        Rating.objects.create(post=self.post, user=other, rating=5)
+        Post.objects.filter(pk=self.post.pk).update(rating_sum=F("rating_sum") + 5, rating_count=F("rating_count") + 1)
+
+        data = self.client.get(self.url).data
+        self.assertEqual(data["average_rating"], 4.5)
+        self.assertEqual(data["total_likes"], 0)
+
+    def test_deleting_a_user_takes_their_engagement_out(self):
+        other = CustomUser.objects.create_user(email="other@example.com", password="pass1234", username="other")
+        client = APIClient()
+        client.force_authenticate(other)
+        self.client.post(self.url, {"action": "rate", "rating": 2})
+        client.post(self.url, {"action": "like"})
+        client.post(self.url, {"action": "rate", "rating": 5})
+        self.client.get(self.url)   # Cached
+
+        other.delete()
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.like_count, post.rating_sum, post.rating_count), (0, 2, 1))
+        self.assertEqual(post.trending_points, 2 - Post.RATING_PRIOR_MEAN)
+        bucket = PostDailyStats.objects.get(post=self.post)
+        self.assertEqual((bucket.like_count, bucket.rating_sum, bucket.rating_count), (0, 2, 1))
+        data = self.client.get(self.url).data
+        self.assertEqual((data["total_likes"], data["average_rating"]), (0, 2))
+
+    def test_rebuild_command_repairs_drift(self):
+        Like.objects.create(post=self.post, user=self.user)
+        Rating.objects.create(post=self.post, user=self.user, rating=3)
+        call_command("rebuild_post_counters", stdout=StringIO())
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((post.like_count, post.rating_sum, post.rating_count), (1, 3, 1))
+
+
+class LeaderboardTests(BlogTestCase):
+    """Leaderboards rank on the precomputed counters and daily buckets"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            CustomUser.objects.create_user(email=f"user{i}@example.com", password="pass1234", username=f"user{i}")
+            for i in range(4)
+        ]
+        cls.single_vote = Post.objects.create(title="One vote", content="...", author=cls.users[0])
+        cls.well_rated = Post.objects.create(title="Many votes", content="...", author=cls.users[0])
+        cls.old_favourite = Post.objects.create(title="Old", content="...", author=cls.users[0])
+        cls.unrated = Post.objects.create(title="Unrated", content="...", author=cls.users[0])
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def act(self, user, post, action, rating=None):
+        """Record an action the way PostDetailView.post does"""
+        if action == "like":
+            Like.objects.create(post=post, user=user)
+            post.record_like(1)
+        else:
+            Rating.objects.create(post=post, user=user, rating=rating)
+            post.record_rating(rating)
+
+    def ids(self, name, query=""):
+        return [item["id"] for item in self.client.get(reverse(name) + query).data["results"]]
+
+    def test_weighted_rating_needs_more_than_one_vote(self):
+        self.act(self.users[0], self.single_vote, action="rate", rating=5)
+        for user in self.users:
+            self.act(user, self.well_rated, action="rate", rating=4)
+        # 4 votes of 4 beat a single 5, unrated posts are left out
+        self.assertEqual(self.ids("highest-rated-posts"), [self.well_rated.pk, self.single_vote.pk])
+
+    def test_windows_only_count_recent_likes(self):
+        for user in self.users:
+            self.act(user, self.old_favourite, action="like")
+        PostDailyStats.objects.update(day=timezone.localdate() - timedelta(days=30))
+        self.act(self.users[0], self.single_vote, action="like")
+
+        self.assertEqual(self.ids("most-liked-posts")[:2], [self.old_favourite.pk, self.single_vote.pk])
+        self.assertEqual(self.ids("most-liked-posts", "?window=week"), [self.single_vote.pk])
+        self.assertEqual(self.ids("most-liked-posts", "?window=day"), [self.single_vote.pk])
+
+    def test_unlike_removes_the_like_from_its_bucket(self):
+        self.client.force_authenticate(self.users[0])
+        self.client.post(reverse("post-detail", args=[self.single_vote.pk]), {"action": "like"})
+        self.client.post(reverse("post-detail", args=[self.single_vote.pk]), {"action": "like"})
+        self.assertEqual(PostDailyStats.objects.get(post=self.single_vote).like_count, 0)
+
+    def test_unknown_window_is_rejected(self):
+        response = self.client.get(reverse("most-liked-posts") + "?window=year")
+        self.assertEqual(response.status_code, 400)
+
+    def test_trending_points_follow_engagement(self):
+        self.client.force_authenticate(self.users[0])
+        url = reverse("post-detail", args=[self.single_vote.pk])
+        self.client.post(url, {"action": "like"})
+        self.client.post(url, {"action": "rate", "rating": 5})
+        comment = Comment.objects.create(post=self.single_vote, author=self.users[1], content="Hot")
+        self.act(self.users[2], self.single_vote, action="rate", rating=1)
+        # 1 like + 2 per comment + 2 stars above the mean - 2 below it
+        self.assertEqual(Post.objects.get(pk=self.single_vote.pk).trending_points, 3)
+
+        comment.delete()
+        self.client.post(url, {"action": "like"})
+        post = Post.objects.get(pk=self.single_vote.pk)
+        self.assertEqual((post.trending_points, post.trending_score), (0, 0))
+        self.assertEqual(self.ids("trending-posts"), [])
+
+        Post.objects.update(trending_points=10)
+        Post.objects.rebuild_counters()
+        self.assertEqual(Post.objects.get(pk=self.single_vote.pk).trending_points, 0)
+
+    def test_deleted_comments_shift_each_post_once(self):
+        def post_updates(delete):
+            with CaptureQueriesContext(connection) as queries:
+                delete()
+            return [query for query in queries if query["sql"].startswith('UPDATE "blog_post"')]
+
+        for post in (self.single_vote, self.well_rated):
+            for author in self.users:
+                Comment.objects.create(post=post, author=author, content="...")
+        self.assertEqual(len(post_updates(self.users[1].delete)), 2)
+        self.assertEqual(Post.objects.get(pk=self.well_rated.pk).trending_points, 3 * Post.TRENDING_COMMENT_POINTS)
+        # The comments of a deleted post leave it alone
+        self.assertEqual(post_updates(self.single_vote.delete), [])
+        self.assertEqual(Post.objects.get(pk=self.well_rated.pk).trending_points, 3 * Post.TRENDING_COMMENT_POINTS)
+
+    def test_trending_decays_with_age(self):
+        for user in self.users:
+            self.act(user, self.old_favourite, action="like")
+        self.act(self.users[0], self.well_rated, action="like")
+        self.act(self.users[0], self.single_vote, action="like")
+        self.assertEqual(self.ids("trending-posts")[0], self.old_favourite.pk)
+
+        # Three days later 4 likes weigh less than a fresh one, and a week later the post is gone
+        Post.objects.filter(pk=self.old_favourite.pk).update(published_date=timezone.now() - timedelta(days=3))
+        Post.objects.filter(pk=self.well_rated.pk).update(published_date=timezone.now() - timedelta(days=8))
+        call_command("refresh_trending", stdout=StringIO())
+        self.assertEqual(self.ids("trending-posts"), [self.single_vote.pk, self.old_favourite.pk])
+
+        # A like on a post out of the window leaves it out
+        self.act(self.users[1], Post.objects.get(pk=self.well_rated.pk), action="like")
+        self.assertEqual(Post.objects.get(pk=self.well_rated.pk).trending_score, 0)
+
+
+class SearchTests(BlogTestCase):
+    """Full-text search through the FTS5 backend"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(email="writer@example.com", password="pass1234", username="writer")
+        cls.django = Tag.objects.create(name="django")
+        cls.in_title = Post.objects.create(title="Running Django", content="A post", author=cls.author)
+        cls.in_content = Post.objects.create(title="Notes", content="We ran the migrations while running", author=cls.author)
+        cls.tagged = Post.objects.create(title="Tagged", content="Nothing to see", author=cls.author)
+        cls.tagged.tags.add(cls.django)
+
+    def search(self, query):
+        response = APIClient().get(reverse("post-list-create"), {"search": query})
+        self.assertEqual(response.status_code, 200)
+        return [item["id"] for item in response.data["results"]]
+
+    def test_results_are_ranked_and_stemmed(self):
+        # "run" matches "Running" and "running", the title match ranks first
+        self.assertEqual(self.search("run"), [self.in_title.pk, self.in_content.pk])
+
+    def test_relevance_pages_follow_the_cursor(self):
+        client = APIClient()
+        first = client.get(reverse("post-list-create"), {"search": "run", "page_size": 1}).data
+        second = client.get(first["next"]).data
+        self.assertEqual([first["results"][0]["id"], second["results"][0]["id"]], [self.in_title.pk, self.in_content.pk])
+        self.assertIsNone(second["next"])
+
+    def test_tags_and_authors_are_indexed_without_duplicates(self):
+        self.assertEqual(sorted(self.search("django")), sorted([self.in_title.pk, self.tagged.pk]))
+        self.assertEqual(len(self.search("writer")), 3)
+
+    def test_index_follows_updates_and_deletes(self):
+        self.in_content.title = "Django notes"
+        self.in_content.save()
+        self.django.name = "web"
+        self.django.save()
+        self.assertEqual(sorted(self.search("django")), sorted([self.in_title.pk, self.in_content.pk]))
+        self.in_title.delete()
+        self.assertEqual(self.search("django"), [self.in_content.pk])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search('"unbalanced AND ('), [])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM blog_post_fts")
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(len(self.search("writer")), 3)
+
+
+class ResponseCacheTests(BlogTestCase):
+    """Read endpoints are cached until a write touches what they show"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(email="cached@example.com", password="pass1234", username="cached")
+        cls.python = Category.objects.create(name="python")
+        cls.post = Post.objects.create(title="Cached", content="...", author=cls.author, category=cls.python)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_second_read_is_served_from_cache(self):
+        url = reverse("posts-by-category", args=["Python"])
+        self.assertEqual(self.get(url)["X-Cache"], "MISS")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(url)["X-Cache"], "HIT")
+        self.assertGreaterEqual(cache_stats()["PostsByCategory"]["hits"], 1)
+
+    def test_comment_invalidates_detail_and_listings(self):
+        detail = reverse("post-detail", args=[self.post.pk])
+        by_author = reverse("posts-by-author", args=["cached"])
+        self.get(detail), self.get(by_author)
+        Comment.objects.create(post=self.post, author=self.author, content="New")
+        self.assertEqual(len(self.get(detail).data["post"]["comments"]), 1)
+        self.assertEqual(self.get(by_author).data["results"][0]["comment_count"], 1)
+
+    def test_like_invalidates_detail_and_leaderboard(self):
+        detail = reverse("post-detail", args=[self.post.pk])
+        self.get(detail), self.get(reverse("most-liked-posts"))
+        self.client.post(detail, {"action": "like"})
+        self.assertEqual(self.get(detail).data["total_likes"], 1)
+        self.assertEqual(self.get(reverse("most-liked-posts"))["X-Cache"], "MISS")
+
+    def test_deleting_a_commenter_invalidates_their_posts_once(self):
+        commenter = CustomUser.objects.create_user(email="gone@example.com", password="pass1234", username="gone")
+        Comment.objects.bulk_create([Comment(post=self.post, author=commenter, content="Bye") for _ in range(3)])
+        Like.objects.create(post=self.post, user=commenter)
+        detail = reverse("post-detail", args=[self.post.pk])
+        self.assertEqual(len(self.get(detail).data["post"]["comments"]), 3)
+
+        with mock.patch("blog.signals.post_cache_scopes", wraps=post_cache_scopes) as scopes:
+            commenter.delete()
+        scopes.assert_called_once_with(self.post.pk)
+        self.assertEqual(len(self.get(detail).data["post"]["comments"]), 0)
+
+    def test_moving_a_post_invalidates_the_old_category(self):
+        url = reverse("posts-by-category", args=["python"])
+        self.assertEqual(len(self.get(url).data["results"]), 1)
+        self.post.category = Category.objects.create(name="rust")
+        self.post.save()
+        self.assertEqual(len(self.get(url).data["results"]), 0)
+
+
+class ConditionalRequestTests(BlogTestCase):
+    """ETag / Last-Modified validators answer unchanged polls with a 304"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(email="poller@example.com", password="pass1234", username="poller")
+        cls.post = Post.objects.create(title="Polled", content="...", author=cls.author)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def assertRevalidates(self, url, change):
+        """304 for an unchanged resource, 200 with a new ETag once `change` ran"""
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertIn("Last-Modified", response)
+        not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b"")
+
+        change()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+
+    def test_post_detail(self):
+        url = reverse("post-detail", args=[self.post.pk])
+        self.assertRevalidates(url, lambda: self.client.post(url, {"action": "like"}))
+
+    def test_post_detail_304_skips_serialization(self):
+        url = reverse("post-detail", args=[self.post.pk])
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(1):  # The metadata lookup only
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_comments(self):
+        url = reverse("comment-list-create", args=[self.post.pk])
+        self.assertRevalidates(url, lambda: self.client.post(url, {"content": "First"}))
+
+    def test_comment_deletion_changes_the_etag(self):
+        comment = Comment.objects.create(post=self.post, author=self.author, content="Soon gone")
+        url = reverse("comment-list-create", args=[self.post.pk])
+        self.assertRevalidates(url, comment.delete)
+
+    def test_if_modified_since(self):
+        url = reverse("post-detail", args=[self.post.pk])
+        last_modified = self.client.get(url)["Last-Modified"]
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_if_modified_since_sees_renames(self):
+        tag = Tag.objects.create(name="old")
+        self.post.tags.add(tag)
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Post.objects.filter(pk=self.post.pk).update(updated=an_hour_ago, last_activity=an_hour_ago)
+        cache.set(VERSION_PREFIX + "global", time.time_ns() - 3600 * 10**9, timeout=None)
+        urls = [reverse("post-detail", args=[self.post.pk]), reverse("comment-list-create", args=[self.post.pk])]
+        since = {url: self.client.get(url)["Last-Modified"] for url in urls}
+        for url in urls:
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=since[url]).status_code, 304)
+
+        tag.name = "new"
+        tag.save()
+        for url in urls:
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=since[url]).status_code, 200)
+
+    def test_list_pages(self):
+        url = reverse("posts-by-author", args=["poller"])
+        self.assertRevalidates(url, lambda: Post.objects.create(title="Another", content="...", author=self.author))
+        self.assertRevalidates(reverse("post-list-create"), lambda: self.post.tags.add(Tag.objects.create(name="new")))
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    """Email backend standing in for an unreachable SMTP server"""
+
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError("SMTP server unreachable")
+
+
+class ShareEmailQueueTests(BlogTestCase):
+    """Shares are queued and delivered in batches by the worker"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(email="sharer@example.com", password="pass1234", username="sharer")
+        cls.post = Post.objects.create(title="Worth sharing", content="...", author=cls.author)
+
+    def share(self, email):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        return client.post(reverse("post-share", args=[self.post.pk]), {"email": email})
+
+    def test_share_is_queued_not_sent(self):
+        response = self.share("friend@example.com")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(QueuedEmail.objects.get().status, QueuedEmail.PENDING)
+
+    def test_sharing_a_missing_post_is_a_404(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        response = client.post(reverse("post-share", args=[self.post.pk + 1000]), {"email": "friend@example.com"})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(QueuedEmail.objects.exists())
+
+    def test_worker_sends_the_batch_over_one_connection(self):
+        for i in range(3):
+            self.share(f"friend{i}@example.com")
+        call_command("send_queued_emails", "--once", stdout=StringIO())
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [f"friend{i}@example.com" for i in range(3)])
+        self.assertEqual(mail.outbox[0].subject, "Check out this post: Worth sharing")
+        self.assertEqual(QueuedEmail.objects.filter(status=QueuedEmail.SENT).count(), 3)
+
+    def test_a_message_is_sent_by_one_worker_only(self):
+        self.share("friend@example.com")
+        first = claim_batch(10)
+        self.assertEqual((len(first), claim_batch(10)), (1, []))
+        # The first worker's lease runs out in a slow batch and a second worker claims the message
+        QueuedEmail.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(deliver_queued_emails(), {"sent": 1, "retried": 0, "failed": 0})
+        with mock.patch("blog.mail.claim_batch", return_value=first):
+            self.assertEqual(deliver_queued_emails(), {"sent": 0, "retried": 0, "failed": 0})
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(EMAIL_BACKEND="blog.tests.FailingEmailBackend")
+    def test_failures_back_off_and_give_up(self):
+        self.share("friend@example.com")
+        self.assertEqual(deliver_queued_emails(), {"sent": 0, "retried": 1, "failed": 0})
+        email = QueuedEmail.objects.get()
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertIn("SMTP server unreachable", email.last_error)
+        self.assertEqual(deliver_queued_emails(), {"sent": 0, "retried": 0, "failed": 0})   # Not due yet
+
+        QueuedEmail.objects.update(attempts=MAX_ATTEMPTS - 1, next_attempt_at=timezone.now())
+        self.assertEqual(deliver_queued_emails()["failed"], 1)
+        self.assertEqual(QueuedEmail.objects.get().status, QueuedEmail.FAILED)
+
+
+class EngagementUpsertTests(BlogTestCase):
+    """Like toggles and rating upserts are single statements"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email="tapper@example.com", password="pass1234", username="tapper")
+        cls.post = Post.objects.create(title="Tapped", content="...", author=cls.user)
+
+    def test_unlike_is_one_statement(self):
+        Like.objects.toggle(self.post, self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertFalse(Like.objects.toggle(self.post, self.user))
+        writes = [q["sql"] for q in queries if "blog_like" in q["sql"]]
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith("DELETE"))
+
+    def test_rerating_replaces_the_value(self):
+        self.assertTrue(Rating.objects.rate(self.post, self.user, 2))
+        self.assertFalse(Rating.objects.rate(self.post, self.user, 5))
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((Rating.objects.get().rating, post.rating_sum, post.rating_count), (5, 5, 1))
+
+    def test_rerating_within_the_same_clock_tick(self):
+        with mock.patch("blog.models.timezone.now", return_value=timezone.now()):
+            self.assertTrue(Rating.objects.rate(self.post, self.user, 2))
+            with CaptureQueriesContext(connection) as queries:
+                self.assertFalse(Rating.objects.rate(self.post, self.user, 4))
+        # The re-rate is a single statement on the rating row
+        self.assertEqual(len([query for query in queries if '"blog_rating"' in query["sql"]]), 1)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual((Rating.objects.get().rating, post.rating_sum, post.rating_count), (4, 4, 1))
+
+    def test_invalid_ratings_are_rejected(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse("post-detail", args=[self.post.pk])
+        for value in ("abc", "3.7", 0, 6, None):
+            response = client.post(url, {"action": "rate", "rating": value}, format="json")
+            self.assertEqual(response.status_code, 400, value)
+        self.assertFalse(Rating.objects.exists())
+
+
+class ConcurrentEngagementTests(TransactionTestCase):
+    """Parallel toggles and ratings leave the counters matching the rows"""
+
+    databases = "__all__"   # Includes the reader alias of the sqlite-production profile
+    workers = 8
+    actions_per_worker = 10
+
+    def setUp(self):
+        cache.clear()
+        self.users = [
+            CustomUser.objects.create_user(email=f"racer{i}@example.com", password="pass1234", username=f"racer{i}")
+            for i in range(2)
+        ]
+        self.post = Post.objects.create(title="Contended", content="...", author=self.users[0])
+
+    def run_in_parallel(self, action):
+        errors = []
+
+        def worker(n):
+            try:
+                for i in range(self.actions_per_worker):
+                    while True:
+                        try:
+                            action(n, i)
+                            break
+                        except OperationalError as error:
+                            # SQLite allows one writer at a time, retry like a client would
+                            if "locked" not in str(error):
+                                raise
+                            time.sleep(0.001)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_parallel_like_toggles(self):
+        self.run_in_parallel(lambda n, i: Like.objects.toggle(self.post, self.users[n % 2]))
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.like_count, Like.objects.filter(post=post).count())
+        self.assertEqual(post.daily_stats.get().like_count, post.like_count)
+
+    def test_parallel_ratings(self):
+        self.run_in_parallel(lambda n, i: Rating.objects.rate(self.post, self.users[n % 2], (n + i) % 5 + 1))
+        post = Post.objects.get(pk=self.post.pk)
+        ratings = list(Rating.objects.filter(post=post).values_list("rating", flat=True))
+        self.assertEqual((post.rating_sum, post.rating_count), (sum(ratings), len(ratings)))
+        self.assertEqual(len(ratings), 2)
+
+
+@override_settings(DATABASE_REPLICAS=["replica1", "replica2"])
+class ReplicaRoutingTests(SimpleTestCase):
+    """Safe requests to the blog views read from a replica, unless the user just wrote"""
+
+    def setUp(self):
+        cache.clear()
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+        self.user = CustomUser(pk=1, email="writer@example.com", username="writer")
+
+    def request(self, method, user=None, path="/blog/posts/"):
+        """Run a request through the middleware, return the alias its view read from"""
+        seen = {}
+
+        def view_func(request):
+            seen["alias"] = self.router.db_for_read(Post)
+            request.user = user or AnonymousUser()
+            return HttpResponse(status=201 if method == "post" else 200)
+
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {AccessToken.for_user(user)}"} if user else {}
+        ReplicaRoutingMiddleware(view_func)(getattr(self.factory, method)(path, **headers))
+        self.assertIsNone(current_read_alias())
+        return seen["alias"]
+
+    def test_safe_requests_read_from_a_replica(self):
+        self.assertIn(self.request("get"), ["replica1", "replica2"])
+        self.assertIn(self.request("get", user=self.user), ["replica1", "replica2"])
+
+    def test_writers_read_their_writes_from_the_primary(self):
+        self.assertEqual(self.request("post", user=self.user), "default")
+        self.assertEqual(self.request("get", user=self.user), "default")
+
+        other = CustomUser(pk=2, email="reader@example.com", username="reader")
+        self.assertIn(self.request("get", user=other), ["replica1", "replica2"])
+
+        cache.delete(f"{PIN_PREFIX}{self.user.pk}")     # The pin expired
+        self.assertIn(self.request("get", user=self.user), ["replica1", "replica2"])
+
+    def test_other_apps_read_from_the_primary(self):
+        self.assertEqual(self.request("get", path="/admin/"), "default")
+
+    def test_transactions_read_from_the_primary(self):
+        token = use_read_alias("replica1")
+        try:
+            self.assertEqual(self.router.db_for_read(Post), "replica1")
+            with mock.patch.object(connections["default"], "in_atomic_block", True):
+                self.assertEqual(self.router.db_for_read(Post), "default")
+        finally:
+            reset_read_alias(token)
+        self.assertEqual(self.router.db_for_write(Post), "default")
+
+    def test_recently_invalidated_responses_are_built_from_the_primary(self):
+        class View(CachedResponseMixin):
+            def get_cache_scopes(self):
+                return ["posts"]
+
+        def read_alias():
+            response = HttpResponse()
+            response.data, response.status_code = self.router.db_for_read(Post), 200
+            return response
+
+        request = self.factory.get("/blog/posts/")
+        token = use_read_alias("replica1")
+        try:
+            invalidate("posts")     # Other clients' requests miss and may reach a lagging replica
+            self.assertEqual(View().cache_or_build(request, read_alias).data, "default")
+            cache.set_many({"blog:scope:global": 1, "blog:scope:posts": 1})    # Written long ago
+            self.assertEqual(View().cache_or_build(request, read_alias).data, "replica1")
+        finally:
+            reset_read_alias(token)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_everything_uses_the_primary(self):
+        self.assertEqual(self.request("get"), "default")
+
+
+class BulkEndpointTests(BlogTestCase):
+    """Batch creation, batch tagging and multi-get cost a fixed number of queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(email="bulk@example.com", password="pass1234", username="bulk")
+        cls.other = CustomUser.objects.create_user(email="other@example.com", password="pass1234", username="other")
+        cls.python = Category.objects.create(name="python")
+        cls.tags = [Tag.objects.create(name=name) for name in ("django", "sqlite", "rest")]
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def bulk_create(self, count):
+        batch = [
+            {"title": f"Imported {i}", "content": "...", "category": self.python.pk, "tags": [tag.pk for tag in self.tags[:2]]}
+            for i in range(count)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("post-bulk-create"), batch, format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+        return response, len(queries)
+
+    def test_bulk_create_query_count_is_independent_of_batch_size(self):
+        small, small_queries = self.bulk_create(3)
+        large, large_queries = self.bulk_create(30)
+        self.assertEqual(small_queries, large_queries)
+
+        post = Post.objects.get(pk=large.data[-1]["id"])
+        self.assertEqual((post.title, post.author, post.category), ("Imported 29", self.author, self.python))
+        self.assertEqual(sorted(post.tags.values_list("name", flat=True)), ["django", "sqlite"])
+        # The search index and the cached listings saw the batch too
+        search = self.client.get(reverse("post-list-create"), {"search": "imported", "page_size": 100})
+        self.assertEqual(len(search.data["results"]), 33)
+
+    def test_bulk_create_rejects_the_whole_batch(self):
+        batch = [{"title": "Fine", "content": "..."}, {"title": "Broken", "content": "...", "tags": [0]}]
+        response = self.client.post(reverse("post-bulk-create"), batch, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("tags", response.data)
+        self.assertFalse(Post.objects.exists())
+
+    def test_bulk_tags(self):
+        posts = [Post.objects.create(title=f"Post {i}", content="...", author=self.author) for i in range(3)]
+        posts[0].tags.add(self.tags[0])
+        url = reverse("post-bulk-tags")
+        ids = [post.pk for post in posts]
+
+        response = self.client.post(url, {"posts": ids, "tags": [self.tags[0].pk, self.tags[1].pk], "action": "add"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Post.tags.through.objects.filter(post_id__in=ids).count(), 6)
+
+        response = self.client.post(url, {"posts": ids, "tags": [self.tags[0].pk], "action": "remove"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(Post.tags.through.objects.filter(post_id__in=ids).values_list("tag_id", flat=True)), {self.tags[1].pk})
+
+        foreign = Post.objects.create(title="Not mine", content="...", author=self.other)
+        response = self.client.post(url, {"posts": [foreign.pk], "tags": [self.tags[0].pk], "action": "add"}, format="json")
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(foreign.tags.exists())
+
+    def test_multi_get(self):
+        posts = [Post.objects.create(title=f"Post {i}", content="...", author=self.author) for i in range(10)]
+        for post in posts:
+            post.tags.add(self.tags[0])
+            Comment.objects.create(post=post, author=self.other, content="Hi")
+        url = reverse("post-multi-get")
+
+        def query_count(ids):
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, {"ids": ",".join(map(str, ids))})
+            self.assertEqual(response.status_code, 200)
+            return response, len(queries)
+
+        response, few = query_count([posts[2].pk, 0, posts[0].pk])
+        self.assertEqual([item["post"]["id"] for item in response.data["results"]], [posts[2].pk, posts[0].pk])
+        self.assertEqual(response.data["missing"], [0])
+        detail = self.client.get(reverse("post-detail", args=[posts[2].pk]))
+        self.assertEqual(response.data["results"][0], detail.data)
+
+        _, many = query_count([post.pk for post in posts])
+        self.assertEqual(few, many)
+        self.assertEqual(self.client.get(url, {"ids": "1,x"}).status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+
+class AsyncURLConf:
+    """The blog routes served by the async views, as under ASGI"""
+    urlpatterns = [path("blog/", include(blog_urlpatterns(async_views)))]
+
+
+class AsyncViewTests(BlogTestCase):
+    """The async views answer exactly like the sync ones"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(email="async@example.com", password="pass1234", username="async")
+        category = Category.objects.create(name="python")
+        cls.posts = [Post.objects.create(title=f"Post {i}", content="...", author=cls.author, category=category) for i in range(3)]
+        Comment.objects.create(post=cls.posts[0], author=cls.author, content="First")
+        cls.posts[0].record_like(1)
+        cls.posts[1].record_rating(4)
+        cls.auth = {"Authorization": f"Bearer {AccessToken.for_user(cls.author)}"}
+
+    def async_request(self, method, url, **kwargs):
+        with override_settings(ROOT_URLCONF=AsyncURLConf):
+            return async_to_sync(getattr(self.async_client, method))(url, **kwargs)
+
+    def test_views_are_coroutines(self):
+        for pattern in AsyncURLConf.urlpatterns[0].url_patterns:
+            self.assertTrue(iscoroutinefunction(pattern.callback), pattern.name)
+        view = resolve(reverse("post-list-create"), urlconf=AsyncURLConf).func.view_class
+        self.assertIs(view, async_views.PostListCreateView)
+
+    def test_reads_match_the_sync_views(self):
+        urls = [
+            reverse("post-list-create") + "?expand=comments&page_size=2",
+            reverse("post-detail", args=[self.posts[0].pk]),
+            reverse("posts-by-category", args=["python"]),
+            reverse("posts-by-author", args=["async"]),
+            reverse("comment-list-create", args=[self.posts[0].pk]),
+            reverse("most-liked-posts") + "?window=week",
+            reverse("highest-rated-posts"),
+            reverse("trending-posts"),
+            reverse("post-multi-get") + f"?ids={self.posts[1].pk},{self.posts[0].pk},0",
+        ]
+        for url in urls:
+            sync_response = self.client.get(url, headers=self.auth)
+            cache.clear()
+            async_response = self.async_request("get", url, headers=self.auth)
+            self.assertEqual(async_response.status_code, 200, url)
+            self.assertEqual(async_response.json(), sync_response.json(), url)
+
+    def test_cache_and_conditional_requests(self):
+        url = reverse("post-list-create")
+        first = self.async_request("get", url)
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(self.async_request("get", url)["X-Cache"], "HIT")
+        self.assertEqual(self.async_request("get", url, headers={"If-None-Match": first["ETag"]}).status_code, 304)
+
+    def test_errors_and_writes(self):
+        self.assertEqual(self.async_request("get", reverse("post-detail", args=[0]), headers=self.auth).status_code, 404)
+        self.assertEqual(self.async_request("get", reverse("post-detail", args=[self.posts[0].pk])).status_code, 401)
+        self.assertEqual(self.async_request("get", reverse("most-liked-posts") + "?window=year").status_code, 400)
+
+        response = self.async_request(
+            "post", reverse("comment-list-create", args=[self.posts[1].pk]), data={"content": "Async"}, headers=self.auth,
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Comment.objects.filter(post=self.posts[1], content="Async").exists())
+
+    def test_share_queues_the_email(self):
+        url = reverse("post-share", args=[self.posts[0].pk])
+        response = self.async_request("post", url, data={"email": "friend@example.com"}, headers=self.auth)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(QueuedEmail.objects.get().to, "friend@example.com")
+        self.assertEqual(self.async_request("post", url, data={}, headers=self.auth).status_code, 400)
+
+
+class AuthenticationCacheTests(BlogTestCase):
+    """JWTs are authenticated without a user query per request"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(email="jwt@example.com", password="pass1234", username="jwt")
+        cls.post = Post.objects.create(title="Tokens", content="...", author=cls.author)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.author)}")
+
+    def user_queries(self, method, url, status_code, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, **kwargs)
+        self.assertEqual(response.status_code, status_code)
+        return [query["sql"] for query in queries if 'FROM "blog_customuser"' in query["sql"]]
+
+    def test_reads_are_stateless(self):
+        self.assertEqual(len(self.user_queries("get", reverse("post-detail", args=[self.post.pk]), 200)), 1)
+        self.assertEqual(self.user_queries("get", reverse("post-detail", args=[self.post.pk]), 200), [])
+        self.assertEqual(self.user_queries("get", reverse("post-multi-get"), 200, data={"ids": self.post.pk}), [])
+
+    def test_the_password_hash_is_not_cached(self):
+        self.user_queries("get", reverse("post-detail", args=[self.post.pk]), 200)
+        self.assertNotIn(self.author.password, repr(cache.get(f"{USER_PREFIX}{self.author.pk}")))
+
+    def test_writes_use_the_cached_user(self):
+        url = reverse("comment-list-create", args=[self.post.pk])
+        self.assertEqual(len(self.user_queries("post", url, 201, data={"content": "First"})), 1)
+        self.assertEqual(self.user_queries("post", url, 201, data={"content": "Second"}), [])
+
+    def test_deactivation_and_password_change_apply_immediately(self):
+        url = reverse("comment-list-create", args=[self.post.pk])
+        self.user_queries("post", url, 201, data={"content": "Cached"})
+        self.author.set_password("new-pass1234")
+        self.author.save()
+        self.assertEqual(len(self.user_queries("post", url, 201, data={"content": "Reloaded"})), 1)
+
+        self.author.is_active = False
+        self.author.save()
+        self.user_queries("post", url, 401, data={"content": "Refused"})
+        self.user_queries("get", reverse("post-detail", args=[self.post.pk]), 401)
+        cache.clear()   # Another worker, or an eviction, still finds the user inactive
+        self.user_queries("get", reverse("post-detail", args=[self.post.pk]), 401)
+        self.author.is_active = True
+        self.author.save()
+        self.user_queries("get", reverse("post-detail", args=[self.post.pk]), 200)
+
+    def test_token_carries_the_stateless_claims(self):
+        response = APIClient().post(reverse("token_obtain_pair"), {"email": "jwt@example.com", "password": "pass1234"})
+        self.assertEqual(response.status_code, 200)
+        token = AccessToken(response.data["access"])
+        self.assertEqual((token["username"], token["is_staff"]), ("jwt", False))
+
+
+class TokenRevocationTests(BlogTestCase):
+    """Rotated and blacklisted refresh tokens are refused, and expire out of the table"""
+
+    @classmethod
+    def setUpTestData(cls):
+        CustomUser.objects.create_user(email="rotate@example.com", password="pass1234", username="rotate")
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.refresh = self.client.post(
+            reverse("token_obtain_pair"), {"email": "rotate@example.com", "password": "pass1234"},
+        ).data["refresh"]
+
+    def test_rotation_revokes_the_used_token(self):
+        response = self.client.post(reverse("token_refresh"), {"refresh": self.refresh})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.post(reverse("token_refresh"), {"refresh": self.refresh}).status_code, 401)
+        # The rotated token works, once
+        self.assertEqual(self.client.post(reverse("token_refresh"), {"refresh": response.data["refresh"]}).status_code, 200)
+        self.assertEqual(RevokedToken.objects.count(), 2)
+
+    def test_blacklist_endpoint(self):
+        self.assertEqual(self.client.post(reverse("token_blacklist"), {"refresh": self.refresh}).status_code, 200)
+        self.assertEqual(self.client.post(reverse("token_refresh"), {"refresh": self.refresh}).status_code, 401)
+
+    def test_membership_is_cached_with_database_fallback(self):
+        jti, expires_at = RefreshToken(self.refresh)["jti"], timezone.now() + timedelta(days=1)
+        with self.assertNumQueries(1):
+            self.assertFalse(is_revoked(jti, expires_at))
+        with self.assertNumQueries(0):
+            self.assertFalse(is_revoked(jti, expires_at))
+
+        self.client.post(reverse("token_blacklist"), {"refresh": self.refresh})
+        with self.assertNumQueries(0):
+            self.assertTrue(is_revoked(jti, expires_at))
+        cache.delete(f"{REVOKED_PREFIX}{jti}")
+        with self.assertNumQueries(1):
+            self.assertTrue(is_revoked(jti, expires_at))
+        with self.assertNumQueries(0):
+            self.assertTrue(is_revoked(jti, expires_at))
+
+    def test_a_stale_not_revoked_answer_cannot_rotate_twice(self):
+        self.assertEqual(self.client.post(reverse("token_refresh"), {"refresh": self.refresh}).status_code, 200)
+        cache.set(f"{REVOKED_PREFIX}{RefreshToken(self.refresh)['jti']}", False)   # Another worker's cache
+        self.assertEqual(self.client.post(reverse("token_refresh"), {"refresh": self.refresh}).status_code, 401)
+
+    def test_prune_deletes_only_expired_tokens(self):
+        RevokedToken.objects.create(jti="old", expires_at=timezone.now() - timedelta(seconds=1))
+        RevokedToken.objects.create(jti="live", expires_at=timezone.now() + timedelta(days=1))
+        call_command("prune_revoked_tokens", stdout=StringIO())
+        self.assertEqual(list(RevokedToken.objects.values_list("jti", flat=True)), ["live"])
+
+
+@mock.patch.dict(api_settings.DEFAULT_THROTTLE_RATES, {"post-like": "2/min", "post-rate": "3/min", "token": "2/min"})
+class ThrottlingTests(BlogTestCase):
+    """Sliding-window limits per user or IP, and per action"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(email="limited@example.com", password="pass1234", username="limited")
+        cls.other = CustomUser.objects.create_user(email="free@example.com", password="pass1234", username="free")
+        cls.post = Post.objects.create(title="Popular", content="...", author=cls.author)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        self.url = reverse("post-detail", args=[self.post.pk])
+
+    def test_like_and_rate_have_separate_limits(self):
+        with mock.patch.object(SlidingWindowThrottle, "timer", return_value=6000.0):
+            self.assertEqual([self.client.post(self.url, {"action": "like"}).status_code for _ in range(2)], [200, 200])
+            refused = self.client.post(self.url, {"action": "like"})
+            self.assertEqual(refused.status_code, 429)
+            self.assertEqual(refused["Retry-After"], "60")
+            self.assertEqual(self.client.post(self.url, {"action": "rate", "rating": 4}).status_code, 200)
+            # Limits are per user
+            self.client.force_authenticate(self.other)
+            other_post = Post.objects.create(title="Other", content="...", author=self.other)
+            self.assertEqual(self.client.post(reverse("post-detail", args=[other_post.pk]), {"action": "like"}).status_code, 200)
+
+    def test_window_slides(self):
+        with mock.patch.object(SlidingWindowThrottle, "timer", return_value=6050.0):
+            self.client.post(self.url, {"action": "like"})
+            self.client.post(self.url, {"action": "like"})
+        # The 2 requests of the previous window weigh 2 * (1 - 15 / 60) = 1.5 a quarter window later
+        with mock.patch.object(SlidingWindowThrottle, "timer", return_value=6075.0):
+            self.assertEqual(self.client.post(self.url, {"action": "like"}).status_code, 200)
+            refused = self.client.post(self.url, {"action": "like"})
+            self.assertEqual(refused.status_code, 429)
+            # Until they weigh less than 1, half a window in
+            self.assertEqual(refused["Retry-After"], "15")
+
+    def test_anonymous_requests_are_limited_per_ip(self):
+        url = reverse("token_obtain_pair")
+        credentials = {"email": "limited@example.com", "password": "wrong"}
+        client = APIClient()
+        self.assertEqual([client.post(url, credentials).status_code for _ in range(3)], [401, 401, 429])
+        self.assertEqual(client.post(url, credentials, REMOTE_ADDR="10.0.0.2").status_code, 401)
+
+
+class PerformanceMetricsTests(BlogTestCase):
+    """Every request is measured, aggregated per view and reported in Server-Timing to who may see it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(email="timed@example.com", password="pass1234", username="timed")
+        cls.staff = CustomUser.objects.create_user(email="ops@example.com", password="pass1234", username="ops", is_staff=True)
+        cls.posts = [Post.objects.create(title=f"Post {i}", content="...", author=cls.author) for i in range(3)]
+
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        self.client = APIClient()
+        self.staff_token = ClaimsTokenObtainPairSerializer.get_token(self.staff).access_token
+
+    @override_settings(BLOG_SERVER_TIMING=True)
+    def test_server_timing_and_histograms(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("post-list-create"))
+        self.assertIn("db;dur=", response["Server-Timing"])
+        self.assertIn(f'desc="{len(queries)} queries"', response["Server-Timing"])
+        self.assertIn("serialize;dur=", response["Server-Timing"])
+
+        view = metrics.snapshot()["views"]["PostListCreateView"]
+        self.assertEqual(view["requests"], 1)
+        self.assertEqual(view["queries"]["sum"], len(queries))
+        self.assertEqual(view["response_bytes"]["sum"], len(response.content))
+        self.assertEqual(sum(view["wall_ms"]["buckets"].values()), 1)
+
+    def test_server_timing_is_only_sent_to_staff(self):
+        url = reverse("post-detail", args=[self.posts[0].pk])
+        self.assertNotIn("Server-Timing", self.client.get(url))
+        author = {"Authorization": f"Bearer {AccessToken.for_user(self.author)}"}
+        self.assertNotIn("Server-Timing", self.client.get(url, headers=author))
+        staff = {"Authorization": f"Bearer {self.staff_token}"}
+        self.assertIn("total;dur=", self.client.get(url, headers=staff)["Server-Timing"])
+        self.assertEqual(metrics.snapshot()["views"]["PostDetailView"]["requests"], 3)
+
+    def test_async_views_are_measured_too(self):
+        url = reverse("post-detail", args=[self.posts[0].pk])
+        auth = {"Authorization": f"Bearer {self.staff_token}"}
+        sync_timing = self.client.get(url, headers=auth)["Server-Timing"]
+        cache.clear()
+        with override_settings(ROOT_URLCONF=AsyncURLConf):
+            async_timing = async_to_sync(self.async_client.get)(url, headers=auth)["Server-Timing"]
+        self.assertEqual(async_timing.split('desc="')[1].split('"')[0], sync_timing.split('desc="')[1].split('"')[0])
+        self.assertEqual(metrics.snapshot()["views"]["PostDetailView"]["requests"], 2)
+
+    @override_settings(BLOG_QUERY_COUNT_THRESHOLD=1)
+    def test_requests_over_the_query_threshold_are_flagged(self):
+        with self.assertLogs("blog.performance", "WARNING"):
+            self.client.get(reverse("post-list-create"))
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot["views"]["PostListCreateView"]["flagged"], 1)
+        self.assertEqual(snapshot["flagged"][0]["path"], reverse("post-list-create"))
+
+    def test_metrics_endpoint_is_for_staff(self):
+        self.client.get(reverse("post-list-create"))
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("PostListCreateView", response.data["views"])
+        self.assertEqual(self.client.delete(reverse("metrics")).status_code, 204)
+        self.assertNotIn("PostListCreateView", self.client.get(reverse("metrics")).data["views"])
+
+
+class GenerateDataTests(BlogTestCase):
+    """The synthetic dataset is consistent and reproducible"""
+
+    def generate(self, prefix):
+        call_command(
+            "generate_data", users=20, categories=3, tags=10, posts=60, comments=150, likes=200, ratings=80,
+            prefix=prefix, stdout=StringIO(),
+        )
+        return list(Post.objects.filter(author__username__startswith=prefix).order_by("id").values_list("title", flat=True))
+
+    def test_counters_buckets_and_search_match_the_rows(self):
+        self.generate("gen")
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertGreater(Like.objects.count(), 150)   # Up to 200, skewed draws may not find that many distinct pairs
+        for post in Post.objects.all():
+            ratings = list(post.ratings.values_list("rating", flat=True))
+            self.assertEqual(post.like_count, post.likes.count())
+            self.assertEqual((post.rating_sum, post.rating_count), (sum(ratings), len(ratings)))
+        stats = PostDailyStats.objects.aggregate(likes=Sum("like_count"), ratings=Sum("rating_count"))
+        self.assertEqual(stats, {"likes": Like.objects.count(), "ratings": Rating.objects.count()})
+        self.assertTrue(CustomUser.objects.get(username="gen0").is_staff)
+        self.assertEqual(PostSearchEntry.objects.count(), 60)
+        # Spread over the past, with ids following the publication order
+        dates = list(Post.objects.order_by("id").values_list("published_date", flat=True))
+        self.assertEqual(dates, sorted(dates))
+        self.assertGreater(dates[-1] - dates[0], timedelta(days=30))
+
+    def test_categories_are_stored_lowercased(self):
+        self.generate("Mixed")
+        category = Category.objects.annotate(post_count=Count("posts")).filter(post_count__gt=0).first()
+        self.assertEqual(category.name, category.name.lower())
+        response = APIClient().get(reverse("posts-by-category", args=[category.name.upper()]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), min(category.post_count, api_settings.PAGE_SIZE))
+
+    def test_same_seed_same_data(self):
+        self.assertEqual(self.generate("one"), self.generate("two"))
+        with self.assertRaises(CommandError):
+            self.generate("one")
+
+
+class FastRepresentationTests(BlogTestCase):
+    """The compiled serializers and orjson write the same bytes as DRF's own path"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create_user(email="fast@example.com", password="pass1234", username="fäst")
+        category = Category.objects.create(name="Catégorie")
+        tag = Tag.objects.create(name="ünï   tag", slug="unit")
+        cls.post = Post.objects.create(
+            title='"Quoted"   ✓ \x01 title', content="Line\nbreak\t\\ 😀 \u2028", author=author, category=category,
+        )
+        cls.post.tags.add(tag)
+        cls.author = author
+        Post.objects.create(title="No category", content="...", author=author)
+        for i in range(3):
+            Comment.objects.create(post=cls.post, author=author, content=f"Comment {i}  ")
+
+    def fetch_both(self, url):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        fast = self.client.get(url)
+        cache.clear()
+        with mock.patch("blog.serializers.FastRepresentationMixin.fast_representation", False), \
+                mock.patch("blog.renderers.orjson", None):
+            stock = self.client.get(url)
+        self.assertEqual(fast.status_code, 200)
+        return fast.content, stock.content
+
+    def test_byte_identical(self):
+        for url in [
+            reverse("post-list-create"),
+            reverse("post-list-create") + "?expand=comments",
+            reverse("post-detail", args=[self.post.pk]),
+            reverse("comment-list-create", args=[self.post.pk]),
+        ]:
+            with self.subTest(url=url):
+                fast, stock = self.fetch_both(url)
+                self.assertEqual(fast, stock)
+                self.assertIn(b"\\u2028", fast)
+
+    def test_time_zone_is_applied(self):
+        with timezone.override("Europe/Paris"):
+            fast, stock = self.fetch_both(reverse("post-detail", args=[self.post.pk]))
+        self.assertEqual(fast, stock)
+        self.assertNotIn(b'Z"', fast)
+
+
+class ExportTests(BlogTestCase):
+    """Staff stream the blog data as NDJSON, in full or since a timestamp"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create_user(email="export@example.com", password="pass1234", username="export")
+        cls.staff = CustomUser.objects.create_user(email="analyst@example.com", password="pass1234", username="analyst", is_staff=True)
+        category = Category.objects.create(name="data")
+        tags = [Tag.objects.create(name=f"tag{i}") for i in range(2)]
+        cls.posts = [Post.objects.create(title=f"Post {i}", content="...", author=cls.author, category=category) for i in range(3)]
+        cls.posts[0].tags.set(tags)
+        Comment.objects.create(post=cls.posts[0], author=cls.author, content="Exported")
+        Like.objects.create(post=cls.posts[1], user=cls.staff)
+        Rating.objects.create(post=cls.posts[2], user=cls.staff, rating=4)
+        # Everything but the last post and its rating changed long ago
+        old = timezone.now() - timedelta(days=30)
+        Post.objects.exclude(pk=cls.posts[2].pk).update(updated=old)
+        Comment.objects.update(updated_at=old)
+        Like.objects.update(created_at=old)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def export(self, query="", **headers):
+        response = self.client.get(reverse("export") + query, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        return response
+
+    def rows(self, content):
+        return [json.loads(line) for line in content.decode().splitlines()]
+
+    def read(self, response):
+        """The content of a sync or (with BLOG_ASYNC_VIEWS) async streaming response"""
+        async def aread():
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        return async_to_sync(aread)() if response.is_async else b"".join(response.streaming_content)
+
+    def test_full_export(self):
+        header, *rows = self.rows(self.read(self.export()))
+        self.assertEqual(header["type"], "export")
+        self.assertEqual([row["type"] for row in rows], ["post"] * 3 + ["comment", "like", "rating"])
+        post = next(row for row in rows if row["id"] == self.posts[0].pk)
+        self.assertEqual(post["tags"], sorted(self.posts[0].tags.values_list("id", flat=True)))
+        self.assertEqual((post["author_username"], post["category_name"]), ("export", "data"))
+        self.assertEqual(rows[-1]["rating"], 4)
+
+    def test_incremental_export(self):
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        rows = self.rows(self.read(self.export(f"?since={since}")))[1:]
+        self.assertEqual([(row["type"], row["id"]) for row in rows], [("post", self.posts[2].pk), ("rating", Rating.objects.get().pk)])
+        rows = self.rows(self.read(self.export(f"?since={since}&types=comment,like")))
+        self.assertEqual(len(rows), 1)
+
+    def test_gzip_and_async(self):
+        plain = self.read(self.export("?types=post")).split(b"\n", 1)[1]
+        response = self.export("?types=post", accept_encoding="gzip, deflate")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(self.read(response)).split(b"\n", 1)[1], plain)
+
+        token = {"Authorization": f"Bearer {AccessToken.for_user(self.staff)}"}
+        with override_settings(ROOT_URLCONF=AsyncURLConf):
+            response = async_to_sync(self.async_client.get)(reverse("export") + "?types=post", headers=token)
+        self.assertTrue(response.is_async)
+        self.assertEqual(self.read(response).split(b"\n", 1)[1], plain)
+
+    def test_staff_only_and_validation(self):
+        self.client.force_authenticate(self.author)
+        self.assertEqual(self.client.get(reverse("export")).status_code, 403)
+        self.client.force_authenticate(self.staff)
+        self.assertEqual(self.client.get(reverse("export") + "?types=post,user").status_code, 400)
+        self.assertEqual(self.client.get(reverse("export") + "?since=yesterday").status_code, 400)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "export.ndjson.gz"
+            call_command("export_data", output=str(path), gzip=True, chunk_size=2, stderr=StringIO())
+            rows = self.rows(gzip.decompress(path.read_bytes()))[1:]
+        expected = self.rows(self.read(self.export()))[1:]
+        self.assertEqual(rows, expected)
+        with self.assertRaises(CommandError):
+            call_command("export_data", types="post,user", stderr=StringIO())
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ImportDataTests(BlogTestCase):
+    """Legacy records are bulk imported, deduplicated, and resumed after a failure"""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        CustomUser.objects.create_user(email="known@example.com", password="pass1234", username="known")
+        self.records = [
+            {"type": "user", "id": "u1", "email": "ada@Example.com", "username": "ada", "password": "secret-1"},
+            {"type": "user", "id": "u2", "email": "known@example.com", "username": "known2"},
+            {"type": "user", "id": "u3", "email": "bob@example.com", "username": "bob", "password_hash": make_password("secret-3")},
+            {"type": "user", "id": "u4", "email": "eve@example.com", "username": "known"},     # Username taken
+            {"type": "post", "id": "p1", "author": "u1", "title": "First", "content": "...", "category": "News",
+             "tags": ["Django", "Python"], "published_date": "2020-01-02T03:04:05Z"},
+            {"type": "post", "id": "p2", "author": "u3", "title": "Second", "content": "...", "category": "news", "tags": ["Django"]},
+            {"type": "post", "id": "p3", "author": "u4", "title": "Orphan", "content": "..."},
+            {"type": "comment", "id": "c1", "post": "p1", "author": "u2", "content": "Hi", "created_at": "2020-01-03T00:00:00Z"},
+            {"type": "comment", "id": "c2", "post": "p9", "author": "u2", "content": "Lost"},
+            {"type": "rating", "id": "r1"},
+        ]
+
+    def write(self, name, records):
+        path = self.directory / name
+        path.write_text("\n".join(json.dumps(record) for record in records) + "\n")
+        return path
+
+    def run_import(self, path, **options):
+        call_command("import_data", str(path), chunk_size=3, workers=0, stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_import(self):
+        path = self.write("legacy.jsonl", self.records)
+        self.run_import(path)
+        self.assertEqual(CustomUser.objects.count(), 3)
+        ada = CustomUser.objects.get(username="ada")
+        self.assertEqual(ada.email, "ada@example.com")
+        self.assertTrue(ada.check_password("secret-1"))
+        self.assertTrue(CustomUser.objects.get(username="bob").check_password("secret-3"))
+
+        first, second = Post.objects.order_by("id")
+        self.assertEqual(list(Category.objects.values_list("name", flat=True)), ["news"])
+        self.assertEqual(first.category_id, second.category_id)
+        self.assertEqual(sorted(first.tags.values_list("slug", flat=True)), ["django", "python"])
+        self.assertEqual(Tag.objects.count(), 2)
+        self.assertEqual(first.published_date.year, 2020)
+        self.assertEqual(PostSearchEntry.objects.count(), 2)
+        comment = Comment.objects.get()
+        self.assertEqual((comment.post, comment.author.username, comment.created_at.day), (first, "known", 3))
+        self.assertEqual(ImportCheckpoint.objects.get(file=str(path.resolve())).position, len(self.records))
+
+        # Rerunning resumes at the end, restarting finds every record imported already
+        self.run_import(self.write("legacy.jsonl", self.records), restart=True)
+        self.assertEqual((Post.objects.count(), Comment.objects.count(), ImportedRecord.objects.count()), (2, 1, 6))
+
+    def test_resume_after_a_failure(self):
+        path = self.write("legacy.jsonl", self.records)
+        with mock.patch("blog.management.commands.import_data.Command.write_comments", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.run_import(path)
+        self.assertEqual(ImportCheckpoint.objects.get().position, 6)    # Up to the chunk with the first comment
+        self.assertEqual(Comment.objects.count(), 0)
+        self.run_import(path)
+        self.assertEqual((Post.objects.count(), Comment.objects.count()), (2, 1))
+
+    def test_files_of_the_same_name_keep_their_own_checkpoint(self):
+        path = self.write("legacy.jsonl", self.records)
+        with mock.patch("blog.management.commands.import_data.Command.write_comments", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.run_import(path)
+        (self.directory / "other").mkdir()
+        self.directory = self.directory / "other"
+        other = self.write("legacy.jsonl", self.records[:4] + [{**self.records[4], "id": "p4", "title": "Elsewhere"}])
+        self.run_import(other)
+        self.assertTrue(Post.objects.filter(title="Elsewhere").exists())
+        self.assertEqual(ImportCheckpoint.objects.get(file=str(path.resolve())).position, 6)
+
+    def test_tags_whose_slugs_collide_stay_apart(self):
+        Tag.objects.create(name="c")
+        self.run_import(self.write("legacy.jsonl", [
+            self.records[0],
+            {"type": "post", "id": "p1", "author": "u1", "title": "Languages", "content": "...", "tags": ["C", "C++"]},
+        ]))
+        self.assertEqual(dict(Tag.objects.values_list("name", "slug")), {"c": "c", "C": "c-2", "C++": "c-3"})
+        self.assertEqual(sorted(Post.objects.get().tags.values_list("name", flat=True)), ["C", "C++"])
+
+    def test_explicit_timestamps_leave_other_saves_alone(self):
+        author = CustomUser.objects.get(username="known")
+        old = timezone.now() - timedelta(days=365)
+        posts = [Post(title="Old", content="...", author=author, published_date=old, updated=old)]
+        with explicit_timestamps(posts, "published_date", "updated"):
+            Post.objects.bulk_create(posts)
+            other = Post.objects.create(title="New", content="...", author=author)
+        self.assertEqual(Post.objects.values_list("published_date", "updated").get(pk=posts[0].pk), (old, old))
+        self.assertEqual(posts[0].published_date, old)
+        self.assertGreater(other.published_date, old + timedelta(days=1))
+
+    def test_csv_and_password_pool(self):
+        users = self.directory / "users.csv"
+        users.write_text("id,email,username,password\nu1,ada@example.com,ada,secret-1\nu2,bob@example.com,bob,secret-2\n")
+        posts = self.directory / "posts.csv"
+        posts.write_text("id,author,title,content,tags\np1,u2,Hello,...,one|two\n")
+        call_command("import_data", str(users), type="user", source="legacy", workers=2, stdout=StringIO(), stderr=StringIO())
+        self.run_import(posts, type="post", source="legacy")
+        self.assertTrue(CustomUser.objects.get(username="bob").check_password("secret-2"))
+        self.assertEqual(sorted(Post.objects.get().tags.values_list("name", flat=True)), ["one", "two"])
+
+
+class FeedTests(BlogTestCase):
+    """Follows, fan-out on write and on read, and the keyset paginated feed"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = CustomUser.objects.create_user(email="reader@example.com", password="pass1234", username="reader")
+        cls.author = CustomUser.objects.create_user(email="writer@example.com", password="pass1234", username="writer")
+        cls.other = CustomUser.objects.create_user(email="other@example.com", password="pass1234", username="other")
+        cls.category = Category.objects.create(name="python")
+        cls.tag = Tag.objects.create(name="Django")
+        cls.old = Post.objects.create(title="Before following", content="...", author=cls.author)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def follow(self, **target):
+        response = self.client.post(reverse("follow-list-create"), target, format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data["id"]
+
+    def feed(self, url=None):
+        """Ids of the whole feed, following the next links"""
+        url, ids = url or reverse("feed") + "?page_size=2", []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [post["id"] for post in response.data["results"]]
+            url = response.data["next"]
+        return ids
+
+    def test_follow_validation(self):
+        url = reverse("follow-list-create")
+        self.assertEqual(self.client.post(url, {}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(url, {"author": "writer", "tag": self.tag.pk}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(url, {"author": "reader"}, format="json").status_code, 400)
+        self.follow(author="writer")
+        self.follow(category="Python")
+        self.assertEqual(self.client.post(url, {"author": "writer"}, format="json").status_code, 400)
+        self.assertEqual([row["author"] or row["category"] for row in self.client.get(url).data["results"]], ["python", "writer"])
+
+    def test_posts_fan_out_to_followers(self):
+        self.follow(author="writer")
+        self.follow(tag=self.tag.pk)
+        self.assertEqual(self.feed(), [self.old.pk])    # Backfilled
+
+        by_author = Post.objects.create(title="Followed author", content="...", author=self.author)
+        unrelated = Post.objects.create(title="Not followed", content="...", author=self.other)
+        tagged = Post.objects.create(title="Tagged later", content="...", author=self.other)
+        tagged.tags.add(self.tag)
+        bulk = Post.objects.bulk_create_with_tags([Post(title="Bulk", content="...", author=self.other)], [[self.tag.pk]])
+
+        self.assertEqual(self.feed(), [bulk[0].pk, tagged.pk, by_author.pk, self.old.pk])
+        self.assertNotIn(unrelated.pk, self.feed())
+        self.assertFalse(FeedEntry.objects.filter(user=self.other).exists())
+
+    @override_settings(BLOG_FEED_FAN_OUT_LIMIT=1)
+    def test_crowded_authors_fan_out_on_read(self):
+        self.follow(category="python")
+        for user in (self.reader, self.other):
+            Follow.objects.create(user=user, author=self.author)
+        self.author.refresh_from_db()
+        self.assertTrue(self.author.fan_out_on_read)
+
+        posts = []
+        for i in range(5):
+            # Alternate between a pushed (category) and a pulled (author) post
+            posts.append(Post.objects.create(title=f"Post {i}", content="...", author=self.other if i % 2 else self.author,
+                                             category=self.category if i % 2 else None))
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(), 3)    # The backfill and two category posts
+        ids = self.feed()
+        self.assertEqual(ids, [post.pk for post in reversed(posts)] + [self.old.pk])
+
+        # Previous links walk back over both sources too
+        first = self.client.get(reverse("feed") + "?page_size=3").data
+        second = self.client.get(first["next"]).data
+        back = self.client.get(second["previous"]).data
+        self.assertEqual([post["id"] for post in back["results"]], ids[:3])
+
+    def test_unfollow_keeps_posts_of_other_follows(self):
+        author_follow = self.follow(author="writer")
+        self.follow(category="python")
+        in_category = Post.objects.create(title="Both", content="...", author=self.author, category=self.category)
+        self.assertEqual(self.feed(), [in_category.pk, self.old.pk])
+
+        response = self.client.delete(reverse("follow-destroy", args=[author_follow]))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.feed(), [in_category.pk])
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.delete(reverse("follow-destroy", args=[author_follow])).status_code, 404)
+
+    def test_async_feed_matches(self):
+        self.follow(author="writer")
+        Post.objects.create(title="New", content="...", author=self.author)
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(self.reader)}"}
+        url = reverse("feed") + "?page_size=1"
+        with override_settings(ROOT_URLCONF=AsyncURLConf):
+            response = async_to_sync(self.async_client.get)(url, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), json.loads(self.client.get(url).content))
@@ -0,0 +1,97 @@
+"""
+Sliding-window rate limits, kept in the cache so every worker process shares them
+(as long as CACHE_URL points at a shared backend, like for the response cache).
+
+DRF's own rate throttles store the timestamp of every request in the window and
+rewrite the whole list on each request. Here a window is two counters, the current
+fixed window and the previous one, and the previous count is weighted by how much
+of it still overlaps the sliding window. That costs two cache operations per
+request whatever the rate, at the price of assuming the previous window's requests
+were evenly spread.
+
+Rates are read from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] per scope, and a scope
+without a rate isn't limited. A refused request gets a 429 with Retry-After.
+"""
+
+import math
+import time
+
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle, SimpleRateThrottle
+
+PREFIX = "blog:throttle:"
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """Base throttle: subclasses pick the scope of a request"""
+
+    timer = time.time
+    parse_rate = SimpleRateThrottle.parse_rate
+
+    def get_scope(self, request, view):
+        raise NotImplementedError
+
+    def get_ident(self, request):
+        """The user for authenticated requests, their IP otherwise"""
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return f"ip:{super().get_ident(request)}"
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request, view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) if scope else None
+        if rate is None:
+            return True
+        limit, duration = self.parse_rate(rate)
+
+        now = self.timer()
+        window, elapsed = divmod(now, duration)
+        key = f"{PREFIX}{scope}:{self.get_ident(request)}:"
+        counts = cache.get_many([f"{key}{window - 1:.0f}", f"{key}{window:.0f}"])
+        previous = counts.get(f"{key}{window - 1:.0f}", 0)
+        current = counts.get(f"{key}{window:.0f}", 0)
+        overlap = 1 - elapsed / duration
+
+        if previous * overlap + current >= limit:
+            self.retry_after = self.time_until_allowed(limit, duration, elapsed, previous, current)
+            return False
+        # Counters outlive their window by one window, while they weigh in as the previous one
+        if not cache.add(f"{key}{window:.0f}", 1, 2 * duration):
+            try:
+                cache.incr(f"{key}{window:.0f}")
+            except ValueError:
+                pass    # Expired in between, let this request go uncounted
+        return True
+
+    def time_until_allowed(self, limit, duration, elapsed, previous, current):
+        """Seconds until the estimate drops below the limit, if no other request comes in"""
+        if current < limit:
+            # Within this window, once enough of the previous one slid out
+            return (1 - (limit - current) / previous) * duration - elapsed
+        # This window becomes the previous one, and has to slide out far enough
+        return duration - elapsed + (1 - limit / current) * duration
+
+    def wait(self):
+        return max(math.ceil(self.retry_after), 1)
+
+
+class UserRateThrottle(SlidingWindowThrottle):
+    """Overall limit of every user ("user" scope) and anonymous IP ("anon" scope)"""
+
+    def get_scope(self, request, view):
+        return "user" if request.user and request.user.is_authenticated else "anon"
+
+
+class ActionRateThrottle(SlidingWindowThrottle):
+    """
+    Limit of expensive actions, named by the view's `throttle_scope`. Views that
+    multiplex actions on POST name a scope per action in `throttle_action_scopes`,
+    keyed by the `action` field of the request body.
+    """
+
+    def get_scope(self, request, view):
+        action_scopes = getattr(view, "throttle_action_scopes", None)
+        if action_scopes and request.method == "POST":
+            return action_scopes.get(request.data.get("action"))
+        return getattr(view, "throttle_scope", None)
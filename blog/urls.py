@@ -1,17 +1,42 @@
+from django.conf import settings
 from django.urls import path, include
-from . import views
-
-urlpatterns = [
-    path("posts/", views.PostListCreateView.as_view(), name="post-list-create"),
-    path("posts/<int:pk>/", views.PostDetailView.as_view(), name="post-detail"),
-    path("posts/category/<str:category_name>/", views.PostsByCategory.as_view(), name="posts-by-category"),
-    path("posts/author/<str:username>/", views.PostsByAuthorView.as_view(), name="posts-by-author"),
-    path("posts/<int:post_id>/comments/", views.CommentListCreateView.as_view(), name="comment-list-create"),
-
-    # Endpoints for most liked and highest rated posts
-    path("posts/most-liked/", views.MostLikedPostsView.as_view(), name="most-liked-posts"),
-    path("posts/highest-rated/", views.HighestRatedPostsView.as_view(), name="highest-rated-posts"),
-
-    # Endpoints for sharing post
-    path("posts/<int:post_id>/share/", views.PostShareView.as_view(), name="post-share"),
-]
\ No newline at end of file
+from . import async_views, views as sync_views
+
+
+def blog_urlpatterns(views):
+    """The blog routes served by `views`, the sync or the async module"""
+    return [
+        path("posts/", views.PostListCreateView.as_view(), name="post-list-create"),
+        path("posts/<int:pk>/", views.PostDetailView.as_view(), name="post-detail"),
+        path("posts/multi/", views.PostMultiGetView.as_view(), name="post-multi-get"),
+        path("posts/category/<str:category_name>/", views.PostsByCategory.as_view(), name="posts-by-category"),
+        path("posts/author/<str:username>/", views.PostsByAuthorView.as_view(), name="posts-by-author"),
+        path("posts/<int:post_id>/comments/", views.CommentListCreateView.as_view(), name="comment-list-create"),
+
+        # Endpoints for most liked, highest rated and trending posts
+        path("posts/most-liked/", views.MostLikedPostsView.as_view(), name="most-liked-posts"),
+        path("posts/highest-rated/", views.HighestRatedPostsView.as_view(), name="highest-rated-posts"),
+        path("posts/trending/", views.TrendingPostsView.as_view(), name="trending-posts"),
+
+        # Endpoints for batch writes
+        path("posts/bulk/", views.PostBulkCreateView.as_view(), name="post-bulk-create"),
+        path("posts/bulk/tags/", views.PostBulkTagView.as_view(), name="post-bulk-tags"),
+
+        # Endpoints for sharing post
+        path("posts/<int:post_id>/share/", views.PostShareView.as_view(), name="post-share"),
+
+        # Follows and the feed of the followed authors, tags and categories
+        path("follows/", views.FollowListCreateView.as_view(), name="follow-list-create"),
+        path("follows/<int:pk>/", views.FollowDestroyView.as_view(), name="follow-destroy"),
+        path("feed/", views.FeedView.as_view(), name="feed"),
+
+        # Request metrics of the serving process, for staff
+        path("metrics/", views.MetricsView.as_view(), name="metrics"),
+
+        # Streaming NDJSON export of the blog data, for staff
+        path("export/", views.ExportView.as_view(), name="export"),
+    ]
+
+
+# The async views run natively under ASGI, BLOG_ASYNC_VIEWS turns them on
+urlpatterns = blog_urlpatterns(async_views if settings.BLOG_ASYNC_VIEWS else sync_views)
@@ -1,27 +1,81 @@
-from rest_framework import generics, permissions, filters, status
+from rest_framework import generics, permissions, filters, serializers, status, views
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.response import Response
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework_simplejwt import views as jwt_views
 from .models import *
 from .serializers import *
 from .permissions import IsOwnerOrReadOnly
-from django.db.models import Count, Avg
-from django.core.mail import send_mail
-
-class PostListCreateView(generics.ListCreateAPIView):
+from .search import FullTextSearchFilter
+from .cache import CachedResponseMixin, scope_versions, stats as cache_stats, version_time
+from .conditional import ConditionalGetMixin, make_etag
+from .pagination import FeedPagination
+from django.utils import timezone
+from datetime import timedelta
+from .mail import enqueue_email
+from . import metrics
+from .export import encode, export_rows, parse_since, parse_types
+from .renderers import NDJSONRenderer
+from django.db import router
+from django.shortcuts import get_object_or_404
+from django.http import StreamingHttpResponse
+from django.middleware.gzip import re_accepts_gzip
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from rest_framework.settings import api_settings
+
+def post_detail_data(post):
+    """Representation of a post in PostDetailView and PostMultiGetView"""
+    return {
+        "post": PostSerializer(post).data,
+        "total_likes": post.like_count,
+        "average_rating": post.average_rating   # Annotated from the rating counters
+    }
+
+
+class PostListMixin:
+    """
+    Shared read path of the post list endpoints. Posts are listed with a
+    comment count, `?expand=comments` adds a preview of the latest comments,
+    the full thread lives under CommentListCreateView.
+    """
+
+    comment_preview_size = 3
+    stateless_authentication = True   # Reads only need the token, see blog/authentication.py
+
+    def expand_comments(self):
+        return "comments" in self.request.query_params.get("expand", "").split(",")
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["expand_comments"] = self.expand_comments()
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        preview_size = self.comment_preview_size if self.expand_comments() else None
+        return queryset.with_comment_summary(preview_size)
+
+
+class PostListCreateView(CachedResponseMixin, PostListMixin, generics.ListCreateAPIView):
     """View to list all posts or create a new post"""
 
-    queryset = Post.objects.all().order_by("-published_date")
-    serializer_class = PostSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    queryset = Post.objects.with_related().order_by("-published_date")
+    serializer_class = PostListSerializer
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ["category", "tags", "published_date"]   # Allow filtering by these fields
-    search_fields = ["title", "content", "tags__name", "author__username"]  # Allow searching by these fields
+    # ?search= matches title, content, tag names and author username through the search backend
     ordering_fields = ["published_date", "title"]
+    ordering = ["-published_date"]
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    def get_cache_scopes(self):
+        return ["posts"]
+
     def get_serializer_class(self):
         if self.request.method == "POST":
             return PostCreateUpdateSerializer
-        return PostSerializer
+        return PostListSerializer
     
     def perform_create(self, serializer):
         """Set the author of the post to the currently authenticated user"""
@@ -36,12 +90,14 @@ class PostListCreateView(generics.ListCreateAPIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
 
-class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
+class PostDetailView(CachedResponseMixin, generics.RetrieveUpdateDestroyAPIView):
     """View to retrieve, update, or delete a single post with actions for liking and rating"""
     
-    queryset = Post.objects.all()
+    queryset = Post.objects.with_related().with_comments().with_average_rating()
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
+    stateless_authentication = True
+    throttle_action_scopes = {"like": "post-like", "rate": "post-rate"}    # See blog/throttling.py
 
     def update(self, request, *args, **kwargs):
         """Handle PUT request"""
@@ -58,91 +114,186 @@ class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
         self.perform_destroy(instance)
         return Response(status=status.HTTP_204_NO_CONTENT)
     
+    def get_cache_scopes(self):
+        return [f"post:{self.kwargs['pk']}"]
+
+    validator_fields = ["updated", "last_activity", "like_count", "rating_sum", "rating_count"]
+    rating_field = serializers.IntegerField(min_value=1, max_value=5)     # Rejects "abc" and 3.7 alike
+
+    def get_validators(self):
+        """Exact validators from the post row alone, the same in every worker process"""
+        row = Post.objects.filter(pk=self.kwargs["pk"]).values_list(*self.validator_fields).first()
+        return self.validators_from_row(row, scope_versions(["global"]) if row else None)
+
+    def validators_from_row(self, row, global_versions):
+        if row is None:
+            return None, None
+        # The global scope token covers tag, category and username renames, in both validators
+        etag = make_etag("post", self.kwargs["pk"], *row, *global_versions, self.representation_format())
+        return etag, max(row[0], row[1], *map(version_time, global_versions))
+
     def get(self, request, *args, **kwargs):
         """Retrieve a single post along with total likes and average rating"""
+        return self.cached_response(request, self.build_detail_response)
+
+    def build_detail_response(self):
         post = self.get_object()
-        post_data = {
-            "post": PostSerializer(post).data,
-            "total_likes": post.likes.count(),
-            "average_rating": post.ratings.aggregate(Avg("rating"))["rating__avg"] or 0  # Calculate average rating
-        }
-        return Response(post_data, status=status.HTTP_200_OK)
+        return Response(post_detail_data(post), status=status.HTTP_200_OK)
     
     def post(self, request, *args, **kwargs):
         """Handle actions: like or rate a post"""
         post = self.get_object()
         action = request.data.get("action")
 
+        # Single-statement, race-free writes that keep the post counters exact, see EngagementManager
         if action == "like":
-            # Check if the user has already liked the post
-            existing_like = Like.objects.filter(post=post, user = request.user)
-            if existing_like.exists():
-                # If the user has already liked the post, unlike it
-                existing_like.delete()
-                return Response({"detail": "Post unliked successfully!"}, status=status.HTTP_200_OK)
-            else:
-                # Otherwise, add a like
-                Like.objects.create(post=post, user = request.user)
+            if Like.objects.toggle(post, request.user):
                 return Response({"detail": "Post liked successfully!"}, status=status.HTTP_200_OK)
+            return Response({"detail": "Post unliked successfully!"}, status=status.HTTP_200_OK)
 
         elif action == "rate":
             # Validate and update or create a rating for the post
-            rating_value = request.data.get("rating")
-            if not rating_value or not (1 <= int(rating_value) <= 5):
+            try:
+                rating_value = self.rating_field.run_validation(request.data.get("rating"))
+            except serializers.ValidationError:
                 return Response({"detail": "Invalid rating value. Must be between 1 and 5."}, status=status.HTTP_400_BAD_REQUEST)
-            rating, created = Rating.objects.update_or_create(
-                post=post, user=request.user,
-                defaults={"rating": rating_value}   # Update or set the rating value
-            )
+            Rating.objects.rate(post, request.user, rating_value)
             return Response({"detail": "Post rated successfully!"}, status=status.HTTP_200_OK)
         
         return Response({"detail": "Invalid action. Use 'like' or 'rate'."}, status=status.HTTP_400_BAD_REQUEST)
 
 
-class PostsByCategory(generics.ListAPIView):
+class PostBulkCreateView(generics.CreateAPIView):
+    """View to create a batch of posts (a JSON list) in a few queries"""
+
+    serializer_class = PostBulkCreateSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    max_batch_size = 500
+
+    def create(self, request, *args, **kwargs):
+        """Handle POST request"""
+        serializer = self.get_serializer(data=request.data, many=True, max_length=self.max_batch_size)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(author=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class PostBulkTagView(generics.GenericAPIView):
+    """View to attach tags to, or detach them from, many of your posts at once"""
+
+    serializer_class = PostBulkTagSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        posts = Post.objects.filter(pk__in=serializer.validated_data["posts"])
+        if posts.exclude(author=request.user).exists():
+            raise PermissionDenied("You can only change the tags of your own posts.")
+
+        tag_ids = serializer.validated_data["tags"]
+        if serializer.validated_data["action"] == "add":
+            posts.add_tags(tag_ids)
+        else:
+            posts.remove_tags(tag_ids)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class PostMultiGetView(CachedResponseMixin, generics.GenericAPIView):
+    """View to retrieve many posts at once with `?ids=1,2,3`, in a fixed number of queries"""
+
+    queryset = Post.objects.with_related().with_comments().with_average_rating()
+    permission_classes = [permissions.IsAuthenticated]
+    stateless_authentication = True
+    max_ids = 100
+
+    def get_ids(self):
+        """Requested ids in order, without duplicates"""
+        try:
+            ids = [int(pk) for pk in self.request.query_params.get("ids", "").split(",") if pk.strip()]
+        except ValueError:
+            raise ValidationError({"ids": "Must be a comma separated list of post ids."})
+        if not ids or len(ids) > self.max_ids:
+            raise ValidationError({"ids": f"Give between 1 and {self.max_ids} post ids."})
+        return list(dict.fromkeys(ids))
+
+    def get_cache_scopes(self):
+        return [f"post:{pk}" for pk in self.get_ids()]
+
+    def get(self, request, *args, **kwargs):
+        """Retrieve the posts as the post detail view shows them, plus the ids that don't exist"""
+        return self.cached_response(request, self.build_response)
+
+    def build_response(self):
+        ids = self.get_ids()
+        return self.multi_get_response(ids, self.get_queryset().in_bulk(ids))
+
+    def multi_get_response(self, ids, posts):
+        data = {
+            "results": [post_detail_data(posts[pk]) for pk in ids if pk in posts],
+            "missing": [pk for pk in ids if pk not in posts],
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class PostsByCategory(CachedResponseMixin, PostListMixin, generics.ListAPIView):
     """View to list all posts in a specific category"""
-    
-    serializer_class = PostSerializer
+
+    serializer_class = PostListSerializer
+
+    def get_cache_scopes(self):
+        return [f"category:{self.kwargs['category_name'].lower()}"]
 
     def get_queryset(self):
         """Filter posts by the category specified in the URL"""
         category_name = self.kwargs.get("category_name")
-        return Post.objects.filter(category__name__iexact=category_name)
-    
-    def list(self, request, *args, **kwargs):
-        """Handle GET request"""
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # Category.save() stores names lowercased, so an exact match can use the unique index
+        return Post.objects.with_related().filter(category__name=category_name.lower())
 
 
-class PostsByAuthorView(generics.ListAPIView):
+class PostsByAuthorView(CachedResponseMixin, PostListMixin, generics.ListAPIView):
     """View to list all posts by a specific author"""
-    
-    serializer_class = PostSerializer
+
+    serializer_class = PostListSerializer
+
+    def get_cache_scopes(self):
+        return [f"author:{self.kwargs['username']}"]
 
     def get_queryset(self):
         """Filter posts by the author specified in the URL"""
         author_username = self.kwargs.get("username")
-        return Post.objects.filter(author__username=author_username)
-    
-    def list(self, request, *args, **kwargs):
-        """Handle GET request"""
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return Post.objects.with_related().filter(author__username=author_username)
 
 
-class CommentListCreateView(generics.ListCreateAPIView):
+class CommentListCreateView(ConditionalGetMixin, generics.ListCreateAPIView):
     """View to list or create comments for a specific post"""
     
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    ordering = ["created_at"]   # Oldest first, so a thread reads top to bottom
+    stateless_authentication = True
 
     def get_queryset(self):
         """Filter comments by the post specified in the URL"""
         post_id = self.kwargs.get("post_id")
-        return Comment.objects.filter(post_id=post_id)
+        return Comment.objects.select_related("author").filter(post_id=post_id)
+
+    def get_validators(self):
+        """Every comment write touches the post's last_activity"""
+        last_activity = Post.objects.filter(pk=self.kwargs["post_id"]).values_list("last_activity", flat=True).first()
+        return self.validators_from_last_activity(last_activity, scope_versions(["global"]) if last_activity else None)
+
+    def validators_from_last_activity(self, last_activity, global_versions):
+        if last_activity is None:
+            return None, None
+        etag = make_etag(
+            "comments", self.request.get_full_path(), last_activity, *global_versions, self.representation_format(),
+        )
+        return etag, max(last_activity, *map(version_time, global_versions))
+
+    def list(self, request, *args, **kwargs):
+        """Handle GET request"""
+        return self.conditional_response(request, lambda: super(CommentListCreateView, self).list(request, *args, **kwargs))
     
     def perform_create(self, serializer):
         """Associate the comment with the post and the current user"""
@@ -158,44 +309,222 @@ class CommentListCreateView(generics.ListCreateAPIView):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class MostLikedPostsView(generics.ListAPIView):
+class LeaderboardMixin(CachedResponseMixin, PostListMixin):
+    """
+    Shared behaviour of the leaderboards: `?window=day|week|all` (default all).
+    All-time rankings walk an index on the Post counter columns, windowed ones
+    aggregate the PostDailyStats buckets of the last day or seven days.
+    """
+
+    windows = {"day": 1, "week": 7, "all": None}  # Window length in daily buckets
+    all_time_ordering = None
+    window_ordering = None
+
+    def get_cache_scopes(self):
+        return ["leaderboard"]
+
+    def get_window(self):
+        window = self.request.query_params.get("window", "all")
+        if window not in self.windows:
+            raise ValidationError({"window": f"Must be one of: {', '.join(self.windows)}."})
+        return self.windows[window]
+
+    @property
+    def ordering(self):
+        """Sort key used by the keyset paginator, depends on the requested window"""
+        return self.all_time_ordering if self.get_window() is None else self.window_ordering
+
+    def get_queryset(self):
+        queryset = Post.objects.with_related()
+        days = self.get_window()
+        if days is None:
+            return queryset
+        return queryset.with_window_stats(since=timezone.localdate() - timedelta(days=days - 1))
+
+
+class MostLikedPostsView(LeaderboardMixin, generics.ListAPIView):
     """View to list most liked posts"""
 
-    serializer_class = PostSerializer
+    serializer_class = PostListSerializer
+    all_time_ordering = ["-like_count"]
+    window_ordering = ["-window_like_count"]
 
     def get_queryset(self):
-        """Annotate posts with like counts and order by the highest like count"""
-        most_liked = Post.objects.annotate(like_count=Count("likes")).order_by("-like_count")
+        """Order posts by their like counter (or likes within the window), highest first"""
+        most_liked = super().get_queryset().order_by(*self.ordering)
         return most_liked
     
 
-class HighestRatedPostsView(generics.ListAPIView):
-    """View to list highest rated posts"""
+class HighestRatedPostsView(LeaderboardMixin, generics.ListAPIView):
+    """View to list highest rated posts, ranked by their Bayesian weighted rating"""
 
-    serializer_class = PostSerializer
+    serializer_class = PostListSerializer
+    all_time_ordering = ["-rating_score"]
+    window_ordering = ["-window_rating_score"]
 
     def get_queryset(self):
-        """Annotate posts with average ratings and order by the highest average rating"""
-        highest_rated_post = Post.objects.annotate(average_rating=Avg("ratings__rating")).order_by("-average_rating")
+        """Order rated posts by their weighted rating (or the one of ratings within the window), highest first"""
+        queryset = super().get_queryset()
+        if self.get_window() is None:
+            queryset = queryset.filter(rating_count__gt=0)
+        else:
+            queryset = queryset.filter(window_rating_count__gt=0)
+        highest_rated_post = queryset.order_by(*self.ordering)
         return highest_rated_post
     
 
+class TrendingPostsView(CachedResponseMixin, PostListMixin, generics.ListAPIView):
+    """
+    View to list trending posts: likes, comments and ratings of the last days
+    decayed by the age of the post, see trending_decay(). The scores are kept
+    up to date by the engagement actions and the `refresh_trending` command,
+    so a page is a range scan of the trending_score index.
+    """
+
+    serializer_class = PostListSerializer
+    ordering = ["-trending_score"]
+
+    def get_cache_scopes(self):
+        return ["leaderboard"]
+
+    def get_queryset(self):
+        """Posts with a positive trending score, highest first"""
+        return Post.objects.with_related().filter(trending_score__gt=0).order_by(*self.ordering)
+
+
 class PostShareView(generics.GenericAPIView):
     """View to share a post via email."""
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = "post-share"
 
     def post(self, request, *args, **kwargs):
         post_id = self.kwargs["post_id"]
-        post = Post.objects.get(id=post_id)
+        post = get_object_or_404(Post, id=post_id)
         recipient_email = request.data.get("email") # Expecting email from the request body
 
         if not recipient_email:
             return Response({"detail": "Email is required to share the post."}, status=status.HTTP_400_BAD_REQUEST)
 
+        # Sent by the send_queued_emails worker, a slow SMTP server doesn't hold up the request
+        enqueue_email(*self.compose(post), settings.DEFAULT_FROM_EMAIL, recipient_email)
+
+        return Response({"detail": "Post will be shared shortly!"}, status=status.HTTP_202_ACCEPTED)
+
+    def compose(self, post):
+        """Subject and body of the share email"""
         subject = f"Check out this post: {post.title}"
         message = f"Hello,\n\nI wanted to share this interesting post with you:\n\nTitle: {post.title}\n\n{post.content}\n\nBest regards,"
-        from_email = settings.DEFAULT_FROM_EMAIL
+        return subject, message
+
+
+class FollowListCreateView(generics.ListCreateAPIView):
+    """View to list the authors, tags and categories you follow, or follow one"""
+
+    serializer_class = FollowSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    ordering = ["-created_at"]  # Latest follows first
+    stateless_authentication = True
+
+    def get_queryset(self):
+        return Follow.objects.select_related("author", "tag", "category").filter(user_id=self.request.user.id)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+class FollowDestroyView(generics.DestroyAPIView):
+    """View to unfollow, the unfollowed posts leave your feed"""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Follow.objects.filter(user=self.request.user)
+
+
+class FeedView(PostListMixin, generics.ListAPIView):
+    """
+    View to list the posts of the authors, tags and categories you follow,
+    newest first. Most come from your FeedEntry rows, written when the posts were
+    published; the posts of the followed authors with fan_out_on_read are read
+    from the posts table at request time. FeedPagination merges both.
+    """
 
-        send_mail(subject, message, from_email, [recipient_email])
+    serializer_class = PostListSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FeedPagination
+    ordering = ["-published_date"]
+
+    def get_queryset(self):
+        return Post.objects.with_related()
+
+    def get_feed_sources(self):
+        """(queryset, {sort key: column}) of each source of the feed's posts, see FeedPagination"""
+        user_id = self.request.user.id
+        return [
+            (FeedEntry.objects.filter(user_id=user_id), {"published_date": "published_date", "id": "post_id"}),
+            (Post.objects.filter(author__in=Follow.objects.pulled_authors(user_id)), {"published_date": "published_date", "id": "id"}),
+        ]
 
-        return Response({"detail": "Post shared successfully!"}, status=status.HTTP_200_OK)
+
+class MetricsView(views.APIView):
+    """View to read (or reset, with DELETE) the request metrics of this worker process, for staff"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response({**metrics.snapshot(), "response_cache": cache_stats()}, status=status.HTTP_200_OK)
+
+    def delete(self, request, *args, **kwargs):
+        metrics.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ExportView(views.APIView):
+    """
+    View streaming posts, comments, likes and ratings as NDJSON, for staff, see
+    blog/export.py. `?types=post,comment` picks the row types, `?since=` (an ISO
+    8601 datetime) only exports the rows changed since then, and the stream is
+    gzipped on the fly for clients accepting it.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    renderer_classes = [NDJSONRenderer, *api_settings.DEFAULT_RENDERER_CLASSES]
+
+    def get(self, request, *args, **kwargs):
+        return self.streaming_response(*self.get_content(request))
+
+    def get_rows(self, request):
+        try:
+            types = parse_types(request.query_params.get("types"))
+        except ValueError as error:
+            raise ValidationError({"types": str(error)})
+        since = request.query_params.get("since")
+        try:
+            # A bare + in a query string reads as a space
+            since = parse_since(since.replace(" ", "+")) if since is not None else None
+        except ValueError as error:
+            raise ValidationError({"since": str(error)})
+        # The stream outlives the request routing, so it keeps the database picked for it
+        return export_rows(types, since, using=router.db_for_read(Post))
+
+    def get_content(self, request):
+        """The NDJSON chunks of the export, gzipped for clients accepting it, and whether they are"""
+        content = encode(self.get_rows(request))
+        if re_accepts_gzip.search(request.META.get("HTTP_ACCEPT_ENCODING", "")):
+            return compress_sequence(content), True
+        return content, False
+
+    def streaming_response(self, content, compressed):
+        response = StreamingHttpResponse(content, content_type=NDJSONRenderer.media_type)
+        if compressed:
+            response["Content-Encoding"] = "gzip"
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response
+
+
+class TokenObtainPairView(jwt_views.TokenObtainPairView):
+    """Obtain a JWT pair, rate limited per IP against password guessing"""
+    throttle_scope = "token"
+
+
+class TokenRefreshView(jwt_views.TokenRefreshView):
+    """Rotate a refresh token, rate limited like obtaining one"""
+    throttle_scope = "token"
@@ -49,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'blog.middleware.PerformanceMiddleware',    # First, so it times the others too
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'blog.middleware.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'blogging_platform.urls'
@@ -89,6 +91,70 @@ DATABASES = {
     }
 }
 
+# Aliases the blog views may read from, see blog/routers.py
+DATABASE_REPLICAS = []
+
+# DATABASE_PROFILE=sqlite-production tunes SQLite for a multi-threaded server:
+# WAL so readers never wait for the writer, persistent connections, and a
+# query-only `reader` alias on the same file used as a replica.
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',        # Durable across app crashes, fsync only at checkpoints
+    'PRAGMA busy_timeout=5000',         # Wait up to 5 s for the write lock instead of failing
+    'PRAGMA cache_size=-20000',         # 20 MB page cache per connection
+    'PRAGMA mmap_size=268435456',       # Read through a 256 MB memory map
+    'PRAGMA temp_store=MEMORY',
+]
+
+if env('DATABASE_PROFILE', default='default') == 'sqlite-production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': env.int('CONN_MAX_AGE', default=600),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+            # Take the write lock when a transaction starts: a deferred transaction that
+            # reads then writes can fail with "database is locked" despite busy_timeout
+            'transaction_mode': 'IMMEDIATE',
+        },
+    })
+    DATABASES['reader'] = {
+        **DATABASES['default'],
+        'OPTIONS': {'init_command': ';'.join([*SQLITE_PRAGMAS, 'PRAGMA query_only=ON'])},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append('reader')
+
+# Read replicas as comma separated database URLs, for example local SQLite files
+# kept in sync with `manage.py sync_replicas`:
+# DATABASE_REPLICA_URLS=sqlite:////srv/blog/replica1.sqlite3,sqlite:////srv/blog/replica2.sqlite3
+# GET requests to the blog views read from one of them, see blog/routers.py.
+for number, url in enumerate(env.list('DATABASE_REPLICA_URLS', default=[]), start=1):
+    DATABASES[f'replica{number}'] = {
+        **env.db_url_config(url),
+        **{key: DATABASES['reader'][key] for key in ('CONN_MAX_AGE', 'OPTIONS') if 'reader' in DATABASES},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['blog.routers.PrimaryReplicaRouter']
+
+# How long a user's reads stay on the primary after they wrote, to cover replication lag,
+# and how long after any write the cached responses depending on it are built from the primary
+DATABASE_REPLICA_PIN_SECONDS = env.int('DATABASE_REPLICA_PIN_SECONDS', default=10)
+
+
+# Cache
+# Local memory by default (per process, LRU culled). Point CACHE_URL at a shared
+# backend such as filecache:///var/tmp/blog_cache?max_entries=20000 when running
+# several worker processes, so invalidations reach all of them.
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://blog?timeout=300&max_entries=10000'),
+}
+
+# Lifetime in seconds of the cached read responses, see blog/cache.py (0 disables)
+BLOG_RESPONSE_CACHE_TIMEOUT = env.int('BLOG_RESPONSE_CACHE_TIMEOUT', default=300)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -135,15 +201,68 @@ AUTH_USER_MODEL = "blog.CustomUser"
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        # JWT with a cached user lookup, see blog/authentication.py
+        'blog.authentication.CachedJWTAuthentication',
+    ),
+    # Keyset pagination on every list endpoint, see blog/pagination.py
+    'DEFAULT_PAGINATION_CLASS': 'blog.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
+    # Same JSON, through orjson when installed and with its rendering time reported to blog/metrics.py
+    'DEFAULT_RENDERER_CLASSES': (
+        'blog.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Sliding-window rate limits per user (or IP) and per action, see blog/throttling.py
+    'DEFAULT_THROTTLE_CLASSES': (
+        'blog.throttling.UserRateThrottle',
+        'blog.throttling.ActionRateThrottle',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': env('THROTTLE_RATE_ANON', default='120/min'),
+        'user': env('THROTTLE_RATE_USER', default='600/min'),
+        'post-like': '30/min',
+        'post-rate': '30/min',
+        'post-share': '20/hour',
+        'token': '10/min',
+    },
+    # Clients reach the app through this many reverse proxies (for the IP of anonymous requests)
+    'NUM_PROXIES': env.int('NUM_PROXIES', default=None),
 }
 
+# Requests running more queries than this are logged and flagged in /blog/metrics/, see blog/middleware.py
+BLOG_QUERY_COUNT_THRESHOLD = env.int('BLOG_QUERY_COUNT_THRESHOLD', default=20)
+
+# Send the Server-Timing header of blog/middleware.py to every client, not only to staff
+# users (and to everyone when DEBUG is on): it tells anyone how much work a request took
+BLOG_SERVER_TIMING = env.bool('BLOG_SERVER_TIMING', default=False)
+
+# Lifetime in seconds of the users cached by blog.authentication.CachedJWTAuthentication
+BLOG_AUTH_USER_CACHE_TIMEOUT = env.int('BLOG_AUTH_USER_CACHE_TIMEOUT', default=300)
+
+# Serve the blog from the native async views in blog/async_views.py. Opt-in, even under
+# ASGI: benchmarks/asgi_vs_wsgi.py measures less throughput than the sync views
+BLOG_ASYNC_VIEWS = env.bool('BLOG_ASYNC_VIEWS', default=False)
+
+# Full-text search over posts, see blog/search.py
+BLOG_SEARCH_BACKEND = 'blog.search.SQLiteFTS5Backend'
+
+# Authors followed by more users than this have their posts read at feed time
+# instead of written to every follower's feed, see blog.models.FeedEntryManager
+BLOG_FEED_FAN_OUT_LIMIT = env.int('BLOG_FEED_FAN_OUT_LIMIT', default=10000)
+
+# Latest posts of an author, tag or category copied to a feed when it's followed
+BLOG_FEED_BACKFILL = env.int('BLOG_FEED_BACKFILL', default=50)
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),  
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),   
     'ROTATE_REFRESH_TOKENS': True,                 
     'BLACKLIST_AFTER_ROTATION': True,              
+    # Adds the username and staff claims used by the stateless views
+    'TOKEN_OBTAIN_SERIALIZER': 'blog.authentication.ClaimsTokenObtainPairSerializer',
+    # Revoke rotated refresh tokens without the token_blacklist app, see blog/authentication.py
+    'TOKEN_REFRESH_SERIALIZER': 'blog.authentication.RevocableTokenRefreshSerializer',
+    'TOKEN_BLACKLIST_SERIALIZER': 'blog.authentication.RevocableTokenBlacklistSerializer',
 }
 
 SWAGGER_SETTINGS = {